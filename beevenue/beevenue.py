@@ -13,7 +13,6 @@ from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
 from .auth.auth import init as auth_init_app
 from .auth.routes import blueprint as auth_bp
-from .cache import init_app as cache_init_app
 from .cli import init_cli
 from .core import graphql_routes, media_routes, routes, tag_routes
 from .db import db
@@ -75,8 +74,6 @@ def get_application(
         # but before filling Spindex from DB.
         fill_db(db)
 
-        cache_init_app(application)
-
         if "BEEVENUE_SKIP_SPINDEX" in os.environ:
             print("Skipping Spindex initialization")
         else:
@@ -8,8 +8,12 @@ from flask import g
 
 from .core import thumbnails
 from .core.file_upload import create_medium_from_upload
-from .flask import BeevenueFlask
+from . import paths
+from .flask import BeevenueFlask, request
 from .io import HelperBytesIO
+from .spindex import consistency, resident
+from .spindex.signal_handlers import start_buffering
+from .spindex.spindex import ResidentSessionFactory, Spindex
 
 
 class _Nop:
@@ -21,6 +25,9 @@ class _Nop:
     def reindex_medium(self, medium_id: int) -> None:
         """Do nothing, intentionally."""
 
+    def reindex_media(self, medium_ids: Iterable[int]) -> None:
+        """Do nothing, intentionally."""
+
     def remove_id(self, medium_id: int) -> None:
         """Do nothing, intentionally."""
 
@@ -54,3 +61,27 @@ def init_cli(app: BeevenueFlask) -> None:
             print("Creating thumbnails...")
             thumbnails.create(medium_id)
             print(f"Successfully imported {path} (Medium {medium_id})")
+
+    @app.cli.command("check-spindex")
+    @click.option(
+        "--repair", is_flag=True, help="Reindex all media which differ."
+    )
+    def _check_spindex(repair: bool) -> None:
+        """Check whether the Spindex matches the SQL database."""
+
+        # The Spindex is only accessible during requests. Changes are
+        # persisted when this (fake) request ends.
+        with app.test_request_context():
+            resident.refresh(paths.spindex_directory())
+            request.spindex_session = ResidentSessionFactory()
+            start_buffering()
+            g.spindex = Spindex()
+            report = consistency.check(repair)
+
+        print(report)
+        for name in ("missing", "extra", "differing"):
+            ids = getattr(report, name)
+            if ids:
+                print(f"{name.capitalize()}: {', '.join(map(str, ids))}")
+        if repair and not report.is_consistent:
+            print("Repaired.")
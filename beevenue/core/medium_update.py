@@ -9,6 +9,7 @@ from . import tags
 from ..types import MediumDocument
 from ..models import MediaTags, Medium, Tag
 from ..signals import medium_updated
+from ..spindex.signal_handlers import dispatch_signals
 from .detail import MediumDetail
 from .media import similar_media
 from .tags import ValidTagName
@@ -111,7 +112,12 @@ def update_medium(
     update_rating(maybe_medium, new_rating)
     update_tags(maybe_medium, new_tags)
     medium_updated.send(maybe_medium.id)
+    g.db.commit()
 
+    # Changes to the Spindex are buffered until the end of the request.
+    # Apply them now, so that the updated medium (and its similar media)
+    # can be read back.
+    dispatch_signals()
     result: MediumDocument = g.spindex.get_medium(  # type: ignore
         maybe_medium.id
     )
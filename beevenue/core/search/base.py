@@ -1,6 +1,8 @@
 from abc import ABCMeta, abstractmethod
 from re import Match
+from typing import Optional
 
+from ...spindex.idset import MediumIdSet
 from ...types import MediumDocument
 
 
@@ -16,6 +18,28 @@ class SearchTerm(metaclass=ABCMeta):
     def applies_to(self, medium: MediumDocument) -> bool:
         """Does this SearchTerm apply to this medium?"""
 
+    def indexed_medium_ids(self) -> Optional[MediumIdSet]:
+        """Ids of all media this SearchTerm applies to, if that is known.
+
+        Returns None if this SearchTerm can't be answered from an index,
+        so that applies_to has to be checked for each medium instead."""
+        return None
+
+    def excluded_medium_ids(self) -> Optional[MediumIdSet]:
+        """Ids of all media this SearchTerm does *not* apply to, if known.
+
+        Like indexed_medium_ids, but for terms which exclude media."""
+        return None
+
+    def filter_medium_ids(  # pylint: disable=unused-argument
+        self, medium_ids: MediumIdSet
+    ) -> Optional[MediumIdSet]:
+        """Those of medium_ids this SearchTerm applies to, if that can be
+        computed for all of them at once.
+
+        Returns None if applies_to has to be checked for each medium."""
+        return None
+
     def __eq__(self, other: object) -> bool:
         """Support hash-based equality."""
         return self.__hash__() == other.__hash__()
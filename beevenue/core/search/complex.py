@@ -1,6 +1,9 @@
 from re import Match
-from typing import Callable, Dict
+from typing import Callable, Dict, Optional
 
+from flask import g
+
+from ...spindex.idset import MediumIdSet
 from ...types import MediumDocument
 from .base import SearchTerm
 
@@ -38,6 +41,19 @@ class CountingSearchTerm(SearchTerm):
         # Note! Only count *innate* tags, not implications, aliases, etc...
         return operator(len(medium.tag_names.innate), self.number)
 
+    def filter_medium_ids(
+        self, medium_ids: MediumIdSet
+    ) -> Optional[MediumIdSet]:
+        operator = OPS.get(self.operator, None)
+        if not operator:
+            raise Exception(f"Unknown operator in {self}")
+
+        # The operators work on whole NumPy arrays, too.
+        result: MediumIdSet = g.spindex.with_tag_count(
+            medium_ids, lambda counts: operator(counts, self.number)
+        )
+        return result
+
     def __repr__(self) -> str:
         return f"tags{self.operator}{self.number}"
 
@@ -71,5 +87,19 @@ class CategorySearchTerm(SearchTerm):
 
         return operator(len(matching_tag_names), self.number)
 
+    def filter_medium_ids(
+        self, medium_ids: MediumIdSet
+    ) -> Optional[MediumIdSet]:
+        operator = OPS.get(self.operator, None)
+        if not operator:
+            raise Exception(f"Unknown operator in {self}")
+
+        result: MediumIdSet = g.spindex.with_tag_count(
+            medium_ids,
+            lambda counts: operator(counts, self.number),
+            self.category,
+        )
+        return result
+
     def __repr__(self) -> str:
         return f"{self.category}tags{self.operator}{self.number}"
@@ -12,11 +12,14 @@ class Pagination(Generic[TItem]):
         page_count: int,
         page_number: int,
         page_size: int,
+        page_count_is_estimate: bool = False,
     ):
         self.items = items
         self.page_count = page_count
         self.page_number = page_number
         self.page_size = page_size
+        # Set if not all results were looked at (to save time).
+        self.page_count_is_estimate = page_count_is_estimate
 
     @staticmethod
     def empty() -> "Pagination[TItem]":
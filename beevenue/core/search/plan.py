@@ -0,0 +1,165 @@
+"""Evaluation order of search terms.
+
+Terms which can be answered from an index are evaluated on posting lists
+(see MediumIdSet) only: Positive ones are intersected, starting with the
+smallest posting list, and negative ones are subtracted (ANDNOT). The
+size of each posting list serves as estimate of how selective a term is.
+
+Terms without index (e.g. CountingSearchTerm) are then checked on the
+media which are left after that, all at once if possible (see
+SearchTerm.filter_medium_ids), else medium by medium."""
+
+from typing import Callable, Iterable, List, NamedTuple
+
+from ...spindex.idset import MediumIdSet
+from ...types import MediumDocument
+from .base import SearchTerm
+
+
+# Number of candidates to check at least when only looking for the first
+# matches (see QueryPlan.execute_first).
+_MIN_BATCH_SIZE = 64
+
+
+class FirstMatches(NamedTuple):
+    """The newest matches of a search (or all of them)."""
+
+    medium_ids: MediumIdSet
+    # Exact number of all matches if is_exact, otherwise an estimate.
+    match_count: int
+    is_exact: bool
+
+
+class QueryPlan:
+    """Posting lists and predicates a search consists of."""
+
+    def __init__(self) -> None:
+        self.included: List[MediumIdSet] = []
+        self.excluded: List[MediumIdSet] = []
+        self.predicates: List[SearchTerm] = []
+
+    def execute(
+        self, get_media: Callable[[MediumIdSet], Iterable[MediumDocument]]
+    ) -> MediumIdSet:
+        """Get ids of all media matching every term.
+
+        get_media is used to look up the media to check predicates on."""
+
+        return self._check(self._candidates(), get_media)
+
+    def execute_first(
+        self,
+        count: int,
+        get_media: Callable[[MediumIdSet], Iterable[MediumDocument]],
+    ) -> FirstMatches:
+        """Find (at least) the count newest media matching every term.
+
+        Unless there are only posting lists, the smallest one is walked
+        newest first, in growing batches, until count media match. Only
+        each batch is intersected with the other posting lists and then
+        checked against the predicates. So unless there are few matches,
+        only a small part of all candidates is ever looked at."""
+
+        if not self.predicates:
+            candidates = self._candidates()
+            return FirstMatches(candidates, len(candidates), True)
+
+        included = sorted(self.included, key=len)
+        walked, others = included[0], included[1:]
+        walked_count = len(walked)
+
+        matching = MediumIdSet()
+        checked = 0
+        batch_size = max(count * 2, _MIN_BATCH_SIZE)
+        while len(matching) < count and checked < walked_count:
+            batch = MediumIdSet(
+                walked.descending_slice(checked, checked + batch_size)
+            )
+            checked += batch_size
+            matching |= self._check(self._narrow(batch, others), get_media)
+            batch_size *= 2
+
+        if checked >= walked_count:
+            return FirstMatches(matching, len(matching), True)
+
+        # Assume the rest matches as often as what was checked so far.
+        estimated_count = round(len(matching) * walked_count / checked)
+        return FirstMatches(matching, estimated_count, False)
+
+    def _candidates(self) -> MediumIdSet:
+        """Evaluate all posting lists."""
+
+        # Most selective first, so that intermediate results stay small.
+        included = sorted(self.included, key=len)
+        return self._narrow(included[0].copy(), included[1:])
+
+    def _narrow(
+        self, result: MediumIdSet, included: List[MediumIdSet]
+    ) -> MediumIdSet:
+        """Intersect result with included, then subtract the excluded
+        posting lists. Modifies result."""
+
+        for medium_ids in included:
+            if not result:
+                return result
+            result &= medium_ids
+
+        for medium_ids in self.excluded:
+            if not result:
+                return result
+            result -= medium_ids
+
+        return result
+
+    def _check(
+        self,
+        result: MediumIdSet,
+        get_media: Callable[[MediumIdSet], Iterable[MediumDocument]],
+    ) -> MediumIdSet:
+        """Get those candidates in result which match all predicates."""
+
+        predicates = []
+        for predicate in self.predicates:
+            if not result:
+                return result
+            filtered = predicate.filter_medium_ids(result)
+            if filtered is None:
+                predicates.append(predicate)
+            else:
+                result = filtered
+
+        if not predicates or not result:
+            return result
+
+        matching = MediumIdSet()
+        for medium in get_media(result):
+            for predicate in predicates:
+                if not predicate.applies_to(medium):
+                    break
+            else:
+                matching.add(medium.medium_id)
+        return matching
+
+
+def plan(
+    candidate_ids: MediumIdSet, search_terms: Iterable[SearchTerm]
+) -> QueryPlan:
+    """Plan how to find those candidates that match all search terms."""
+
+    result = QueryPlan()
+    result.included.append(candidate_ids)
+
+    for search_term in search_terms:
+        medium_ids = search_term.indexed_medium_ids()
+        if medium_ids is not None:
+            result.included.append(medium_ids)
+            continue
+
+        medium_ids = search_term.excluded_medium_ids()
+        if medium_ids is not None:
+            result.excluded.append(medium_ids)
+            continue
+
+        result.predicates.append(search_term)
+
+    return result
@@ -1,15 +1,66 @@
-from typing import List, Set, TypeVar
+from collections import OrderedDict
+from threading import Lock
+from typing import FrozenSet, Hashable, List, Optional, Set, Tuple
 
 from flask import g
 
 from beevenue.flask import BeevenueContext, request
 
+from ...spindex.idset import MediumIdSet
 from ...types import MediumDocument
 
 from .pagination import Pagination
 from .parse import parse_search_terms
 from .base import SearchTerm
-from .simple import Negative, RatingSearchTerm
+from .plan import QueryPlan, plan
+
+
+# How many distinct searches to keep the results of.
+_MAX_CACHED_RESULTS = 64
+
+_CacheKey = Tuple[FrozenSet[SearchTerm], str]
+
+
+class _ResultCache:
+    """Bounded LRU cache of search results.
+
+    Results are only valid for the Spindex version (see Spindex.version)
+    they were found in. Once that changes, all of them are dropped at once."""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._version: Optional[Hashable] = None
+        self._entries: "OrderedDict[_CacheKey, MediumIdSet]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(
+        self, version: Optional[Hashable], key: _CacheKey
+    ) -> Optional[MediumIdSet]:
+        with self._lock:
+            if version is None or version != self._version:
+                return None
+            result = self._entries.get(key, None)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(
+        self, version: Optional[Hashable], key: _CacheKey, ids: MediumIdSet
+    ) -> None:
+        with self._lock:
+            if version is None:
+                return
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+            self._entries[key] = ids
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+
+_results = _ResultCache(_MAX_CACHED_RESULTS)
 
 
 def find_all() -> Pagination[MediumDocument]:
@@ -27,57 +78,80 @@ def run(search_term_list: List[str]) -> Pagination[MediumDocument]:
 
 def _run(search_terms: Set[SearchTerm]) -> Pagination[MediumDocument]:
     context = request.beevenue_context
-    medium_ids = _search(context, search_terms)
+    medium_ids, estimated_count = _find(context, search_terms)
 
     if not medium_ids:
         return Pagination.empty()
 
-    sorted_medium_ids = list(medium_ids)
-    sorted_medium_ids.sort(reverse=True)
-    pagination = _paginate(sorted_medium_ids)
-    media = g.spindex.get_media(pagination.items)
+    pagination = _paginate(medium_ids, estimated_count)
+    media = g.spindex.get_media_with_tiny_thumbnails(pagination.items)
 
     pagination.items = media  # type: ignore
 
     return pagination  # type: ignore
 
 
-def _censor(
-    context: BeevenueContext, search_terms: Set[SearchTerm]
-) -> Set[SearchTerm]:
-    search_terms = set(search_terms)
-
-    if context.is_sfw:
-        search_terms.add(RatingSearchTerm("s"))
-    if context.user_role != "admin":
-        search_terms.add(Negative(RatingSearchTerm("e")))
-        search_terms.add(Negative(RatingSearchTerm("u")))
-
-    return search_terms
-
-
-def _search(
+def _find(
     context: BeevenueContext, search_terms: Set[SearchTerm]
-) -> Set[int]:
-    search_terms = _censor(context, search_terms)
-
-    all_media = g.spindex.all()
-    result = set()
-
-    for medium in all_media:
-        for search_term in search_terms:
-            if not search_term.applies_to(medium):
-                break
-        else:
-            result.add(medium.medium_id)
-
+) -> Tuple[MediumIdSet, Optional[int]]:
+    """Get ids of matching media, and an estimate of their number if
+    those are not all of them.
+
+    Paging through the same search only looks up the cached result.
+    For the first page, only as many media as needed to fill it are
+    checked (unless that result is cached already).
+    The result must not be modified."""
+
+    # Terms are compared by their canonical representation (see
+    # SearchTerm.__hash__), so equivalent searches share an entry.
+    key = (frozenset(search_terms), context.visibility)
+    version = g.spindex.version()
+    medium_ids = _results.get(version, key)
+    if medium_ids is not None:
+        return medium_ids, None
+
+    query_plan = _plan(context, search_terms)
+    first_page_size = _first_page_size()
+    if first_page_size:
+        first = query_plan.execute_first(first_page_size, g.spindex.get_media)
+        if not first.is_exact:
+            return first.medium_ids, first.match_count
+        medium_ids = first.medium_ids
+    else:
+        medium_ids = query_plan.execute(g.spindex.get_media)
+
+    _results.put(version, key, medium_ids)
+    return medium_ids, None
+
+
+def _plan(context: BeevenueContext, search_terms: Set[SearchTerm]) -> QueryPlan:
+    # Censorship is a single intersection with the visible media.
+    visible_ids: MediumIdSet = g.spindex.visible_medium_ids(context.visibility)
+    return plan(visible_ids, search_terms)
+
+
+def _first_page_size() -> Optional[int]:
+    """Get the page size if the first page is requested, else None."""
+
+    page_number = request.args.get("pageNumber", type=int)
+    page_size = request.args.get("pageSize", type=int)
+    if page_number is None or page_number > 1:
+        return None
+    if page_size is None or page_size < 1:
+        return None
+    result: int = page_size
     return result
 
 
-TItem = TypeVar("TItem")
+def _paginate(
+    ids: MediumIdSet, estimated_count: Optional[int] = None
+) -> Pagination[int]:
+    """Get the requested page of ids, newest (i.e. highest id) first.
 
+    Only the ids on that page are ever looked at, see
+    MediumIdSet.descending_slice. If ids are not all matching ids,
+    the page count is based on their estimated_count instead."""
 
-def _paginate(ids: List[TItem]) -> Pagination[TItem]:
     page_number_arg: str = request.args.get(  # type: ignore
         "pageNumber", type=str
     )
@@ -96,13 +170,15 @@ def _paginate(ids: List[TItem]) -> Pagination[TItem]:
 
     skip = (page_number - 1) * page_size
 
-    page_count = len(ids) // page_size
-    if (len(ids) % page_size) != 0:
+    id_count = len(ids) if estimated_count is None else estimated_count
+    page_count = id_count // page_size
+    if (id_count % page_size) != 0:
         page_count += 1
 
     return Pagination(
-        items=ids[skip : skip + page_size],
+        items=ids.descending_slice(skip, skip + page_size),
         page_count=page_count,
         page_number=page_number,
         page_size=page_size,
+        page_count_is_estimate=estimated_count is not None,
     )
@@ -1,7 +1,10 @@
 from abc import ABC
 from re import Match
-from typing import NoReturn
+from typing import NoReturn, Optional
 
+from flask import g
+
+from ...spindex.idset import MediumIdSet
 from ...types import MediumDocument
 from .base import SearchTerm
 
@@ -24,6 +27,10 @@ class PositiveSearchTerm(BasicSearchTerm):
     def applies_to(self, medium: MediumDocument) -> bool:
         return self.term in medium.tag_names.searchable
 
+    def indexed_medium_ids(self) -> Optional[MediumIdSet]:
+        result: MediumIdSet = g.spindex.with_searchable_tags([self.term])
+        return result
+
     @classmethod
     def from_match(cls, match: Match) -> "PositiveSearchTerm":
         return PositiveSearchTerm(match.group(0))
@@ -43,6 +50,10 @@ class ExactSearchTerm(BasicSearchTerm):
     def applies_to(self, medium: MediumDocument) -> bool:
         return self.term in medium.tag_names.innate
 
+    def indexed_medium_ids(self) -> Optional[MediumIdSet]:
+        result: MediumIdSet = g.spindex.with_innate_tags([self.term])
+        return result
+
     @classmethod
     def from_match(cls, match: Match) -> "ExactSearchTerm":
         return ExactSearchTerm(match.group(1))
@@ -64,6 +75,10 @@ class RatingSearchTerm(SearchTerm):
     def applies_to(self, medium: MediumDocument) -> bool:
         return medium.rating == self.rating
 
+    def indexed_medium_ids(self) -> Optional[MediumIdSet]:
+        result: MediumIdSet = g.spindex.with_rating(self.rating)
+        return result
+
 
 class Negative(SearchTerm):
     """Meta search term which negates the wrapped inner SearchTerm."""
@@ -80,3 +95,14 @@ class Negative(SearchTerm):
 
     def applies_to(self, medium: MediumDocument) -> bool:
         return not self.inner_term.applies_to(medium)
+
+    def excluded_medium_ids(self) -> Optional[MediumIdSet]:
+        return self.inner_term.indexed_medium_ids()
+
+    def filter_medium_ids(
+        self, medium_ids: MediumIdSet
+    ) -> Optional[MediumIdSet]:
+        matching = self.inner_term.filter_medium_ids(medium_ids)
+        if matching is None:
+            return None
+        return medium_ids - matching
@@ -1,5 +1,5 @@
 from queue import PriorityQueue
-from typing import List, Set
+from typing import AbstractSet, List, Set
 
 from flask import g
 
@@ -9,29 +9,16 @@ from ..types import MediumDocument
 
 
 def _find_candidates(
-    context: BeevenueContext, medium_id: int, target_tag_names: Set[str]
+    context: BeevenueContext, medium_id: int, target_tag_names: AbstractSet[str]
 ) -> Set[MediumDocument]:
     """Find all media that have *some* similarity to the specified one."""
 
-    candidates = set()
+    candidate_ids = g.spindex.with_innate_tags(
+        target_tag_names
+    ) & g.spindex.visible_medium_ids(context.visibility)
+    candidate_ids.discard(medium_id)
 
-    # Maybe add a reverse index (tag => media) so this query is faster
-    for medium in g.spindex.all():
-        if medium.medium_id == medium_id:
-            continue
-
-        if context.is_sfw and medium.rating != "s":
-            continue
-
-        if context.user_role != "admin" and medium.rating == "e":
-            continue
-
-        if len(medium.tag_names.innate & target_tag_names) == 0:
-            continue
-
-        candidates.add(medium)
-
-    return candidates
+    return set(g.spindex.get_media(candidate_ids))
 
 
 def _get_similarity(
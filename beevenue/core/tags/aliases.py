@@ -2,6 +2,7 @@ from typing import Optional
 
 from flask import g
 
+from . import closure
 from .delete import delete_orphans
 from ...models import Tag, TagAlias
 from ...signals import alias_added, alias_removed
@@ -36,13 +37,9 @@ def add_alias(current_name: str, new_alias: str) -> Optional[str]:
     old_tag = old_tags[0]
     alias = TagAlias(old_tag.id, new_alias)
     session.add(alias)
+    derivations = closure.alias_derivations(old_tag.id, new_alias)
     session.commit()
-    alias_added.send(
-        (
-            old_tag.tag,
-            new_alias,
-        )
-    )
+    alias_added.send((old_tag.tag, new_alias, derivations))
     return None
 
 
@@ -0,0 +1,237 @@
+"""Maintenance of the tag_closure table (see models.TagClosure).
+
+All functions only modify the current session, so the closure is
+committed (or rolled back) together with the implications it reflects."""
+
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import g
+from sqlalchemy import and_, or_
+
+from ...models import Tag, TagAlias, TagClosure, TagImplication
+from ...types import Derivations
+
+_Pairs = Set[Tuple[int, int]]
+
+
+def _ancestors(tag_id: int) -> Dict[int, int]:
+    rows = (
+        g.db.query(TagClosure.c.ancestor, TagClosure.c.depth)
+        .filter(TagClosure.c.descendant == tag_id)
+        .all()
+    )
+    return dict(rows)
+
+
+def _descendants(tag_id: int) -> Dict[int, int]:
+    rows = (
+        g.db.query(TagClosure.c.descendant, TagClosure.c.depth)
+        .filter(TagClosure.c.ancestor == tag_id)
+        .all()
+    )
+    return dict(rows)
+
+
+def implies(implying_tag_id: int, implied_tag_id: int) -> bool:
+    """Does one tag (transitively) imply the other one?"""
+
+    count: int = (
+        g.db.query(TagClosure)
+        .filter(
+            and_(
+                TagClosure.c.ancestor == implying_tag_id,
+                TagClosure.c.descendant == implied_tag_id,
+            )
+        )
+        .count()
+    )
+    return count > 0
+
+
+def add_implication(implying_tag_id: int, implied_tag_id: int) -> _Pairs:
+    """Update the closure after an implication was added.
+
+    Returns the new (ancestor, descendant) pairs."""
+
+    # Everything implying "implying" now also implies everything
+    # implied by "implied".
+    sources = _ancestors(implying_tag_id)
+    sources[implying_tag_id] = 0
+    targets = _descendants(implied_tag_id)
+    targets[implied_tag_id] = 0
+
+    existing_rows = (
+        g.db.query(
+            TagClosure.c.ancestor, TagClosure.c.descendant, TagClosure.c.depth
+        )
+        .filter(
+            and_(
+                TagClosure.c.ancestor.in_(sources.keys()),
+                TagClosure.c.descendant.in_(targets.keys()),
+            )
+        )
+        .all()
+    )
+    existing = {(a, d): depth for a, d, depth in existing_rows}
+
+    to_insert = []
+    for ancestor, ancestor_depth in sources.items():
+        for descendant, descendant_depth in targets.items():
+            depth = ancestor_depth + descendant_depth + 1
+            current_depth = existing.get((ancestor, descendant), None)
+            if current_depth is None:
+                to_insert.append(
+                    {
+                        "ancestor": ancestor,
+                        "descendant": descendant,
+                        "depth": depth,
+                    }
+                )
+            elif depth < current_depth:
+                g.db.execute(
+                    TagClosure.update()
+                    .where(
+                        and_(
+                            TagClosure.c.ancestor == ancestor,
+                            TagClosure.c.descendant == descendant,
+                        )
+                    )
+                    .values(depth=depth)
+                )
+
+    if to_insert:
+        g.db.execute(TagClosure.insert(), to_insert)
+
+    return {(row["ancestor"], row["descendant"]) for row in to_insert}
+
+
+def _pairs(ancestor_ids: Set[int]) -> _Pairs:
+    rows = g.db.query(TagClosure.c.ancestor, TagClosure.c.descendant).filter(
+        TagClosure.c.ancestor.in_(ancestor_ids)
+    )
+    return set(rows)
+
+
+def _recompute(
+    ancestor_ids: Set[int], excluded_ids: Optional[Set[int]] = None
+) -> None:
+    """Recompute closure rows of the given ancestors from scratch.
+
+    Implications of or to excluded_ids are ignored."""
+
+    if not ancestor_ids:
+        return
+
+    # Make sure pending changes to implications are visible below.
+    g.db.flush()
+
+    implied_by_this = defaultdict(set)
+    for implying_tag_id, implied_tag_id in g.db.query(
+        TagImplication.c.implying_tag_id, TagImplication.c.implied_tag_id
+    ):
+        if excluded_ids and (
+            implying_tag_id in excluded_ids or implied_tag_id in excluded_ids
+        ):
+            continue
+        implied_by_this[implying_tag_id].add(implied_tag_id)
+
+    g.db.execute(
+        TagClosure.delete().where(TagClosure.c.ancestor.in_(ancestor_ids))
+    )
+
+    to_insert: List[Dict[str, int]] = []
+    for ancestor in ancestor_ids:
+        depths: Dict[int, int] = {}
+        queue: deque = deque((i, 1) for i in implied_by_this[ancestor])
+        while queue:
+            descendant, depth = queue.popleft()
+            if descendant in depths:
+                continue
+            depths[descendant] = depth
+            queue.extend((i, depth + 1) for i in implied_by_this[descendant])
+
+        to_insert.extend(
+            {"ancestor": ancestor, "descendant": descendant, "depth": depth}
+            for descendant, depth in depths.items()
+        )
+
+    if to_insert:
+        g.db.execute(TagClosure.insert(), to_insert)
+
+
+def remove_implication(implying_tag_id: int) -> _Pairs:
+    """Update the closure after an implication of implying_tag was removed.
+
+    Returns the (ancestor, descendant) pairs which no longer exist."""
+
+    # Other paths between the affected tags might still exist, so simply
+    # recompute the closure of every tag that could have been affected.
+    affected = set(_ancestors(implying_tag_id).keys())
+    affected.add(implying_tag_id)
+    before = _pairs(affected)
+    _recompute(affected)
+    return before - _pairs(affected)
+
+
+def remove_tags(tag_ids: Iterable[int]) -> None:
+    """Update the closure for the given tags, which are about to be deleted.
+
+    Must be called before deleting them, since the closure refers to them."""
+
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+
+    affected: Set[int] = set()
+    for tag_id in tag_ids:
+        affected |= _ancestors(tag_id).keys()
+
+    g.db.execute(
+        TagClosure.delete().where(
+            or_(
+                TagClosure.c.ancestor.in_(tag_ids),
+                TagClosure.c.descendant.in_(tag_ids),
+            )
+        )
+    )
+    _recompute(affected - tag_ids, tag_ids)
+
+
+def derivations(pairs: _Pairs) -> Derivations:
+    """Names derived through each of the given (ancestor, descendant) pairs.
+
+    That is, the name and aliases of descendant, by name of ancestor."""
+
+    if not pairs:
+        return {}
+
+    tag_ids = {tag_id for pair in pairs for tag_id in pair}
+    names: Dict[int, List[str]] = {
+        tag_id: [name]
+        for tag_id, name in g.db.query(Tag.id, Tag.tag).filter(
+            Tag.id.in_(tag_ids)
+        )
+    }
+    for tag_id, alias in g.db.query(TagAlias.tag_id, TagAlias.alias).filter(
+        TagAlias.tag_id.in_(tag_ids)
+    ):
+        names[tag_id].append(alias)
+
+    result: Derivations = defaultdict(list)
+    for ancestor, descendant in pairs:
+        result[names[ancestor][0]].extend(names[descendant])
+    return dict(result)
+
+
+def alias_derivations(tag_id: int, alias: str) -> Derivations:
+    """Names derived through a (new or removed) alias of the given tag.
+
+    The alias is derived from the tag itself and all its ancestors."""
+
+    tag_ids = set(_ancestors(tag_id).keys())
+    tag_ids.add(tag_id)
+    return {
+        name: [alias]
+        for (name,) in g.db.query(Tag.tag).filter(Tag.id.in_(tag_ids))
+    }
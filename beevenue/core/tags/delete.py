@@ -1,6 +1,7 @@
 from flask import g
 
 from ...models import MediaTags, Tag
+from . import closure
 
 
 def delete_orphans() -> None:
@@ -18,6 +19,7 @@ def delete_orphans() -> None:
 
     tags_to_delete = [t for t in tags_to_delete if is_deletable(t)]
 
+    closure.remove_tags(t.id for t in tags_to_delete)
     for tag in tags_to_delete:
         session.delete(tag)
 
@@ -1,4 +1,3 @@
-from collections import deque
 from typing import Dict, List, Optional, Tuple
 
 from flask import g
@@ -7,6 +6,7 @@ from sqlalchemy.orm.query import Query
 
 from ...models import Tag, TagImplication
 from ...signals import implication_added, implication_removed
+from . import closure
 from .delete import delete_orphans
 
 
@@ -26,36 +26,8 @@ def _would_create_implication_cycle(
     implying_tag: Tag, implied_tag: Tag
 ) -> bool:
     # If we add the edge (implying, implied) to the implication graph,
-    # would that form a cycle?
-    # Equivalent:
-    # * Gather "implied"s transitive neighbors
-    # * If they include "implying", we found a cycle, return True
-    # * If they stop growing, we can add the edge, return False
-    session = g.db
-
-    visited = set()
-    visited.add(implying_tag.id)
-
-    queue: deque = deque()
-    queue.append(implied_tag.id)
-
-    while queue:
-        current = queue.pop()
-
-        neighbors = (
-            session.query(TagImplication)
-            .filter(TagImplication.c.implying_tag_id == current)
-            .all()
-        )
-
-        neighbor_ids = [n.implied_tag_id for n in neighbors]
-
-        for neighbor_id in neighbor_ids:
-            if neighbor_id in visited:
-                return True
-            queue.append(neighbor_id)
-
-    return False
+    # would that form a cycle? Only if "implied" already implies "implying".
+    return closure.implies(implied_tag.id, implying_tag.id)
 
 
 def _tag_implication_query(implying_tag: Tag, implied_tag: Tag) -> Query:
@@ -95,13 +67,11 @@ def add_implication(implying: str, implied: str) -> Optional[str]:
         return "This would create a cycle of implications"
 
     implying_tag.implied_by_this.append(implied_tag)
-    g.db.commit()
-    implication_added.send(
-        (
-            implying,
-            implied,
-        )
+    derivations = closure.derivations(
+        closure.add_implication(implying_tag.id, implied_tag.id)
     )
+    g.db.commit()
+    implication_added.send((implying, implied, derivations))
     return None
 
 
@@ -123,14 +93,12 @@ def remove_implication(implying: str, implied: str) -> None:
         return None
 
     implying_tag.implied_by_this.remove(implied_tag)
+    derivations = closure.derivations(
+        closure.remove_implication(implying_tag.id)
+    )
     g.db.commit()
     delete_orphans()
-    implication_removed.send(
-        (
-            implying,
-            implied,
-        )
-    )
+    implication_removed.send((implying, implied, derivations))
     return None
 
 
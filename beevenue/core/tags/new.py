@@ -3,7 +3,7 @@ from typing import Iterable, Optional, Set, Tuple
 from flask import g
 
 from ...models import Tag, Medium, TagAlias
-from ...signals import medium_updated
+from ...signals import media_updated
 from . import ValidTagName, validate
 from .load import load
 
@@ -29,8 +29,7 @@ def _add_all(
 
     g.db.commit()
 
-    for medium in media:
-        medium_updated.send(medium.id)
+    media_updated.send({medium.id for medium in media})
 
     return added_count
 
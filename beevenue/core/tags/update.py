@@ -4,6 +4,7 @@ from flask import g
 
 from ...signals import tag_renamed
 from ...models import Tag, MediaTags
+from . import closure
 
 
 def _rename(old_tag: Tag, new_name: str) -> Tuple[str, bool]:
@@ -35,6 +36,7 @@ def _rename(old_tag: Tag, new_name: str) -> Tuple[str, bool]:
         tag_id=new_tag.id
     )
 
+    closure.remove_tags([old_tag.id])
     g.db.delete(old_tag)
 
     tag_renamed.send(
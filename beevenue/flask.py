@@ -27,6 +27,15 @@ class BeevenueContext:
         self.is_sfw = is_sfw
         self.user_role = user_role
 
+    @property
+    def visibility(self) -> str:
+        """Which media this context may see (see spindex VISIBLE_RATINGS)."""
+        if self.is_sfw:
+            return "sfw"
+        if self.user_role != "admin":
+            return "user"
+        return "admin"
+
 
 class BeevenueRequest(Request):
     """Customized request class."""
@@ -3,8 +3,15 @@ from typing import Any, Optional
 from flask import current_app, session
 from flask_login import current_user
 
+from . import paths
 from .flask import BeevenueContext, BeevenueFlask, BeevenueResponse, request
-from .spindex.spindex import CachingSessionFactory
+from .spindex import resident, snapshot
+from .spindex.signal_handlers import (
+    discard_signals,
+    dispatch_signals,
+    start_buffering,
+)
+from .spindex.spindex import ResidentSessionFactory
 
 
 def _context_setter() -> None:
@@ -86,15 +93,39 @@ def _set_sendfile_header(res: BeevenueResponse) -> BeevenueResponse:
 
 
 def _spindex_initialize() -> None:
-    """Set request.spindex_session to caching implementation."""
-    request.spindex_session = CachingSessionFactory()
+    """Set request.spindex_session to resident implementation.
 
+    Refreshes the resident Spindex if another request changed it."""
+    resident.refresh(paths.spindex_directory())
+    request.spindex_session = ResidentSessionFactory()
+    start_buffering()
 
-def _spindex_teardown(res: BeevenueResponse) -> BeevenueResponse:
-    """Flush cached spindex implementation if necessary."""
-    if hasattr(request, "spindex_session"):
-        request.spindex_session.exit()
-    return res
+
+def _spindex_teardown(exc: Optional[BaseException]) -> None:
+    """Flush spindex changes and release the resident spindex.
+
+    This runs even if the request failed, so that locks are always released.
+    Buffered changes are only applied if the request succeeded.
+
+    The SQL changes of the request are committed by now, so failing to
+    flush must not fail the request. Instead, the Spindex is marked as no
+    longer matching the SQL database (so that the next startup rebuilds
+    it), just like when changes are discarded after a commit.
+    """
+    if not hasattr(request, "spindex_session"):
+        return
+
+    try:
+        try:
+            if exc is None:
+                dispatch_signals()
+            else:
+                discard_signals()
+        finally:
+            request.spindex_session.exit()
+    except Exception:  # pylint: disable=broad-except
+        current_app.logger.exception("Could not flush Spindex changes")
+        snapshot.forget_fingerprint(paths.spindex_directory())
 
 
 def init_app(app: BeevenueFlask) -> None:
@@ -107,4 +138,4 @@ def init_app(app: BeevenueFlask) -> None:
     app.after_request(_set_client_hint_headers)  # type: ignore
     app.after_request(_set_server_push_link_header)  # type: ignore
     app.after_request(_set_sendfile_header)  # type: ignore
-    app.after_request(_spindex_teardown)  # type: ignore
+    app.teardown_request(_spindex_teardown)
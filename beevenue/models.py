@@ -23,6 +23,40 @@ TagImplication = db.Table(
 )
 
 
+# Transitive closure of TagImplication: Contains a row for each pair of tags
+# where "ancestor" (transitively) implies "descendant". "depth" is the length
+# of the shortest chain of implications between them.
+TagClosure = db.Table(
+    "tag_closure",
+    db.metadata,
+    db.Column(
+        "ancestor",
+        db.Integer,
+        db.ForeignKey("tag.id"),
+        index=True,
+        primary_key=True,
+    ),
+    db.Column(
+        "descendant",
+        db.Integer,
+        db.ForeignKey("tag.id"),
+        index=True,
+        primary_key=True,
+    ),
+    db.Column("depth", db.Integer, nullable=False),
+)
+
+
+# Single row counting the transactions which changed anything. Used to tell
+# whether a Spindex snapshot on disk still matches the SQL database.
+ChangeCounter = db.Table(
+    "change_counter",
+    db.metadata,
+    db.Column("id", db.Integer, primary_key=True),
+    db.Column("value", db.BigInteger, nullable=False),
+)
+
+
 class Tag(db.Model):
     __tablename__ = "tag"
     id = db.Column(db.Integer, primary_key=True)
@@ -93,6 +93,12 @@ def no_such_tag(current_name: str) -> Notification:
     )
 
 
+def reindex_already_running() -> Notification:
+    return _make_notification(
+        _NotificationLevel.ERROR, _text("Reindexing is already running.")
+    )
+
+
 def tag_batch_added(added_count: int) -> Notification:
     tag_string = "tag"
     if added_count > 1:
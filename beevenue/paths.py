@@ -21,3 +21,9 @@ def medium_directory() -> str:
 
 def medium_path(filename: str) -> str:
     return os.path.join(_base_dir(), "media", filename)
+
+
+def spindex_directory() -> str:
+    return current_app.config.get(
+        "BEEVENUE_SPINDEX_DIRECTORY", os.path.join(_base_dir(), "spindex")
+    )
@@ -74,15 +74,7 @@ def _can_see_medium(medium_id: int) -> Permission:
 
 def _can_see_full_path(full_path: str) -> Permission:
     medium_hash = str(Path(full_path).with_suffix(""))
-    all_media = g.spindex.all()
-
-    matching = [m for m in all_media if m.medium_hash == medium_hash]
-
-    maybe_medium: Optional[MediumDocument] = None
-    if matching:
-        maybe_medium = matching[0]
-
-    return _can_see_spindex_medium(maybe_medium)
+    return _can_see_spindex_medium(g.spindex.get_medium_by_hash(medium_hash))
 
 
 def _requires_permission(permission: Permission) -> RequirementDecorator:
@@ -0,0 +1,45 @@
+"""Hooks for sharing a single Spindex between gunicorn workers.
+
+With ``preload_app``, gunicorn creates the application in its master
+process, so the Spindex is (re)built there only once instead of once per
+worker. ``when_ready`` additionally loads it into memory and freezes the
+garbage collector, so that all objects created so far are moved out of
+the collected generations. Forked workers then share these pages with the
+master copy-on-write: Neither collections nor reads touch them (apart from
+reference counts of the objects actually used).
+
+``post_fork`` re-syncs each worker, which might be forked much later than
+the master loaded the Spindex (e.g. after a worker was restarted).
+
+See ``gunicorn.conf.py`` for how these are registered."""
+
+import gc
+from typing import Any
+
+from . import paths
+from .db import db
+from .spindex import resident
+
+
+def when_ready(server: Any) -> None:
+    """Load the Spindex in the master, before any worker is forked."""
+
+    app = server.app.wsgi()
+    with app.app_context():
+        resident.preload(paths.spindex_directory())
+
+        # Database connections must never be shared between processes.
+        db.engine.dispose()
+
+    gc.collect()
+    gc.freeze()  # type: ignore
+
+
+def post_fork(server: Any, _: Any) -> None:
+    """Bring a freshly forked worker's Spindex up to date."""
+
+    resident.after_fork()
+
+    app = server.app.wsgi()
+    with app.app_context():
+        resident.refresh(paths.spindex_directory())
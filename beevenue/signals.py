@@ -6,6 +6,11 @@ medium_deleted = _beevenue_signals.signal("medium_deleted")
 medium_added = _beevenue_signals.signal("medium_added")
 medium_updated = _beevenue_signals.signal("medium_updated")
 
+# Like medium_updated, but for a whole set of medium ids at once.
+media_updated = _beevenue_signals.signal("media_updated")
+
+# Senders of alias_added, implication_added and implication_removed also
+# send which searchable names are derived additionally (or no longer).
 alias_added = _beevenue_signals.signal("alias_added")
 alias_removed = _beevenue_signals.signal("alias_removed")
 
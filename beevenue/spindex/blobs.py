@@ -0,0 +1,134 @@
+"""Append-only packs of tiny thumbnails, stored next to the Spindex.
+
+Tiny thumbnails are only needed to render a single page of search
+results, so they are kept out of the Spindex documents. Instead, the
+Spindex only stores a ``BlobRef`` (position inside a pack) per medium.
+
+A full (re)load of the Spindex starts a fresh pack. Afterwards, blobs of
+reindexed media are appended to the newest pack, until it grows too large
+and a fresh pack is started. Packs are only removed once the Spindex
+(as published, or as compacted) does not refer to them anymore (see
+remove_unreferenced), so that space taken up by replaced blobs is
+eventually reclaimed."""
+
+import os
+import re
+from threading import get_ident
+from typing import AbstractSet, Dict, Iterable, List, Tuple
+
+from . import files
+from .files import BlobRef
+
+_PACK_FILE_REGEX = re.compile(r"^thumbs\.(?P<pack>[0-9]+)\.pack$")
+
+# Appending starts a fresh pack once the newest one is this large.
+_MAX_PACK_SIZE = 16 * 1024 * 1024
+
+
+def _pack_path(directory: str, pack: int) -> str:
+    return os.path.join(directory, f"thumbs.{pack}.pack")
+
+
+def _packs(directory: str) -> List[int]:
+    if not os.path.isdir(directory):
+        return []
+
+    result = []
+    for file_name in os.listdir(directory):
+        match = _PACK_FILE_REGEX.match(file_name)
+        if match:
+            result.append(int(match.group("pack")))
+    return result
+
+
+def _write(
+    path: str, mode: str, pack: int, blobs: Iterable[Tuple[int, bytes]]
+) -> Dict[int, BlobRef]:
+    result = {}
+    with open(path, mode) as pack_file:
+        offset = pack_file.seek(0, os.SEEK_END)
+        for key, blob in blobs:
+            pack_file.write(blob)
+            result[key] = BlobRef(pack, offset, len(blob))
+            offset += len(blob)
+        pack_file.flush()
+        os.fsync(pack_file.fileno())
+    return result
+
+
+def append(
+    directory: str, blobs: Iterable[Tuple[int, bytes]]
+) -> Dict[int, BlobRef]:
+    """Append (key, blob) pairs to the newest pack (or a fresh one, if the
+    newest has grown too large).
+
+    Returns the BlobRef of each blob by its key."""
+
+    with files.lock(directory):
+        pack = max(_packs(directory), default=1)
+        try:
+            if os.path.getsize(_pack_path(directory, pack)) >= _MAX_PACK_SIZE:
+                pack += 1
+        except FileNotFoundError:
+            pass
+        return _write(_pack_path(directory, pack), "ab", pack, blobs)
+
+
+def append_to_new_pack(
+    directory: str, blobs: Iterable[Tuple[int, bytes]]
+) -> Dict[int, BlobRef]:
+    """Start a fresh pack containing only the given (key, blob) pairs."""
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Write the new pack off to the side, so that other processes keep
+    # appending to the previous pack until it is complete.
+    temporary_path = os.path.join(
+        directory, f"thumbs.pack.tmp.{os.getpid()}.{get_ident()}"
+    )
+    unnumbered = _write(temporary_path, "wb", 0, blobs)
+
+    with files.lock(directory):
+        previous = max(_packs(directory), default=0)
+        pack = previous + 1
+        os.replace(temporary_path, _pack_path(directory, pack))
+
+    return {key: ref._replace(pack=pack) for key, ref in unnumbered.items()}
+
+
+def remove_unreferenced(directory: str, referenced: AbstractSet[int]) -> None:
+    """Remove packs which are not in referenced.
+
+    The two newest packs are always kept, since other processes might
+    still be appending to the previous one, or refer to it from a
+    Spindex they have not refreshed yet."""
+
+    for pack in sorted(_packs(directory))[:-2]:
+        if pack in referenced:
+            continue
+        try:
+            os.remove(_pack_path(directory, pack))
+        except OSError:
+            pass
+
+
+def read(directory: str, refs: Dict[int, BlobRef]) -> Dict[int, bytes]:
+    """Read the blobs referred to by refs, keeping their keys.
+
+    Blobs in packs which do not exist (anymore) are left out."""
+
+    result = {}
+    by_pack: Dict[int, List[Tuple[int, BlobRef]]] = {}
+    for key, ref in refs.items():
+        by_pack.setdefault(ref.pack, []).append((key, ref))
+
+    for pack, pack_refs in by_pack.items():
+        try:
+            with open(_pack_path(directory, pack), "rb") as pack_file:
+                for key, ref in sorted(pack_refs, key=lambda r: r[1].offset):
+                    pack_file.seek(ref.offset)
+                    result[key] = pack_file.read(ref.length)
+        except FileNotFoundError:
+            continue
+
+    return result
@@ -0,0 +1,105 @@
+"""Per-request buffer of Spindex changes.
+
+Signal handlers do not modify the Spindex right away. Instead, they record
+their changes here, and the changes are only applied at the end of the
+request, once the SQL changes they reflect have been committed. Changes
+recorded before a rollback are dropped.
+
+Recorded changes are coalesced, so that e.g. media updated several times
+during a request are only reindexed once, in a single bulk load."""
+
+from typing import Iterable, List, Set, TYPE_CHECKING
+
+from sqlalchemy.orm import Session
+
+from .journal import Mutation
+
+if TYPE_CHECKING:
+    from .spindex import Spindex  # pragma: no cover
+
+
+class SpindexChanges:
+    """Coalesced changes to the Spindex."""
+
+    def __init__(self) -> None:
+        self.removed: Set[int] = set()
+        self.reindexed: Set[int] = set()
+
+        # Changes to tags (renames, aliases, implications), in order.
+        self.tag_changes: List[Mutation] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.reindexed or self.tag_changes)
+
+    def reindex(self, medium_ids: Iterable[int]) -> None:
+        self.reindexed.update(medium_ids)
+
+    def remove(self, medium_id: int) -> None:
+        self.reindexed.discard(medium_id)
+        self.removed.add(medium_id)
+
+    def change_tags(self, mutation: Mutation) -> None:
+        self.tag_changes.append(mutation)
+
+    def update(self, later: "SpindexChanges") -> None:
+        """Merge changes recorded after these ones into these ones."""
+
+        for medium_id in later.removed:
+            self.remove(medium_id)
+        self.reindex(later.reindexed)
+        self.tag_changes.extend(later.tag_changes)
+
+    def apply_to(self, spindex: "Spindex") -> None:
+        for medium_id in sorted(self.removed):
+            spindex.remove_medium(medium_id)
+
+        for change in self.tag_changes:
+            spindex.change_tags(change)
+
+        # Reindexing loads the current state from SQL, so it must
+        # happen last (and takes care of media removed in between).
+        if self.reindexed:
+            spindex.reindex_media(self.reindexed)
+
+
+class SignalBuffer:
+    """Spindex changes recorded during a single request."""
+
+    def __init__(self) -> None:
+        self.committed = SpindexChanges()
+        self.uncommitted = SpindexChanges()
+        self.has_uncommitted_writes = False
+
+    def record(self, session: Session) -> SpindexChanges:
+        """Get the changes to record a new change in.
+
+        Changes recorded while session has uncommitted writes wait for
+        the next commit. All others are already committed."""
+
+        if (
+            self.has_uncommitted_writes
+            or session.new
+            or session.dirty
+            or session.deleted
+        ):
+            return self.uncommitted
+        return self.committed
+
+    def on_flush(self) -> None:
+        self.has_uncommitted_writes = True
+
+    def on_commit(self) -> None:
+        self.committed.update(self.uncommitted)
+        self.uncommitted = SpindexChanges()
+        self.has_uncommitted_writes = False
+
+    def on_rollback(self) -> None:
+        self.uncommitted = SpindexChanges()
+        self.has_uncommitted_writes = False
+
+    def dispatch(self, spindex: "Spindex") -> None:
+        """Apply all committed changes to the Spindex."""
+
+        changes, self.committed = self.committed, SpindexChanges()
+        if changes:
+            changes.apply_to(spindex)
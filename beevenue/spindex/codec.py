@@ -0,0 +1,347 @@
+"""Compact, versioned binary encoding of Spindex snapshots.
+
+Layout (all integers are little-endian)::
+
+    header   magic, format version and the length of each section
+    strings  byte length of each string, then all strings as UTF-8
+    columns  one array per field, with one entry per medium (sorted by
+             medium id): id, aspect ratio, hash, mime type, rating (the
+             latter as indices into the string table), number of innate
+             and searchable tag names, tiny thumbnail position (pack 0
+             means none), followed by all innate and all searchable tag
+             names (again as indices into the string table), and the
+             derivation count of each searchable tag name.
+
+Each distinct string is stored only once. Posting lists are not stored
+at all, but rebuilt while decoding."""
+
+from array import array
+import struct
+import sys
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .files import BlobRef
+from .media import SpindexMedia
+from .models import (
+    SpindexedMedium,
+    SpindexedMediumTagNames,
+    tag_name,
+    tag_name_id,
+)
+
+# Bump whenever the layout changes. Snapshots in any other version are
+# simply not loaded (and rebuilt from SQL instead).
+VERSION = 2
+
+_MAGIC = b"SPDX"
+
+# Magic, version, media count, string count, string bytes,
+# total innate tag names, total searchable tag names.
+_HEADER_FORMAT = "<4sHIIIII"
+_HEADER = struct.Struct(_HEADER_FORMAT)
+
+HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+
+_NEEDS_BYTESWAP = sys.byteorder != "little"
+
+
+class SnapshotFormatError(ValueError):
+    """Snapshot is not in a format this version can decode."""
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self.indices: Dict[str, int] = {}
+
+        # Index in this table of each (process-local) tag name id.
+        self.tag_indices: Dict[int, int] = {}
+
+    def index(self, value: str) -> int:
+        index = self.indices.get(value, None)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self.indices[value] = index
+        return index
+
+    def tag_index(self, tag_id: int) -> int:
+        index = self.tag_indices.get(tag_id, None)
+        if index is None:
+            index = self.index(tag_name(tag_id))
+            self.tag_indices[tag_id] = index
+        return index
+
+
+def _to_bytes(values: "array[int]") -> bytes:
+    if _NEEDS_BYTESWAP:  # pragma: no cover
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _tag_name_ids(
+    medium: SpindexedMedium,
+) -> Tuple["array[int]", "array[int]", "array[int]"]:
+    tag_names = medium.tag_names
+    if isinstance(tag_names, SpindexedMediumTagNames):
+        return (*tag_names.ids(), tag_names.derivation_counts())
+    return (
+        array("I", (tag_name_id(n) for n in tag_names.innate)),
+        array("I", (tag_name_id(n) for n in tag_names.searchable)),
+        array(
+            "H", (tag_names.derivation_count(n) for n in tag_names.searchable)
+        ),
+    )
+
+
+class _Columns(NamedTuple):
+    """All columns of a snapshot, in stored order (see the module docstring)."""
+
+    ids: "array[int]"
+    aspect_ratios: "array[int]"
+    hashes: "array[int]"
+    mime_types: "array[int]"
+    ratings: "array[int]"
+    innate_counts: "array[int]"
+    searchable_counts: "array[int]"
+    thumbnail_packs: "array[int]"
+    thumbnail_lengths: "array[int]"
+    thumbnail_offsets: "array[int]"
+    innate: "array[int]"
+    searchable: "array[int]"
+    counts: "array[int]"
+
+    @classmethod
+    def empty(cls) -> "_Columns":
+        return cls(
+            array("I"),
+            array("I"),
+            array("I"),
+            array("I"),
+            array("I"),
+            array("I"),
+            array("I"),
+            array("I"),
+            array("I"),
+            array("Q"),
+            array("I"),
+            array("I"),
+            array("H"),
+        )
+
+    def append(
+        self,
+        strings: _StringTable,
+        medium: SpindexedMedium,
+        ref: Optional[BlobRef],
+    ) -> None:
+        self.ids.append(medium.medium_id)
+        self.aspect_ratios.append(strings.index(medium.aspect_ratio))
+        self.hashes.append(strings.index(medium.medium_hash))
+        self.mime_types.append(strings.index(medium.mime_type))
+        self.ratings.append(strings.index(medium.rating))
+
+        innate_ids, searchable_ids, derivation_counts = _tag_name_ids(medium)
+        self.innate_counts.append(len(innate_ids))
+        self.innate.extend(strings.tag_index(i) for i in innate_ids)
+        self.searchable_counts.append(len(searchable_ids))
+        self.searchable.extend(strings.tag_index(i) for i in searchable_ids)
+        self.counts.extend(derivation_counts)
+
+        self.thumbnail_packs.append(ref.pack if ref else 0)
+        self.thumbnail_offsets.append(ref.offset if ref else 0)
+        self.thumbnail_lengths.append(ref.length if ref else 0)
+
+    def to_bytes(self) -> List[bytes]:
+        return [_to_bytes(c) for c in tuple(self)]
+
+
+def encode(media: SpindexMedia) -> bytes:
+    """Encode all media (and their tiny thumbnail positions)."""
+
+    strings = _StringTable()
+    columns = _Columns.empty()
+    for medium_id in sorted(media.data):
+        columns.append(
+            strings,
+            media.data[medium_id],  # type: ignore
+            media.get_tiny_thumbnail(medium_id),
+        )
+
+    encoded_strings = [s.encode("utf-8") for s in strings.strings]
+    string_bytes = b"".join(encoded_strings)
+
+    parts = [
+        _HEADER.pack(
+            _MAGIC,
+            VERSION,
+            len(columns.ids),
+            len(encoded_strings),
+            len(string_bytes),
+            len(columns.innate),
+            len(columns.searchable),
+        ),
+        _to_bytes(array("I", (len(s) for s in encoded_strings))),
+        string_bytes,
+    ]
+    parts.extend(columns.to_bytes())
+    return b"".join(parts)
+
+
+def check_header(header: bytes) -> None:
+    """Raise SnapshotFormatError unless header belongs to a snapshot
+    in the current format."""
+
+    if len(header) < HEADER_SIZE:
+        raise SnapshotFormatError("Snapshot is truncated")
+    magic, version, *_ = _HEADER.unpack_from(header)
+    if magic != _MAGIC:
+        raise SnapshotFormatError("Not a Spindex snapshot")
+    if version != VERSION:
+        raise SnapshotFormatError(f"Unsupported snapshot version {version}")
+
+
+class _Reader:
+    def __init__(self, data: memoryview, offset: int) -> None:
+        self.data = data
+        self.offset = offset
+
+    def read_bytes(self, length: int) -> bytes:
+        start = self.offset
+        self.offset += length
+        if self.offset > len(self.data):
+            raise SnapshotFormatError("Snapshot is truncated")
+        return bytes(self.data[start : self.offset])
+
+    def read_array(self, typecode: str, count: int) -> "array[int]":
+        result = array(typecode)
+        result.frombytes(self.read_bytes(count * result.itemsize))
+        if _NEEDS_BYTESWAP:  # pragma: no cover
+            result.byteswap()
+        return result
+
+
+def _read_strings(reader: _Reader, count: int, byte_count: int) -> List[str]:
+    lengths = reader.read_array("I", count)
+    string_bytes = reader.read_bytes(byte_count)
+
+    result = []
+    offset = 0
+    for length in lengths:
+        result.append(string_bytes[offset : offset + length].decode("utf-8"))
+        offset += length
+    return result
+
+
+def _read(data: memoryview) -> Tuple[List[str], _Columns]:
+    check_header(bytes(data[:HEADER_SIZE]))
+    (
+        _,
+        _,
+        media_count,
+        string_count,
+        string_byte_count,
+        innate_count,
+        searchable_count,
+    ) = _HEADER.unpack_from(data)
+
+    reader = _Reader(data, HEADER_SIZE)
+    strings = _read_strings(reader, string_count, string_byte_count)
+    columns = _Columns(
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("I", media_count),
+        reader.read_array("Q", media_count),
+        reader.read_array("I", innate_count),
+        reader.read_array("I", searchable_count),
+        reader.read_array("H", searchable_count),
+    )
+    return strings, columns
+
+
+class _TagNamesReader:
+    """Reads the tag names of one medium after the other.
+
+    Only strings which actually are tag names are interned, and each of
+    them only once."""
+
+    def __init__(self, strings: List[str], columns: _Columns) -> None:
+        self.strings = strings
+        self.columns = columns
+        self.tag_ids: List[Optional[int]] = [None] * len(strings)
+        self.innate_offset = 0
+        self.searchable_offset = 0
+
+    def _tag_ids(self, indices: "array[int]") -> List[int]:
+        result = []
+        for index in indices:
+            tag_id = self.tag_ids[index]
+            if tag_id is None:
+                tag_id = tag_name_id(self.strings[index])
+                self.tag_ids[index] = tag_id
+            result.append(tag_id)
+        return result
+
+    def read(self, i: int) -> SpindexedMediumTagNames:
+        """Read the tag names of the i-th medium."""
+        columns = self.columns
+        innate_end = self.innate_offset + columns.innate_counts[i]
+        searchable_end = self.searchable_offset + columns.searchable_counts[i]
+
+        innate = sorted(
+            self._tag_ids(columns.innate[self.innate_offset : innate_end])
+        )
+        searchable = sorted(
+            zip(
+                self._tag_ids(
+                    columns.searchable[self.searchable_offset : searchable_end]
+                ),
+                columns.counts[self.searchable_offset : searchable_end],
+            )
+        )
+        self.innate_offset, self.searchable_offset = innate_end, searchable_end
+
+        return SpindexedMediumTagNames.from_ids(
+            array("I", innate),
+            array("I", (tag_id for tag_id, _ in searchable)),
+            array("H", (count for _, count in searchable)),
+        )
+
+
+def decode(data: memoryview) -> SpindexMedia:
+    """Decode a snapshot created by encode."""
+
+    strings, columns = _read(data)
+    tag_names = _TagNamesReader(strings, columns)
+
+    media = SpindexMedia()
+    for i, medium_id in enumerate(columns.ids):
+        media.add(
+            SpindexedMedium(
+                medium_id,
+                strings[columns.aspect_ratios[i]],
+                strings[columns.hashes[i]],
+                strings[columns.mime_types[i]],
+                strings[columns.ratings[i]],
+                None,
+                tag_names.read(i),
+            )
+        )
+        if columns.thumbnail_packs[i]:
+            media.set_tiny_thumbnail(
+                medium_id,
+                BlobRef(
+                    columns.thumbnail_packs[i],
+                    columns.thumbnail_offsets[i],
+                    columns.thumbnail_lengths[i],
+                ),
+            )
+
+    return media
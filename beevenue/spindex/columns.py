@@ -0,0 +1,141 @@
+"""Columnar copies of per-medium numbers, as NumPy arrays.
+
+Row i of each column belongs to the medium with id i. Medium ids are
+assigned densely by the SQL database, so few rows go unused. This way,
+terms like "tags>3" can be evaluated on many media at once, as a few
+vectorized comparisons, instead of medium by medium.
+
+Rows are stored in blocks, which copies (see MediaColumns.copy) share
+until either modifies them."""
+
+from collections import Counter
+from typing import Callable, Dict, List, Set
+
+import numpy as np
+
+from ..types import MediumDocument
+from .idset import MediumIdSet
+
+Predicate = Callable[[np.ndarray], np.ndarray]
+
+_BLOCK_ROWS = 4096
+
+
+class _Block:
+    """Rows of _BLOCK_ROWS consecutive medium ids."""
+
+    def __init__(self) -> None:
+        self.present: np.ndarray = np.zeros(_BLOCK_ROWS, dtype=np.bool_)
+        self.tag_count: np.ndarray = np.zeros(_BLOCK_ROWS, dtype=np.uint16)
+
+        # Number of innate tags named "<category>:...", by category.
+        self.category_counts: Dict[str, np.ndarray] = {}
+
+    def copy(self) -> "_Block":
+        result = _Block()
+        result.present = self.present.copy()
+        result.tag_count = self.tag_count.copy()
+        result.category_counts = {
+            category: counts.copy()
+            for category, counts in self.category_counts.items()
+        }
+        return result
+
+    def tag_count_column(self, category: str) -> np.ndarray:
+        if not category:
+            return self.tag_count
+        counts = self.category_counts.get(category, None)
+        if counts is None:
+            return np.zeros(_BLOCK_ROWS, dtype=np.uint16)
+        return counts
+
+
+class MediaColumns:
+    """Innate tag count (in total, and per category) of each medium."""
+
+    def __init__(self) -> None:
+        self._blocks: Dict[int, _Block] = {}
+
+        # Blocks only this refers to, and which it can thus modify in place.
+        self._owned: Set[int] = set()
+
+    def copy(self) -> "MediaColumns":
+        result = MediaColumns()
+        result._blocks = dict(self._blocks)  # pylint: disable=protected-access
+
+        # From now on, both share all blocks.
+        self._owned = set()
+        return result
+
+    def _modifiable_block(self, index: int) -> _Block:
+        block = self._blocks.get(index, None)
+        if block is None:
+            block = _Block()
+        elif index in self._owned:
+            return block
+        else:
+            block = block.copy()
+        self._blocks[index] = block
+        self._owned.add(index)
+        return block
+
+    def set(self, medium: MediumDocument) -> None:
+        index, row = divmod(medium.medium_id, _BLOCK_ROWS)
+        block = self._modifiable_block(index)
+
+        innate = medium.tag_names.innate
+        block.present[row] = True
+        block.tag_count[row] = len(innate)
+
+        categories = Counter(
+            name.split(":", 1)[0] for name in innate if ":" in name
+        )
+        for category, counts in block.category_counts.items():
+            counts[row] = categories.pop(category, 0)
+        for category, count in categories.items():
+            counts = np.zeros(_BLOCK_ROWS, dtype=np.uint16)
+            counts[row] = count
+            block.category_counts[category] = counts
+
+    def remove(self, medium_id: int) -> None:
+        index, row = divmod(medium_id, _BLOCK_ROWS)
+        block = self._blocks.get(index, None)
+        if block is None or not block.present[row]:
+            return
+
+        block = self._modifiable_block(index)
+        block.present[row] = False
+        block.tag_count[row] = 0
+        for counts in block.category_counts.values():
+            counts[row] = 0
+
+    def select(
+        self, medium_ids: MediumIdSet, predicate: Predicate, category: str = ""
+    ) -> MediumIdSet:
+        """Get those of medium_ids whose innate tag count (of the given
+        category, if any) satisfies predicate.
+
+        predicate gets many of those counts at once, and returns a mask."""
+
+        ids = medium_ids.to_numpy()
+        # The truth value of NumPy arrays is ambiguous, so check the size.
+        if not ids.size:
+            return MediumIdSet()
+
+        selected: List[np.ndarray] = []
+        boundaries = np.flatnonzero(np.diff(ids // _BLOCK_ROWS)) + 1
+        for block_ids in np.split(ids, boundaries):
+            index = int(block_ids[0]) // _BLOCK_ROWS
+            block = self._blocks.get(index, None)
+            if block is None:
+                continue
+
+            rows = block_ids - index * _BLOCK_ROWS
+            present = block.present[rows]
+            block_ids, rows = block_ids[present], rows[present]
+            mask = predicate(block.tag_count_column(category)[rows])
+            selected.append(block_ids[mask])
+
+        if not selected:
+            return MediumIdSet()
+        return MediumIdSet.from_numpy(np.concatenate(selected))
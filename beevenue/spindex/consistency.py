@@ -0,0 +1,171 @@
+"""Check whether the Spindex still matches the SQL database.
+
+Both sides are compared medium by medium, using a fingerprint of what
+the Spindex stores about each medium (innate tags, searchable names with
+their derivation counts, rating, hash and aspect ratio). SQL is read in
+batches of plain tuples, so this takes time linear in the number of
+media, and memory linear in the batch size. Only the media which differ
+need to be reindexed."""
+
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from flask import g
+
+from .load import TagClosures
+from .load.single import _SingleLoadDataSource
+from ..models import Medium, MediaTags, Tag
+from ..types import MediumDocument
+
+_BATCH_SIZE = 1000
+
+_Fingerprint = Tuple[
+    str, str, str, Tuple[str, ...], Tuple[Tuple[str, int], ...]
+]
+
+
+class ConsistencyReport(NamedTuple):
+    """Media which differ between the Spindex and the SQL database."""
+
+    checked: int
+    # In SQL, but not in the Spindex.
+    missing: List[int]
+    # In the Spindex, but not in SQL (anymore).
+    extra: List[int]
+    # In both, but with different fingerprints.
+    differing: List[int]
+
+    @property
+    def is_consistent(self) -> bool:
+        return not (self.missing or self.extra or self.differing)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "isConsistent": self.is_consistent,
+            "missing": self.missing,
+            "extra": self.extra,
+            "differing": self.differing,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"Checked {self.checked} media: {len(self.missing)} missing, "
+            f"{len(self.extra)} extra, {len(self.differing)} differing"
+        )
+
+
+def _fingerprint(
+    rating: str,
+    medium_hash: str,
+    aspect_ratio: str,
+    tags: Iterable[str],
+    derivation_counts: Dict[str, int],
+) -> _Fingerprint:
+    return (
+        rating,
+        medium_hash,
+        aspect_ratio,
+        tuple(sorted(tags)),
+        tuple(sorted(derivation_counts.items())),
+    )
+
+
+def _spindex_fingerprint(medium: MediumDocument) -> _Fingerprint:
+    tag_names = medium.tag_names
+    return _fingerprint(
+        medium.rating,
+        medium.medium_hash,
+        medium.aspect_ratio,
+        tag_names.innate,
+        {n: tag_names.derivation_count(n) for n in tag_names.searchable},
+    )
+
+
+def _sql_batches() -> Iterator[Dict[int, _Fingerprint]]:
+    """Yield fingerprints of all media in SQL, in batches ordered by id."""
+
+    session = g.db
+    data_source = _SingleLoadDataSource()
+    tag_closures = TagClosures()
+    last_id = -1
+    while True:
+        rows = (
+            session.query(
+                Medium.id, Medium.rating, Medium.hash, Medium.aspect_ratio
+            )
+            .filter(Medium.id > last_id)
+            .order_by(Medium.id)
+            .limit(_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return
+
+        first_id, last_id = rows[0][0], rows[-1][0]
+        tags: Dict[int, Dict[int, str]] = {row[0]: {} for row in rows}
+        for medium_id, tag_id, tag_name in (
+            session.query(MediaTags.c.medium_id, Tag.id, Tag.tag)
+            .join(Tag, Tag.id == MediaTags.c.tag_id)
+            .filter(MediaTags.c.medium_id.between(first_id, last_id))
+        ):
+            tags[medium_id][tag_id] = tag_name
+
+        tag_closures.prefetch(
+            data_source, {i for innate in tags.values() for i in innate}
+        )
+
+        yield {
+            medium_id: _fingerprint(
+                rating,
+                medium_hash,
+                str(aspect_ratio),
+                tags[medium_id].values(),
+                tag_closures.derivation_counts(data_source, tags[medium_id]),
+            )
+            for medium_id, rating, medium_hash, aspect_ratio in rows
+        }
+
+
+def check(repair: bool = False) -> ConsistencyReport:
+    """Compare the Spindex to the SQL database.
+
+    If repair is set, reindex (or remove) all media which differ."""
+
+    spindex_ids = sorted(m.medium_id for m in g.spindex.all())
+    spindex_index = 0
+
+    checked = 0
+    missing: List[int] = []
+    extra: List[int] = []
+    differing: List[int] = []
+
+    for batch in _sql_batches():
+        checked += len(batch)
+        last_id = max(batch)
+
+        # Spindex ids up to the end of this batch which SQL does not have.
+        while (
+            spindex_index < len(spindex_ids)
+            and spindex_ids[spindex_index] <= last_id
+        ):
+            medium_id = spindex_ids[spindex_index]
+            if medium_id not in batch:
+                extra.append(medium_id)
+            spindex_index += 1
+
+        for medium_id, fingerprint in batch.items():
+            medium = g.spindex.get_medium(medium_id)
+            if medium is None:
+                missing.append(medium_id)
+            elif _spindex_fingerprint(medium) != fingerprint:
+                differing.append(medium_id)
+
+    extra.extend(spindex_ids[spindex_index:])
+
+    if repair:
+        for medium_id in extra:
+            g.spindex.remove_medium(medium_id)
+        if missing or differing:
+            g.spindex.reindex_media(missing + differing)
+
+    return ConsistencyReport(checked, missing, extra, differing)
@@ -0,0 +1,87 @@
+"""Dictionary whose copies share their entries until they are modified.
+
+Entries are kept in chunks, by the hash of their key. Copying only copies
+the (small) dictionary of chunks, and modifying an entry only copies the
+chunk it is in, unless this dictionary has done so already. So copying
+a large dictionary, and modifying a few of its entries, is cheap."""
+
+from typing import Dict, Iterator, MutableMapping, Set, TypeVar
+
+TKey = TypeVar("TKey")
+TValue = TypeVar("TValue")
+
+# Number of chunks (at most). Must be a power of two.
+_CHUNK_COUNT = 1024
+
+
+def _chunk_index(key: object) -> int:
+    return hash(key) & (_CHUNK_COUNT - 1)
+
+
+class CopyOnWriteDict(MutableMapping[TKey, TValue]):
+    """Dictionary whose copies (see copy) share unmodified entries."""
+
+    def __init__(self) -> None:
+        self._chunks: Dict[int, Dict[TKey, TValue]] = {}
+        self._length = 0
+
+        # Chunks only this dictionary refers to, and which it can thus
+        # modify in place.
+        self._owned: Set[int] = set()
+
+    def copy(self) -> "CopyOnWriteDict[TKey, TValue]":
+        result: CopyOnWriteDict[TKey, TValue] = CopyOnWriteDict()
+        # pylint: disable=protected-access
+        result._chunks = dict(self._chunks)
+        result._length = self._length
+
+        # From now on, both share all chunks.
+        self._owned = set()
+        return result
+
+    def _modifiable_chunk(self, index: int) -> Dict[TKey, TValue]:
+        chunk = self._chunks.get(index, None)
+        if chunk is None:
+            chunk = {}
+        elif index in self._owned:
+            return chunk
+        else:
+            chunk = dict(chunk)
+        self._chunks[index] = chunk
+        self._owned.add(index)
+        return chunk
+
+    def __getitem__(self, key: TKey) -> TValue:
+        chunk = self._chunks.get(_chunk_index(key), None)
+        if chunk is None:
+            raise KeyError(key)
+        return chunk[key]
+
+    def __setitem__(self, key: TKey, value: TValue) -> None:
+        chunk = self._modifiable_chunk(_chunk_index(key))
+        if key not in chunk:
+            self._length += 1
+        chunk[key] = value
+
+    def __delitem__(self, key: TKey) -> None:
+        index = _chunk_index(key)
+        if key not in self._chunks.get(index, {}):
+            raise KeyError(key)
+
+        chunk = self._modifiable_chunk(index)
+        del chunk[key]
+        self._length -= 1
+        if not chunk:
+            del self._chunks[index]
+            self._owned.discard(index)
+
+    def __contains__(self, key: object) -> bool:
+        chunk = self._chunks.get(_chunk_index(key), None)
+        return chunk is not None and key in chunk
+
+    def __iter__(self) -> Iterator[TKey]:
+        for chunk in list(self._chunks.values()):
+            yield from chunk
+
+    def __len__(self) -> int:
+        return self._length
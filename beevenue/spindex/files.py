@@ -0,0 +1,56 @@
+"""Primitives shared by all files of the on-disk Spindex.
+
+This imports nothing else of the Spindex, so that snapshots, their
+journal and blob packs can all use it."""
+
+from contextlib import contextmanager
+import os
+from threading import get_ident, RLock
+from typing import Generator, NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Not available on Windows. There, only threads of the same process
+    # are synchronized, which is fine for local development.
+    fcntl = None  # type: ignore
+
+_LOCK_FILE_NAME = "lock"
+
+
+class BlobRef(NamedTuple):
+    """Position of a single blob inside a pack (see blobs.py)."""
+
+    pack: int
+    offset: int
+    length: int
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    temporary_path = f"{path}.tmp.{os.getpid()}.{get_ident()}"
+    with open(temporary_path, "wb") as out_file:
+        out_file.write(data)
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    os.replace(temporary_path, path)
+
+
+_process_lock = RLock()
+
+
+@contextmanager
+def lock(directory: str) -> Generator[None, None, None]:
+    """Exclusively lock the on-disk Spindex in ``directory``.
+
+    Serializes writers both between threads and between processes."""
+
+    with _process_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, _LOCK_FILE_NAME), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,127 @@
+"""Cheap fingerprint of the SQL state the Spindex is derived from.
+
+Every transaction which writes anything (be it by flushing ORM objects,
+or by executing INSERT, UPDATE or DELETE statements directly) increments
+a counter in SQL (see ``models.ChangeCounter``). Together with a few
+aggregates which also catch changes made behind the application's back
+(e.g. imported media, or edited ratings), this tells whether a Spindex
+on disk still matches the SQL database, without having to load the
+whole database."""
+
+from typing import Any, List
+
+from sqlalchemy import BigInteger, case, cast, event, func, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ColumnElement, UpdateBase
+
+from ..models import ChangeCounter, Medium, Tag
+
+_HAS_WRITES = "has_writes"
+
+# Connections used by the current transaction of a session.
+_CONNECTIONS = "connections"
+
+
+def _mark_writes(session: Session, _: Any) -> None:
+    session.info[_HAS_WRITES] = True
+
+
+def _mark_statement_writes(
+    connection: Connection, statement: Any, *_: Any
+) -> None:
+    if isinstance(statement, UpdateBase):
+        connection.info[_HAS_WRITES] = True
+
+
+def _track_connection(session: Session, _: Any, connection: Connection) -> None:
+    connection.info.pop(_HAS_WRITES, None)
+    session.info.setdefault(_CONNECTIONS, []).append(connection)
+
+
+def _forget_writes(session: Session) -> None:
+    session.info.pop(_HAS_WRITES, None)
+    session.info.pop(_CONNECTIONS, None)
+
+
+def _forget_connections(session: Session, transaction: Any) -> None:
+    if transaction.parent is None:
+        session.info.pop(_CONNECTIONS, None)
+
+
+def _count_change(session: Session) -> None:
+    has_writes = session.info.pop(_HAS_WRITES, False)
+    connections: List[Connection] = session.info.pop(_CONNECTIONS, [])
+    for connection in connections:
+        if connection.info.pop(_HAS_WRITES, False):
+            has_writes = True
+    if not (has_writes or session.new or session.dirty or session.deleted):
+        return
+
+    result = session.execute(
+        ChangeCounter.update()
+        .where(ChangeCounter.c.id == 1)
+        .values(value=ChangeCounter.c.value + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(ChangeCounter.insert().values(id=1, value=1))
+
+
+def setup_change_counter() -> None:
+    """Count all transactions which write anything from now on."""
+
+    for name, listener in (
+        ("after_flush", _mark_writes),
+        ("after_begin", _track_connection),
+        ("after_rollback", _forget_writes),
+        ("after_transaction_end", _forget_connections),
+        ("before_commit", _count_change),
+    ):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+    if not event.contains(Engine, "after_execute", _mark_statement_writes):
+        event.listen(Engine, "after_execute", _mark_statement_writes)
+
+
+def _code(expression: ColumnElement, values: str) -> ColumnElement:
+    """Number (1-based index in values) of the value of expression."""
+
+    return case(
+        [(expression == value, code) for code, value in enumerate(values, 1)],
+        else_=0,
+    )
+
+
+def _content_checksum() -> ColumnElement:
+    """Checksum over the rating and hash of all media.
+
+    Only uses SQL which all supported databases understand, so hashes
+    only contribute their first and last (hexadecimal) digit."""
+
+    digits = "0123456789abcdef"
+    row_code = (
+        _code(Medium.rating, "esqu") * 289
+        + _code(func.substr(Medium.hash, 1, 1), digits) * 17
+        + _code(func.substr(Medium.hash, func.length(Medium.hash), 1), digits)
+    )
+    return func.sum(cast(Medium.id, BigInteger) * row_code)
+
+
+def sql_fingerprint(session: Session) -> str:
+    """Get the fingerprint of the current state of the SQL database."""
+
+    row = session.execute(
+        select(
+            [
+                select([ChangeCounter.c.value])
+                .where(ChangeCounter.c.id == 1)
+                .as_scalar(),
+                select([func.count(Medium.id)]).as_scalar(),
+                select([func.max(Medium.id)]).as_scalar(),
+                select([func.max(Tag.id)]).as_scalar(),
+                select([_content_checksum()]).as_scalar(),
+            ]
+        )
+    ).first()
+    return ".".join(str(value or 0) for value in row)
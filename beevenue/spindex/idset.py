@@ -0,0 +1,351 @@
+"""Compact set of medium ids, stored as a Roaring-style bitmap.
+
+Ids are split into chunks of 65536 by their upper bits. Each chunk stores
+the lower 16 bits of its ids either as a sorted array (for sparse chunks),
+or as a bitmap packed into a single integer (for dense chunks). Both are
+far smaller than a set of Python ints, and set operations on dense chunks
+work on whole machine words at once.
+
+Copies share their chunks until either modifies them, so copying is
+cheap no matter how many ids a set contains.
+
+Instances are plain Python objects, so they can be pickled."""
+
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+import numpy as np
+
+# Chunks with more ids than this are stored as bitmaps (which always need
+# 8 KiB), chunks with fewer ids as arrays of 2 bytes per id.
+_ARRAY_MAX_SIZE = 4096
+
+_CHUNK_BITS = 16
+_LOW_MASK = (1 << _CHUNK_BITS) - 1
+_BITMAP_BYTES = (1 << _CHUNK_BITS) // 8
+
+_Container = Union["array[int]", int]
+
+# For each byte value, the positions of its set bits.
+_BYTE_BITS = [
+    tuple(bit for bit in range(8) if byte & (1 << bit)) for byte in range(256)
+]
+
+
+def _cardinality(container: _Container) -> int:
+    if isinstance(container, int):
+        return bin(container).count("1")
+    return len(container)
+
+
+def _iterate(container: _Container) -> Iterator[int]:
+    if not isinstance(container, int):
+        return iter(container)
+    return _iterate_bitmap(container)
+
+
+def _iterate_bitmap(bitmap: int) -> Iterator[int]:
+    for index, byte in enumerate(bitmap.to_bytes(_BITMAP_BYTES, "little")):
+        if byte:
+            offset = index * 8
+            for bit in _BYTE_BITS[byte]:
+                yield offset + bit
+
+
+def _to_bitmap(container: _Container) -> int:
+    if isinstance(container, int):
+        return container
+    bitmap = 0
+    for low in container:
+        bitmap |= 1 << low
+    return bitmap
+
+
+def _copy(container: _Container) -> _Container:
+    if isinstance(container, int):
+        return container
+    return array("H", container)
+
+
+def _contains(container: _Container, low: int) -> bool:
+    if isinstance(container, int):
+        return bool((container >> low) & 1)
+    index = bisect_left(container, low)
+    return index < len(container) and container[index] == low
+
+
+def _normalize(container: _Container) -> Optional[_Container]:
+    """Pick the smaller representation, or None if container is empty."""
+
+    cardinality = _cardinality(container)
+    if cardinality == 0:
+        return None
+    if isinstance(container, int):
+        if cardinality <= _ARRAY_MAX_SIZE:
+            return array("H", _iterate_bitmap(container))
+        return container
+    if cardinality > _ARRAY_MAX_SIZE:
+        return _to_bitmap(container)
+    return container
+
+
+def _and_array(ids: "array[int]", other: _Container) -> Optional[_Container]:
+    return _normalize(array("H", (i for i in ids if _contains(other, i))))
+
+
+def _and(left: _Container, right: _Container) -> Optional[_Container]:
+    # Iterate over an array (never a bitmap), and look ids up in the other.
+    if not isinstance(left, int):
+        return _and_array(left, right)
+    if not isinstance(right, int):
+        return _and_array(right, left)
+    return _normalize(left & right)
+
+
+def _or(left: _Container, right: _Container) -> Optional[_Container]:
+    if isinstance(left, int) or isinstance(right, int):
+        return _normalize(_to_bitmap(left) | _to_bitmap(right))
+    return _normalize(array("H", sorted(set(left).union(right))))
+
+
+def _and_not(left: _Container, right: _Container) -> Optional[_Container]:
+    if isinstance(left, int):
+        return _normalize(left & ~_to_bitmap(right))
+    return _normalize(array("H", (i for i in left if not _contains(right, i))))
+
+
+class MediumIdSet:
+    """Set of (non-negative) medium ids.
+
+    Supports the usual set operators: ``&`` (AND), ``|`` (OR) and ``-``
+    (ANDNOT), as well as ``len`` (cardinality). Iterates in ascending
+    order."""
+
+    def __init__(self, ids: Iterable[int] = ()) -> None:
+        self._chunks: Dict[int, _Container] = {}
+
+        # Chunks whose array only this set refers to, and which it can thus
+        # modify in place. (Bitmaps are never modified in place.) None
+        # instead of an empty set, as most sets are never modified.
+        self._owned: Optional[Set[int]] = None
+        for i in ids:
+            self.add(i)
+
+    @staticmethod
+    def _from_chunks(chunks: Dict[int, _Container]) -> "MediumIdSet":
+        result = MediumIdSet()
+        result.replace_chunks(chunks)
+        return result
+
+    def replace_chunks(self, chunks: Dict[int, _Container]) -> None:
+        """Replace all ids by those in chunks (see the module docstring).
+
+        chunks is used as is, so it must not be modified afterwards."""
+        self._chunks = chunks
+        self._owned = None
+
+    def _modifiable(self, high: int, container: "array[int]") -> "array[int]":
+        """Get container (the array of chunk high) to modify in place.
+
+        Unless only this set refers to it, it is replaced by a copy first."""
+
+        if self._owned is None:
+            self._owned = set()
+        if high not in self._owned:
+            container = array("H", container)
+            self._chunks[high] = container
+            self._owned.add(high)
+        return container
+
+    def __contains__(self, i: object) -> bool:
+        if not isinstance(i, int) or i < 0:
+            return False
+        container = self._chunks.get(i >> _CHUNK_BITS, None)
+        return container is not None and _contains(container, i & _LOW_MASK)
+
+    def __len__(self) -> int:
+        return sum(_cardinality(c) for c in self._chunks.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self._chunks):
+            offset = high << _CHUNK_BITS
+            for low in _iterate(self._chunks[high]):
+                yield offset + low
+
+    def descending_slice(self, start: int, stop: int) -> List[int]:
+        """Get the ids at positions start to stop (exclusive) when sorted
+        in descending order.
+
+        Whole chunks before start are skipped by their cardinality, so
+        this never visits (let alone sorts) all ids."""
+
+        result: List[int] = []
+        for high in sorted(self._chunks, reverse=True):
+            if start >= stop:
+                break
+
+            container = self._chunks[high]
+            cardinality = _cardinality(container)
+            if start >= cardinality:
+                start -= cardinality
+                stop -= cardinality
+                continue
+
+            if isinstance(container, int):
+                container = array("H", _iterate_bitmap(container))
+            offset = high << _CHUNK_BITS
+            for index in range(start, min(stop, cardinality)):
+                result.append(offset + container[cardinality - 1 - index])
+
+            stop -= cardinality
+            start = 0
+
+        return result
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, MediumIdSet):
+            return self._chunks == other._chunks
+        if isinstance(other, (set, frozenset)):
+            return len(self) == len(other) and all(i in self for i in other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"MediumIdSet({list(self)!r})"
+
+    def add(self, i: int) -> None:
+        if i < 0:
+            raise ValueError("Medium ids must not be negative")
+
+        high, low = i >> _CHUNK_BITS, i & _LOW_MASK
+        container = self._chunks.get(high, None)
+        if container is None:
+            self._chunks[high] = array("H", (low,))
+        elif isinstance(container, int):
+            self._chunks[high] = container | (1 << low)
+        elif not _contains(container, low):
+            container = self._modifiable(high, container)
+            insort(container, low)
+            if len(container) > _ARRAY_MAX_SIZE:
+                self._chunks[high] = _to_bitmap(container)
+
+    def discard(self, i: int) -> None:
+        if i not in self:
+            return
+
+        high, low = i >> _CHUNK_BITS, i & _LOW_MASK
+        container = self._chunks[high]
+        if isinstance(container, int):
+            new_container = _normalize(container & ~(1 << low))
+        else:
+            container = self._modifiable(high, container)
+            del container[bisect_left(container, low)]
+            new_container = container if container else None
+
+        if new_container is None:
+            del self._chunks[high]
+        else:
+            self._chunks[high] = new_container
+
+    def to_numpy(self) -> np.ndarray:
+        """Get all ids as sorted NumPy array (of int64)."""
+
+        parts = []
+        for high in sorted(self._chunks):
+            container = self._chunks[high]
+            if isinstance(container, int):
+                bits = np.unpackbits(
+                    np.frombuffer(
+                        container.to_bytes(_BITMAP_BYTES, "little"),
+                        dtype=np.uint8,
+                    ),
+                    bitorder="little",
+                )
+                lows = np.flatnonzero(bits)
+            else:
+                lows = np.frombuffer(container, dtype=np.uint16)
+            parts.append(lows.astype(np.int64) + (high << _CHUNK_BITS))
+
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    @staticmethod
+    def from_numpy(ids: np.ndarray) -> "MediumIdSet":
+        """Create from a sorted NumPy array of distinct ids."""
+
+        chunks: Dict[int, _Container] = {}
+        # The truth value of NumPy arrays is ambiguous, so check the size.
+        if not ids.size:
+            return MediumIdSet._from_chunks(chunks)
+
+        boundaries = np.flatnonzero(np.diff(ids >> _CHUNK_BITS)) + 1
+        for chunk in np.split(ids, boundaries):
+            lows: np.ndarray = (chunk & _LOW_MASK).astype(np.uint16)
+            high = int(chunk[0]) >> _CHUNK_BITS
+            if len(lows) > _ARRAY_MAX_SIZE:
+                bits: np.ndarray = np.zeros(1 << _CHUNK_BITS, dtype=np.uint8)
+                bits[lows] = 1
+                chunks[high] = int.from_bytes(
+                    np.packbits(bits, bitorder="little").tobytes(), "little"
+                )
+            else:
+                container = array("H")
+                container.frombytes(lows.tobytes())
+                chunks[high] = container
+        return MediumIdSet._from_chunks(chunks)
+
+    def copy(self) -> "MediumIdSet":
+        # From now on, both share all chunks.
+        self._owned = None
+        return MediumIdSet._from_chunks(dict(self._chunks))
+
+    def __and__(self, other: "MediumIdSet") -> "MediumIdSet":
+        chunks: Dict[int, _Container] = {}
+        for high, container in self._chunks.items():
+            other_container = other._chunks.get(high, None)
+            if other_container is None:
+                continue
+            result = _and(container, other_container)
+            if result is not None:
+                chunks[high] = result
+        return MediumIdSet._from_chunks(chunks)
+
+    def __or__(self, other: "MediumIdSet") -> "MediumIdSet":
+        result = self.copy()
+        result |= other
+        return result
+
+    def __ior__(self, other: "MediumIdSet") -> "MediumIdSet":
+        for high, other_container in other._chunks.items():
+            container = self._chunks.get(high, None)
+            if container is None:
+                self._chunks[high] = _copy(other_container)
+                continue
+            result = _or(container, other_container)
+            if result is not None:
+                self._chunks[high] = result
+        return self
+
+    def __sub__(self, other: "MediumIdSet") -> "MediumIdSet":
+        chunks: Dict[int, _Container] = {}
+        for high, container in self._chunks.items():
+            other_container = other._chunks.get(high, None)
+            if other_container is None:
+                chunks[high] = _copy(container)
+                continue
+            result = _and_not(container, other_container)
+            if result is not None:
+                chunks[high] = result
+        return MediumIdSet._from_chunks(chunks)
+
+    def __iand__(self, other: "MediumIdSet") -> "MediumIdSet":
+        self.replace_chunks((self & other)._chunks)
+        return self
+
+    def __isub__(self, other: "MediumIdSet") -> "MediumIdSet":
+        self.replace_chunks((self - other)._chunks)
+        return self
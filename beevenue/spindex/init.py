@@ -2,7 +2,10 @@ from typing import Any
 
 from flask import g
 
+from .. import paths
 from ..flask import BeevenueFlask
+from . import snapshot
+from .fingerprint import setup_change_counter, sql_fingerprint
 from .load.full import full_load
 from .signal_handlers import setup_signals
 from .spindex import Spindex
@@ -13,10 +16,26 @@ def init_app(app: BeevenueFlask) -> None:
     app.before_request(_set_spindex)
     app.teardown_appcontext(_close_spindex)
 
-    full_load()
+    setup_change_counter()
+    if not _is_current():
+        full_load()
     setup_signals()
 
 
+def _is_current() -> bool:
+    """Does the Spindex on disk still match the SQL database?
+
+    If so, the full load at startup can be skipped."""
+
+    directory = paths.spindex_directory()
+    pointer = snapshot.current(directory)
+    if pointer.base == 0 or not pointer.fingerprint:
+        return False
+    if not snapshot.is_loadable(directory, pointer.base):
+        return False
+    return pointer.fingerprint == sql_fingerprint(g.db)
+
+
 def _set_spindex() -> None:
     g.spindex = Spindex()
 
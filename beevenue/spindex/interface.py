@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-
+from .journal import Mutation
 from .media import SpindexMedia
 
 
@@ -7,13 +7,18 @@ class SpindexSessionFactory(ABC):
     """Abstract base class for all session factories.
 
     get is used to lazily create a session.
+    apply is used to record a modification of the session.
     exit (to be called on request end) persists changes (if necessary).
     """
 
     @abstractmethod
-    def get(self, do_write: bool) -> SpindexMedia:
+    def get(self) -> SpindexMedia:
         """Get the current Spindex implementation."""
 
+    @abstractmethod
+    def apply(self, mutation: Mutation) -> None:
+        """Record mutation, to be persisted on exit."""
+
     @abstractmethod
     def exit(self) -> None:
         """Persist potential changes made to Spindex to the backing storage."""
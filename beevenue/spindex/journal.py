@@ -0,0 +1,361 @@
+"""Append-only journal of modifications to the Spindex.
+
+Instead of rewriting the whole snapshot whenever a request modifies the
+Spindex, each such request appends a single entry containing all of its
+mutations to the journal of the current snapshot. Readers replay that
+journal on top of the snapshot.
+
+Once the journal grows long, it is compacted into a fresh snapshot in the
+background."""
+
+import os
+import pickle
+import struct
+from threading import Lock, Thread
+from typing import Any, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from . import blobs, files, snapshot
+from .media import SpindexMedia
+
+# Compact the journal into a fresh snapshot once it has this many entries.
+COMPACTION_THRESHOLD = 256
+
+_LENGTH = struct.Struct(">I")
+
+# Mutations which replace the whole state of a single medium.
+# Their first argument is the medium (or its id).
+_MEDIUM_METHODS = ("add", "remove_id", "set_tiny_thumbnail")
+
+# Mutations reflecting changes to tags, aliases or implications, which
+# change the searchable tag names of media loaded from SQL afterwards.
+_TAG_METHODS = ("derive", "remove_alias", "rename_tag")
+
+
+class Mutation(NamedTuple):
+    """Single modification of a SpindexMedia object.
+
+    Calls the SpindexMedia method named ``method`` with ``args``."""
+
+    method: str
+    args: Tuple[Any, ...]
+
+    def apply_to(self, media: SpindexMedia) -> Any:
+        return getattr(media, self.method)(*self.args)
+
+    @property
+    def medium_id(self) -> Optional[int]:
+        """Id of the medium this mutation replaces, if any."""
+
+        if self.method not in _MEDIUM_METHODS:
+            return None
+        if self.method == "add":
+            return int(self.args[0].medium_id)
+        return int(self.args[0])
+
+
+class _Entry(NamedTuple):
+    generation: int
+    mutations: List[Mutation]
+
+
+class ConflictError(Exception):
+    """Other mutations of the same media were appended in the meantime."""
+
+    def __init__(self, latest: snapshot.Pointer, medium_ids: Set[int]):
+        super().__init__(f"Conflicting changes to media {sorted(medium_ids)}")
+        self.latest = latest
+        self.medium_ids = medium_ids
+
+
+def _medium_ids(mutations: List[Mutation]) -> Set[int]:
+    return {m.medium_id for m in mutations if m.medium_id is not None}
+
+
+def _medium_ids_since(
+    directory: str, since: snapshot.Pointer, latest: snapshot.Pointer
+) -> Optional[Set[int]]:
+    """Ids of media replaced by entries after since up to latest.
+
+    Returns None if that cannot be told anymore, or if those entries
+    change tags (which might affect any medium)."""
+
+    if latest.base != since.base:
+        return None
+
+    data = _read_bytes(
+        directory, latest.base, since.journal_size, latest.journal_size
+    )
+    result: Set[int] = set()
+    for entry in _entries(data):
+        if any(m.method in _TAG_METHODS for m in entry.mutations):
+            return None
+        result |= _medium_ids(entry.mutations)
+    return result
+
+
+def append(
+    directory: str,
+    mutations: List[Mutation],
+    fingerprint: str = "",
+    since: Optional[snapshot.Pointer] = None,
+) -> int:
+    """Append mutations as a single new journal entry.
+
+    fingerprint should be that of the SQL database after the changes the
+    mutations reflect. Returns the generation of that entry.
+
+    If since is given, this is a compare-and-swap: Should any entry
+    appended after since replace one of the media replaced by mutations
+    (or change tags, since media in mutations might have been loaded from
+    SQL before those changes), nothing is appended, and ConflictError is
+    raised instead."""
+
+    with files.lock(directory):
+        pointer = snapshot.current(directory)
+        if since is not None and pointer.generation > since.generation:
+            ours = _medium_ids(mutations)
+            if ours:
+                theirs = _medium_ids_since(directory, since, pointer)
+                conflicting = ours if theirs is None else ours & theirs
+                if conflicting:
+                    raise ConflictError(pointer, conflicting)
+
+        generation = pointer.generation + 1
+
+        data = pickle.dumps(
+            _Entry(generation, mutations), protocol=pickle.HIGHEST_PROTOCOL
+        )
+
+        with open(
+            snapshot.journal_path(directory, pointer.base), "ab"
+        ) as journal_file:
+            # Drop whatever a crashed writer might have left behind.
+            journal_file.truncate(pointer.journal_size)
+            journal_file.write(_LENGTH.pack(len(data)))
+            journal_file.write(data)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+        snapshot.set_current(
+            directory,
+            snapshot.Pointer(
+                pointer.base,
+                generation,
+                pointer.journal_size + _LENGTH.size + len(data),
+                fingerprint,
+            ),
+        )
+
+    if generation - pointer.base >= COMPACTION_THRESHOLD:
+        compact_in_background(directory)
+
+    return generation
+
+
+def _read_bytes(directory: str, base: int, start: int, end: int) -> bytes:
+    if start >= end:
+        return bytes()
+
+    with open(snapshot.journal_path(directory, base), "rb") as journal_file:
+        journal_file.seek(start)
+        return journal_file.read(end - start)
+
+
+def _entries(data: bytes) -> Iterator[_Entry]:
+    offset = 0
+    while offset < len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        entry: _Entry = pickle.loads(data[offset : offset + length])
+        offset += length
+        yield entry
+
+
+def replay(
+    media: SpindexMedia,
+    directory: str,
+    pointer: snapshot.Pointer,
+    start: int = 0,
+    after_generation: int = 0,
+) -> None:
+    """Apply journal entries of pointer's base to media.
+
+    Only entries after byte offset start, and newer than after_generation,
+    are applied."""
+
+    data = _read_bytes(directory, pointer.base, start, pointer.journal_size)
+    for entry in _entries(data):
+        if entry.generation <= after_generation:
+            continue
+        for mutation in entry.mutations:
+            mutation.apply_to(media)
+
+
+def load_current(directory: str) -> Tuple[int, SpindexMedia]:
+    """Load the current snapshot and replay its journal on top.
+
+    Returns the generation of the result, and the result itself."""
+
+    try:
+        return load_at(directory, snapshot.current(directory))
+    except FileNotFoundError:
+        # Very rarely, the journal was compacted twice in the meantime,
+        # and the snapshot we were pointed at has already been cleaned up.
+        return load_at(directory, snapshot.current(directory))
+
+
+def load_at(
+    directory: str, pointer: snapshot.Pointer
+) -> Tuple[int, SpindexMedia]:
+    """Load pointer's snapshot and replay its journal on top."""
+
+    media = snapshot.load(directory, pointer.base)
+    replay(media, directory, pointer)
+    return pointer.generation, media
+
+
+def _replay_since(
+    media: SpindexMedia,
+    directory: str,
+    since: snapshot.Pointer,
+    latest: snapshot.Pointer,
+) -> bool:
+    """Apply all journal entries after since up to latest to media.
+
+    Returns False if some of them could not be found anymore."""
+
+    try:
+        if latest.base != since.base:
+            # The journal was compacted in the meantime. Older entries
+            # are only in the journal of since's base.
+            journal_path = snapshot.journal_path(directory, since.base)
+            with open(journal_path, "rb") as journal_file:
+                data = journal_file.read()
+            replayed = since.generation
+            for entry in _entries(data):
+                if since.generation < entry.generation <= latest.base:
+                    for mutation in entry.mutations:
+                        mutation.apply_to(media)
+                    replayed = entry.generation
+            if replayed < latest.base:
+                return False
+
+        replay(
+            media,
+            directory,
+            latest,
+            since.journal_size if latest.base == since.base else 0,
+            after_generation=max(since.generation, latest.base),
+        )
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def publish(
+    directory: str,
+    media: SpindexMedia,
+    fingerprint: str,
+    since: snapshot.Pointer,
+) -> int:
+    """Publish media, which was loaded from SQL while since was current.
+
+    Unlike snapshot.publish, entries appended to the journal since then
+    (i.e. while media was being loaded) are carried over to media.
+    Afterwards, tiny thumbnail packs media does not refer to are removed."""
+
+    with files.lock(directory):
+        latest = snapshot.current(directory)
+        if latest.generation > since.generation:
+            if _replay_since(media, directory, since, latest):
+                fingerprint = latest.fingerprint
+            else:
+                fingerprint = ""
+
+        base = latest.generation + 1
+        snapshot.write(directory, base, media)
+        snapshot.set_current(
+            directory, snapshot.Pointer(base, base, 0, fingerprint)
+        )
+
+    snapshot.remove_older_than(directory, latest.base)
+    _remove_unreferenced_packs(directory, media)
+    return base
+
+
+def _remove_unreferenced_packs(directory: str, media: SpindexMedia) -> None:
+    blobs.remove_unreferenced(
+        directory, {ref.pack for ref in media.tiny_thumbnails.values()}
+    )
+
+
+def compact(directory: str) -> None:
+    """Write the current state as a fresh snapshot, emptying the journal.
+
+    Entries appended while the snapshot is being built are carried over
+    into the journal of the new snapshot. Afterwards, tiny thumbnail packs
+    the result does not refer to are removed."""
+
+    pointer = snapshot.current(directory)
+    if pointer.generation == pointer.base:
+        return
+
+    new_base, media = load_at(directory, pointer)
+    snapshot.write(directory, new_base, media)
+
+    with files.lock(directory):
+        latest = snapshot.current(directory)
+        if latest.base != pointer.base:
+            # Someone else published a newer snapshot in the meantime
+            # (possibly another process compacting the very same journal).
+            if latest.base != new_base:
+                os.remove(snapshot.snapshot_path(directory, new_base))
+            return
+
+        tail = _read_bytes(
+            directory,
+            pointer.base,
+            pointer.journal_size,
+            latest.journal_size,
+        )
+        with open(
+            snapshot.journal_path(directory, new_base), "wb"
+        ) as journal_file:
+            journal_file.write(tail)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+        snapshot.set_current(
+            directory,
+            snapshot.Pointer(
+                new_base, latest.generation, len(tail), latest.fingerprint
+            ),
+        )
+
+    snapshot.remove_older_than(directory, pointer.base)
+
+    # Entries carried over might refer to packs the snapshot does not.
+    for entry in _entries(tail):
+        for mutation in entry.mutations:
+            mutation.apply_to(media)
+    _remove_unreferenced_packs(directory, media)
+
+
+_compacting = Lock()
+
+
+def compact_in_background(directory: str) -> None:
+    """Compact the journal on a background thread.
+
+    Does nothing if this process is already compacting."""
+
+    if not _compacting.acquire(blocking=False):
+        return
+
+    def _run() -> None:
+        try:
+            compact(directory)
+        finally:
+            _compacting.release()
+
+    Thread(target=_run, name="spindex-compaction", daemon=True).start()
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from collections import deque
-from typing import Iterable, List, Set, Tuple
+from collections import Counter
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set, Tuple
 
 from ...models import Medium
 from ..models import SpindexedMedium
@@ -19,43 +19,142 @@ class AbstractDataSource(ABC):
     def implied(self, tag_ids: Iterable[int]) -> Tuple[Set[int], Set[str]]:
         """Returns ids and names of tags implied by the given tag_ids."""
 
+    def closures(
+        self, tag_ids: Iterable[int]  # pylint: disable=unused-argument
+    ) -> Optional[Dict[int, Set[str]]]:
+        """Returns the closure (see TagClosures) of each of the given tag_ids.
+
+        Tag ids with an empty closure may be missing. Data sources which
+        cannot fetch these in bulk return None."""
+        return None
+
+
+class TagClosures:
+    """Memoized extra names each tag makes a medium searchable by.
+
+    That is, the names of all (transitively) implied tags, as well as all
+    aliases of the tag itself and of those implied tags. These are the
+    same for every medium with that tag, so they are only computed once
+    per tag id, instead of once per medium."""
+
+    def __init__(self) -> None:
+        self._closures: Dict[int, FrozenSet[str]] = {}
+
+    def clear(self) -> None:
+        """Forget all closures, e.g. because implications changed."""
+        self._closures = {}
+
+    def prefetch(
+        self, data_source: AbstractDataSource, tag_ids: Iterable[int]
+    ) -> None:
+        """Fetch closures of all the given tag ids at once, if possible."""
+
+        missing = [i for i in tag_ids if i not in self._closures]
+        if not missing:
+            return
+
+        closures = data_source.closures(missing)
+        if closures is None:
+            return
+
+        for tag_id in missing:
+            self._closures[tag_id] = frozenset(closures.get(tag_id, ()))
+
+    def searchable_names(
+        self, data_source: AbstractDataSource, tag_ids: Iterable[int]
+    ) -> Set[str]:
+        """Get the union of the closures of all the given tag ids."""
+
+        tag_ids = list(tag_ids)
+        self.prefetch(data_source, tag_ids)
+
+        result: Set[str] = set()
+        for tag_id in tag_ids:
+            result |= self._closure(data_source, tag_id)
+        return result
+
+    def derivation_counts(
+        self, data_source: AbstractDataSource, innate_tags: Dict[int, str]
+    ) -> Dict[str, int]:
+        """Count how many of the given tags (by id and name) derive each
+        searchable name, i.e. have it as name or in their closure."""
+
+        tag_ids = list(innate_tags.keys())
+        self.prefetch(data_source, tag_ids)
+
+        counts = Counter(innate_tags.values())
+        for tag_id in tag_ids:
+            counts.update(self._closure(data_source, tag_id))
+        return dict(counts)
+
+    def _closure(
+        self,
+        data_source: AbstractDataSource,
+        tag_id: int,
+        visiting: Optional[Set[int]] = None,
+    ) -> FrozenSet[str]:
+        cached = self._closures.get(tag_id, None)
+        if cached is not None:
+            return cached
+
+        # Implications should never be cyclic, but don't recurse forever
+        # if they are anyway.
+        if visiting is None:
+            visiting = set()
+        if tag_id in visiting:
+            return frozenset()
+        visiting.add(tag_id)
+
+        names = data_source.alias_names([tag_id])
+        implied_tag_ids, implied_tag_names = data_source.implied([tag_id])
+        names |= implied_tag_names
+        for implied_tag_id in implied_tag_ids:
+            names |= self._closure(data_source, implied_tag_id, visiting)
+
+        visiting.remove(tag_id)
+        closure = frozenset(names)
+        self._closures[tag_id] = closure
+        return closure
+
 
 def create_spindexed_medium(
-    data_source: AbstractDataSource, medium: Medium
+    data_source: AbstractDataSource,
+    tag_closures: TagClosures,
+    medium: Medium,
 ) -> SpindexedMedium:
-    # First, get innate tags. These will never change.
-    innate_tag_names = {t.tag for t in medium.tags}
+    return create_spindexed_medium_from_row(
+        data_source, tag_closures, medium, {t.id: t.tag for t in medium.tags}
+    )
 
-    # Follow chain of implications. Gather implied tags
-    # and aliases until that queue is empty.
-    extra_searchable_tags = _non_innate_tags(data_source, medium)
 
-    searchable_tag_names = innate_tag_names | extra_searchable_tags
+def query_medium_rows(session: Any) -> Any:
+    """Query plain rows of all media, with the columns needed by
+    create_spindexed_medium_from_row (which ORM objects also have)."""
 
-    return SpindexedMedium.create(
-        medium, innate_tag_names, searchable_tag_names
+    return session.query(
+        Medium.id,
+        Medium.aspect_ratio,
+        Medium.hash,
+        Medium.mime_type,
+        Medium.rating,
+        Medium.tiny_thumbnail,
     )
 
 
-def _non_innate_tags(
-    data_source: AbstractDataSource, medium: Medium
-) -> Set[str]:
-    extra: Set[str] = set()
-
-    queue: deque = deque()
-    initial_tag_ids = {t.id for t in medium.tags}
-    queue.append(initial_tag_ids)
-
-    while queue:
-        tag_ids: List[int] = queue.pop()
-        if not tag_ids:
-            continue
+def create_spindexed_medium_from_row(
+    data_source: AbstractDataSource,
+    tag_closures: TagClosures,
+    row: Any,
+    innate_tags: Dict[int, str],
+) -> SpindexedMedium:
+    """Create SpindexedMedium from its (innate) tags by id and name.
 
-        extra |= data_source.alias_names(tag_ids)
+    The row can be a Medium, or any row with the same column names."""
 
-        implied_tag_ids, implied_tag_names = data_source.implied(tag_ids)
-        extra |= implied_tag_names
+    # First, get innate tags. These will never change.
+    innate_tag_names = set(innate_tags.values())
 
-        queue.append(implied_tag_ids)
+    # Then add implied tags and aliases, which are memoized per tag.
+    derivation_counts = tag_closures.derivation_counts(data_source, innate_tags)
 
-    return extra
+    return SpindexedMedium.create(row, innate_tag_names, derivation_counts)
@@ -0,0 +1,55 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from flask import g
+
+from . import create_spindexed_medium_from_row, query_medium_rows, TagClosures
+from .single import _SingleLoadDataSource
+from ...models import Medium, MediaTags, Tag
+from ..models import SpindexedMedium
+
+# Maximum number of ids per "IN" clause, to stay below the limits
+# of some database backends.
+_CHUNK_SIZE = 500
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(ids), _CHUNK_SIZE):
+        yield ids[start : start + _CHUNK_SIZE]
+
+
+def bulk_load(
+    medium_ids: Iterable[int], tag_closures: TagClosures
+) -> List[SpindexedMedium]:
+    """Load the given media with a few set-based queries.
+
+    Like full_load, this only fetches plain tuples. Media which do not
+    exist (anymore) are skipped."""
+
+    session = g.db
+    data_source = _SingleLoadDataSource()
+    result = []
+
+    for chunk in _chunks(sorted(set(medium_ids))):
+        media = query_medium_rows(session).filter(Medium.id.in_(chunk))
+
+        innate_tags: Dict[int, Dict[int, str]] = defaultdict(dict)
+        for medium_id, tag_id, tag_name in (
+            session.query(MediaTags.c.medium_id, Tag.id, Tag.tag)
+            .join(Tag, Tag.id == MediaTags.c.tag_id)
+            .filter(MediaTags.c.medium_id.in_(chunk))
+        ):
+            innate_tags[medium_id][tag_id] = tag_name
+
+        tag_closures.prefetch(
+            data_source, {i for tags in innate_tags.values() for i in tags}
+        )
+
+        for row in media:
+            result.append(
+                create_spindexed_medium_from_row(
+                    data_source, tag_closures, row, innate_tags[row.id]
+                )
+            )
+
+    return result
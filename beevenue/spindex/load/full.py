@@ -1,10 +1,40 @@
 from collections import defaultdict
-from typing import Dict, Iterable, Set, Tuple
-
-from flask import g
-
-from . import AbstractDataSource, create_spindexed_medium
-from ...models import Medium, Tag, TagAlias, TagImplication
+from itertools import groupby
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from flask import current_app, g
+
+from . import (
+    AbstractDataSource,
+    create_spindexed_medium_from_row,
+    query_medium_rows,
+    TagClosures,
+)
+from ...models import Medium, MediaTags, Tag, TagAlias, TagImplication
+from ... import paths
+from .. import snapshot
+from ..fingerprint import sql_fingerprint
+from ..models import SpindexedMedium
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows. There, peak memory is simply not reported.
+    resource = None  # type: ignore
+
+# Number of rows fetched per round trip from the server-side cursors.
+_BATCH_SIZE = 1000
 
 
 class _FullLoadDataSource(AbstractDataSource):
@@ -34,35 +64,151 @@ class _FullLoadDataSource(AbstractDataSource):
         return implied_ids, implied_names
 
 
-def full_load() -> None:
+class LoadStatistics(NamedTuple):
+    """How long a full load took, and how much memory it needed."""
+
+    media: int
+    rows: int
+    seconds: float
+
+    # Peak resident memory of this process so far (not just of this load).
+    peak_memory_kib: Optional[int]
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / max(self.seconds, 1e-6)
+
+    def __str__(self) -> str:
+        result = (
+            f"Loaded {self.media} media ({self.rows} rows) in "
+            f"{self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)"
+        )
+        if self.peak_memory_kib is not None:
+            result += f", peak memory {self.peak_memory_kib // 1024} MiB"
+        return result
+
+
+def _peak_memory_kib() -> Optional[int]:
+    if resource is None:  # pragma: no cover
+        return None
+    # Note that this is in bytes instead of KiB on macOS.
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+class _RowCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def count_rows(self, rows: Iterable[Any]) -> Iterator[Any]:
+        for row in rows:
+            self.count += 1
+            yield row
+
+
+def _innate_tag_ids(rows: Iterable[Any]) -> Iterator[Tuple[int, Set[int]]]:
+    """Group (medium_id, tag_id) rows, which must be sorted by medium_id."""
+
+    for medium_id, group in groupby(rows, key=lambda r: int(r[0])):
+        yield medium_id, {r[1] for r in group}
+
+
+def _load_media(
+    data_source: _FullLoadDataSource,
+    tag_closures: TagClosures,
+    counter: _RowCounter,
+    on_medium: Optional[Callable[[], None]],
+) -> Iterator[SpindexedMedium]:
+    session = g.db
+
+    # Both queries are sorted by medium id, so that they can be merged
+    # while streaming through them (instead of holding either in memory).
+    media = (
+        query_medium_rows(session).order_by(Medium.id).yield_per(_BATCH_SIZE)
+    )
+    media_tags = (
+        session.query(MediaTags.c.medium_id, MediaTags.c.tag_id)
+        .order_by(MediaTags.c.medium_id)
+        .yield_per(_BATCH_SIZE)
+    )
+
+    tag_ids_by_medium = _innate_tag_ids(counter.count_rows(media_tags))
+    next_tag_ids = next(tag_ids_by_medium, None)
+
+    for row in counter.count_rows(media):
+        while next_tag_ids is not None and next_tag_ids[0] < row.id:
+            next_tag_ids = next(tag_ids_by_medium, None)
+
+        tag_ids: Set[int] = set()
+        if next_tag_ids is not None and next_tag_ids[0] == row.id:
+            tag_ids = next_tag_ids[1]
+
+        yield create_spindexed_medium_from_row(
+            data_source,
+            tag_closures,
+            row,
+            {i: data_source.tag_name_by_id[i] for i in tag_ids},
+        )
+        if on_medium is not None:
+            on_medium()
+
+
+def _load_data_source(counter: _RowCounter) -> _FullLoadDataSource:
+    """Load all tag names, implications and aliases."""
+
     session = g.db
-    all_media = Medium.query.all()
 
-    all_implications = session.query(TagImplication).all()
+    # Only fetch plain tuples, since the ORM classes eagerly join
+    # their relationships, which would load huge object graphs.
+    all_implications = session.query(
+        TagImplication.c.implying_tag_id, TagImplication.c.implied_tag_id
+    )
 
-    all_tags = session.query(Tag).all()
-    tag_name_by_id = {t.id: t.tag for t in all_tags}
+    tag_name_by_id = dict(counter.count_rows(session.query(Tag.id, Tag.tag)))
 
     # if Id=3 implies Id=5, implied_by_this[3] == set([5])
     implied_by_this = defaultdict(set)
 
-    for i in all_implications:
-        implied_by_this[i.implying_tag_id].add(i.implied_tag_id)
+    for implying_tag_id, implied_tag_id in counter.count_rows(all_implications):
+        implied_by_this[implying_tag_id].add(implied_tag_id)
 
-    all_aliases = session.query(TagAlias).all()
+    all_aliases = session.query(TagAlias.tag_id, TagAlias.alias)
 
     aliases_by_id = defaultdict(set)
-    for alias in all_aliases:
-        aliases_by_id[alias.tag_id].add(alias.alias)
+    for tag_id, alias in counter.count_rows(all_aliases):
+        aliases_by_id[tag_id].add(alias)
 
-    media_to_cache = []
+    return _FullLoadDataSource(implied_by_this, aliases_by_id, tag_name_by_id)
 
-    data_source = _FullLoadDataSource(
-        implied_by_this, aliases_by_id, tag_name_by_id
-    )
 
-    for medium in all_media:
-        medium_to_cache = create_spindexed_medium(data_source, medium)
-        media_to_cache.append(medium_to_cache)
+def full_load(on_medium: Optional[Callable[[], None]] = None) -> LoadStatistics:
+    """Rebuild the whole Spindex from SQL, and publish it once done.
+
+    on_medium is called after each medium loaded, e.g. to report progress."""
+
+    session = g.db
+    start = time.perf_counter()
+    counter = _RowCounter()
+
+    # Taken before loading, so that concurrent changes (which might or
+    # might not make it into this load) cause another load on next startup,
+    # or are carried over from the journal.
+    fingerprint = sql_fingerprint(session)
+    since = snapshot.current(paths.spindex_directory())
 
-    g.spindex.add_media(media_to_cache)
+    data_source = _load_data_source(counter)
+
+    media_count = g.spindex.add_media(
+        _load_media(data_source, TagClosures(), counter, on_medium),
+        fingerprint,
+        since,
+    )
+
+    statistics = LoadStatistics(
+        media_count,
+        counter.count,
+        time.perf_counter() - start,
+        _peak_memory_kib(),
+    )
+    current_app.logger.info("Spindex full load: %s", statistics)
+    return statistics
@@ -1,9 +1,11 @@
-from typing import Iterable, Optional, Set, Tuple
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
 
 from flask import g
+from sqlalchemy import null
 
-from . import AbstractDataSource, create_spindexed_medium
-from ...models import Medium, Tag, TagAlias, TagImplication
+from . import AbstractDataSource, create_spindexed_medium, TagClosures
+from ...models import Medium, Tag, TagAlias, TagClosure, TagImplication
 from ...types import MediumDocument
 
 
@@ -40,7 +42,33 @@ class _SingleLoadDataSource(AbstractDataSource):
 
         return implied_tag_ids, implied_tag_names
 
+    def closures(self, tag_ids: Iterable[int]) -> Dict[int, Set[str]]:
+        tag_ids = list(tag_ids)
 
-def single_load(medium_id: int) -> Optional[MediumDocument]:
+        # Names and aliases of all implied tags, plus the tags' own aliases.
+        implied = (
+            self.session.query(TagClosure.c.ancestor, Tag.tag, TagAlias.alias)
+            .select_from(TagClosure)
+            .join(Tag, Tag.id == TagClosure.c.descendant)
+            .outerjoin(TagAlias, TagAlias.tag_id == TagClosure.c.descendant)
+            .filter(TagClosure.c.ancestor.in_(tag_ids))
+        )
+        own_aliases = self.session.query(
+            TagAlias.tag_id, TagAlias.alias, null()
+        ).filter(TagAlias.tag_id.in_(tag_ids))
+
+        result: Dict[int, Set[str]] = defaultdict(set)
+        for tag_id, name, alias in implied.union_all(own_aliases):
+            result[tag_id].add(name)
+            if alias is not None:
+                result[tag_id].add(alias)
+        return result
+
+
+def single_load(
+    medium_id: int, tag_closures: TagClosures
+) -> Optional[MediumDocument]:
     matching_medium = g.db.query(Medium).filter_by(id=medium_id).first()
-    return create_spindexed_medium(_SingleLoadDataSource(), matching_medium)
+    return create_spindexed_medium(
+        _SingleLoadDataSource(), tag_closures, matching_medium
+    )
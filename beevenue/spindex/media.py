@@ -1,26 +1,286 @@
-from typing import Dict, Iterable, Optional
+from copy import copy
+from typing import Dict, FrozenSet, Hashable, Iterable, Optional, Set
 
-from ..types import MediumDocument
+from ..types import Derivations, MediumDocument, TagNamesField
+from .columns import MediaColumns, Predicate
+from .cow import CopyOnWriteDict
+from .files import BlobRef
+from .idset import MediumIdSet
+from .load import TagClosures
+
+# Ratings of the media visible in each censorship context.
+VISIBLE_RATINGS: Dict[str, FrozenSet[str]] = {
+    "sfw": frozenset(["s"]),
+    "user": frozenset(["s", "q"]),
+    "admin": frozenset(["s", "q", "e", "u"]),
+}
+
+
+class _PostingLists:
+    """Ids of the media with each name (e.g. tag name).
+
+    Copies (see copy) share the lists of all names until either modifies
+    the list of a name, which then gets a copy of that list only."""
+
+    def __init__(self) -> None:
+        self._lists: CopyOnWriteDict[str, MediumIdSet] = CopyOnWriteDict()
+
+        # Names whose list only this refers to, and which it can thus
+        # modify in place.
+        self._owned: Set[str] = set()
+
+    def copy(self) -> "_PostingLists":
+        result = _PostingLists()
+        result._lists = self._lists.copy()  # pylint: disable=protected-access
+
+        # From now on, both share all lists.
+        self._owned = set()
+        return result
+
+    def _modifiable(self, name: str) -> MediumIdSet:
+        ids = self._lists.get(name, None)
+        if ids is None:
+            ids = MediumIdSet()
+        elif name in self._owned:
+            return ids
+        else:
+            ids = ids.copy()
+        self._lists[name] = ids
+        self._owned.add(name)
+        return ids
+
+    def get(self, name: str) -> MediumIdSet:
+        return self._lists.get(name, MediumIdSet())
+
+    def names(self) -> Iterable[str]:
+        return self._lists.keys()
+
+    def add(self, names: Iterable[str], medium_id: int) -> None:
+        for name in names:
+            self._modifiable(name).add(medium_id)
+
+    def update(self, name: str, medium_ids: MediumIdSet) -> None:
+        ids = self._modifiable(name)
+        ids |= medium_ids
+
+    def discard(self, names: Iterable[str], medium_id: int) -> None:
+        for name in names:
+            if name not in self._lists:
+                continue
+            ids = self._modifiable(name)
+            ids.discard(medium_id)
+            if not ids:
+                self.pop(name)
+
+    def pop(self, name: str) -> MediumIdSet:
+        """Remove the list of name, and get it (to read, not to modify)."""
+
+        self._owned.discard(name)
+        return self._lists.pop(name, MediumIdSet())
+
+
+class _Indexes:
+    """Inverted indices of SpindexMedia, which all follow its documents."""
+
+    def __init__(self) -> None:
+        self.innate = _PostingLists()
+        self.searchable = _PostingLists()
+        self.rated = _PostingLists()
+        self.visible: Dict[str, MediumIdSet] = {
+            visibility: MediumIdSet() for visibility in VISIBLE_RATINGS
+        }
+        self.by_hash: CopyOnWriteDict[str, int] = CopyOnWriteDict()
+        self.columns = MediaColumns()
+
+    def copy(self) -> "_Indexes":
+        result = _Indexes()
+        result.innate = self.innate.copy()
+        result.searchable = self.searchable.copy()
+        result.rated = self.rated.copy()
+        result.visible = {
+            visibility: ids.copy() for visibility, ids in self.visible.items()
+        }
+        result.by_hash = self.by_hash.copy()
+        result.columns = self.columns.copy()
+        return result
+
+    def add(self, item: MediumDocument) -> None:
+        self.by_hash[item.medium_hash] = item.medium_id
+        self.innate.add(item.tag_names.innate, item.medium_id)
+        self.searchable.add(item.tag_names.searchable, item.medium_id)
+        self.rated.add([item.rating], item.medium_id)
+        self.columns.set(item)
+        for visibility, ratings in VISIBLE_RATINGS.items():
+            if item.rating in ratings:
+                self.visible[visibility].add(item.medium_id)
+
+    def remove(self, item: MediumDocument) -> None:
+        medium_id = item.medium_id
+        if self.by_hash.get(item.medium_hash, None) == medium_id:
+            del self.by_hash[item.medium_hash]
+        self.innate.discard(item.tag_names.innate, medium_id)
+        self.searchable.discard(item.tag_names.searchable, medium_id)
+        self.rated.discard([item.rating], medium_id)
+        self.columns.remove(medium_id)
+        for visible in self.visible.values():
+            visible.discard(medium_id)
 
 
 class SpindexMedia:
-    """Fancy dictionary containing all MediumDocument objects."""
+    """Fancy dictionary containing all MediumDocument objects.
+
+    Also maintains inverted indices ("posting lists") from innate and
+    searchable tag names (and ratings) to the ids of media with that tag,
+    so that lookups by tag do not need to scan all media, as well as the
+    ids of all media visible in each censorship context, and the id of
+    the medium with each medium hash.
+
+    Numbers which search terms compare (e.g. the number of innate tags)
+    are also kept in columns (see MediaColumns).
+
+    Tiny thumbnails are not part of the documents. Instead, the position
+    of each medium's tiny thumbnail in the blob pack is stored here.
+
+    All modifications go through methods of this class, so that they
+    can be recorded in (and replayed from) the Spindex journal. They
+    never modify documents in place, but replace them by modified copies,
+    so that copies of this (see copy) can be modified independently.
+
+    Copying is cheap: copies share all documents and indices (in chunks),
+    until either modifies them."""
 
     def __init__(self) -> None:
-        self.data: Dict[int, MediumDocument] = {}
+        self.data: CopyOnWriteDict[int, MediumDocument] = CopyOnWriteDict()
+        self.indexes = _Indexes()
+        self.tiny_thumbnails: CopyOnWriteDict[int, BlobRef] = CopyOnWriteDict()
+
+        # Identifies the on-disk state this reflects. Only set for the
+        # resident copy (see resident.py), since other copies might have
+        # been modified in the meantime.
+        self.version: Optional[Hashable] = None
+
+        # Used when (re)loading media. Only valid while tags, aliases and
+        # implications stay the same, so any change to those replaces it.
+        # (Copies made before such a change keep their own, which is never
+        # seen by copies made afterwards.)
+        self.tag_closures = TagClosures()
+
+    def copy(self) -> "SpindexMedia":
+        """Get a copy which can be modified without affecting this.
+
+        Takes time in proportion to the number of chunks, not of media."""
+
+        result = SpindexMedia()
+        result.data = self.data.copy()
+        result.indexes = self.indexes.copy()
+        result.tiny_thumbnails = self.tiny_thumbnails.copy()
+        result.tag_closures = self.tag_closures
+        return result
+
+    def _modifiable_tag_names(self, medium_id: int) -> TagNamesField:
+        """Replace the medium by a copy, and get its tag names to modify."""
+
+        medium = copy(self.data[medium_id])
+        medium.tag_names = copy(medium.tag_names)
+        self.data[medium_id] = medium
+        return medium.tag_names
 
     def get_medium(self, medium_id: int) -> Optional[MediumDocument]:
         return self.data.get(medium_id, None)
 
+    def get_medium_by_hash(self, medium_hash: str) -> Optional[MediumDocument]:
+        medium_id = self.indexes.by_hash.get(medium_hash, None)
+        if medium_id is None:
+            return None
+        return self.get_medium(medium_id)
+
     def get_all(self) -> Iterable[MediumDocument]:
         return self.data.values()
 
+    def with_innate_tag(self, tag_name: str) -> MediumIdSet:
+        return self.indexes.innate.get(tag_name)
+
+    def with_searchable_tag(self, tag_name: str) -> MediumIdSet:
+        return self.indexes.searchable.get(tag_name)
+
+    def with_rating(self, rating: str) -> MediumIdSet:
+        return self.indexes.rated.get(rating)
+
+    def visible_to(self, visibility: str) -> MediumIdSet:
+        return self.indexes.visible[visibility]
+
+    def searchable_tag_names(self) -> Iterable[str]:
+        return self.indexes.searchable.names()
+
+    def get_tiny_thumbnail(self, medium_id: int) -> Optional[BlobRef]:
+        return self.tiny_thumbnails.get(medium_id, None)
+
+    def set_tiny_thumbnail(
+        self, medium_id: int, ref: Optional[BlobRef]
+    ) -> None:
+        if ref is None:
+            self.tiny_thumbnails.pop(medium_id, None)
+        else:
+            self.tiny_thumbnails[medium_id] = ref
+
+    def with_tag_count(
+        self, medium_ids: MediumIdSet, predicate: Predicate, category: str = ""
+    ) -> MediumIdSet:
+        return self.indexes.columns.select(medium_ids, predicate, category)
+
     def add(self, item: MediumDocument) -> None:
+        self._unindex(item.medium_id)
         self.data[item.medium_id] = item
+        self.indexes.add(item)
 
     def remove_id(self, medium_id: int) -> Optional[MediumDocument]:
-        if medium_id in self.data:
-            item = self.data[medium_id]
-            del self.data[medium_id]
-            return item
-        return None
+        self.tiny_thumbnails.pop(medium_id, None)
+        return self._unindex(medium_id)
+
+    def _unindex(self, medium_id: int) -> Optional[MediumDocument]:
+        item = self.data.pop(medium_id, None)
+        if item is not None:
+            self.indexes.remove(item)
+        return item
+
+    def derive(self, derivations: Derivations, delta: int) -> None:
+        """Change derivation counts of the given names by delta, on all
+        media which have the tag they are derived from as innate tag.
+
+        Only those media are touched, no matter how many others are
+        searchable by the same names through other tags."""
+
+        self.tag_closures = TagClosures()
+        for source_name, names in derivations.items():
+            for medium_id in self.with_innate_tag(source_name):
+                tag_names = self._modifiable_tag_names(medium_id)
+                for name in names:
+                    if not tag_names.derive(name, delta):
+                        continue
+                    if delta > 0:
+                        self.indexes.searchable.add([name], medium_id)
+                    else:
+                        self.indexes.searchable.discard([name], medium_id)
+
+    def remove_alias(self, former_alias: str) -> None:
+        # Aliases are unique, so nothing else derives the same name.
+        self.tag_closures = TagClosures()
+        for medium_id in self.indexes.searchable.pop(former_alias):
+            tag_names = self._modifiable_tag_names(medium_id)
+            tag_names.remove_searchable(former_alias)
+
+    def rename_tag(self, old_name: str, new_name: str) -> None:
+        self.tag_closures = TagClosures()
+        innate_ids = self.indexes.innate.pop(old_name)
+        searchable_ids = self.indexes.searchable.pop(old_name)
+
+        for medium_id in innate_ids | searchable_ids:
+            self._modifiable_tag_names(medium_id).rename(old_name, new_name)
+
+        if innate_ids:
+            self.indexes.innate.update(new_name, innate_ids)
+            # The category of the tag might have changed.
+            for medium_id in innate_ids:
+                self.indexes.columns.set(self.data[medium_id])
+        if searchable_ids:
+            self.indexes.searchable.update(new_name, searchable_ids)
@@ -1,17 +1,254 @@
-from typing import Iterable, List, Set
+from array import array
+from bisect import bisect_left, insort
+from collections import abc
+from threading import Lock
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from ..models import Medium
 from ..types import TagNamesField, MediumDocument
 
 
+class _TagNameTable:
+    """Assigns each tag name a small integer id.
+
+    Shared by all media of this process, so that each tag name is stored
+    only once. Ids are never reused, and never leave this process."""
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def find(self, name: str) -> Optional[int]:
+        return self.ids.get(name, None)
+
+    def id_of(self, name: str) -> int:
+        tag_id = self.ids.get(name, None)
+        if tag_id is not None:
+            return tag_id
+
+        with self._lock:
+            tag_id = self.ids.get(name, None)
+            if tag_id is None:
+                tag_id = len(self.names)
+                self.names.append(name)
+                self.ids[name] = tag_id
+            return tag_id
+
+    def ids_of(self, names: Iterable[str]) -> "array[int]":
+        return array("I", sorted({self.id_of(n) for n in names}))
+
+
+_tag_name_table = _TagNameTable()
+
+
+def tag_name_id(name: str) -> int:
+    """Get the id of a tag name (only valid in this process)."""
+    return _tag_name_table.id_of(name)
+
+
+def tag_name(tag_id: int) -> str:
+    """Get the tag name with the given id."""
+    return _tag_name_table.names[tag_id]
+
+
+def _contains(tag_ids: "array[int]", tag_id: int) -> bool:
+    index = bisect_left(tag_ids, tag_id)
+    return index < len(tag_ids) and tag_ids[index] == tag_id
+
+
+def _add(tag_ids: "array[int]", name: str) -> None:
+    tag_id = _tag_name_table.id_of(name)
+    if not _contains(tag_ids, tag_id):
+        insort(tag_ids, tag_id)
+
+
+def _remove(tag_ids: "array[int]", name: str) -> bool:
+    tag_id = _tag_name_table.find(name)
+    if tag_id is None or not _contains(tag_ids, tag_id):
+        return False
+    del tag_ids[bisect_left(tag_ids, tag_id)]
+    return True
+
+
+class _TagNameSet(AbstractSet[str]):
+    """Read-only set of tag names, backed by a sorted array of tag ids."""
+
+    __slots__ = ["_tag_ids"]
+
+    def __init__(self, tag_ids: "array[int]") -> None:
+        self._tag_ids = tag_ids
+
+    @classmethod
+    def _from_iterable(cls, iterable: Iterable[str]) -> FrozenSet[str]:
+        # Results of set operations (&, | etc.) are plain frozensets.
+        return frozenset(iterable)
+
+    def __contains__(self, name: object) -> bool:
+        if not isinstance(name, str):
+            return False
+        tag_id = _tag_name_table.find(name)
+        return tag_id is not None and _contains(self._tag_ids, tag_id)
+
+    def __iter__(self) -> Iterator[str]:
+        names = _tag_name_table.names
+        return (names[i] for i in self._tag_ids)
+
+    def __len__(self) -> int:
+        return len(self._tag_ids)
+
+    def __repr__(self) -> str:
+        return repr(set(self))
+
+
 class SpindexedMediumTagNames(TagNamesField):
-    """In-memory representation of a medium's tag names."""
+    """In-memory representation of a medium's tag names.
 
-    __slots__: List[str] = []
+    Stores sorted arrays of interned tag name ids instead of sets of
+    strings, which is a lot more compact.
+
+    Each searchable name also has a derivation count, i.e. the number of
+    innate tags which make the medium searchable by that name (by being
+    named like it, or through aliases and implications). The name stays
+    searchable as long as that count is positive."""
+
+    __slots__ = ["_innate", "_searchable", "_counts"]
 
     def __init__(self, innate: Iterable[str], searchable: Iterable[str]):
-        self.innate = set(innate)
-        self.searchable = set(searchable)
+        innate_ids = _tag_name_table.ids_of(innate)
+
+        # searchable can also map each name to its derivation count.
+        if isinstance(searchable, abc.Mapping):
+            counts = {
+                _tag_name_table.id_of(n): c for n, c in searchable.items()
+            }
+            searchable_ids = array("I", sorted(counts))
+            self.set_ids(
+                innate_ids,
+                searchable_ids,
+                array("H", (counts[i] for i in searchable_ids)),
+            )
+        else:
+            self.set_ids(innate_ids, _tag_name_table.ids_of(searchable))
+
+    @classmethod
+    def from_ids(
+        cls,
+        innate: "array[int]",
+        searchable: "array[int]",
+        counts: Optional["array[int]"] = None,
+    ) -> "SpindexedMediumTagNames":
+        """Create from sorted arrays of tag name ids (see tag_name_id),
+        and the derivation counts of the searchable ones."""
+
+        result: SpindexedMediumTagNames = cls.__new__(cls)
+        result.set_ids(innate, searchable, counts)
+        return result
+
+    def set_ids(
+        self,
+        innate: "array[int]",
+        searchable: "array[int]",
+        counts: Optional["array[int]"] = None,
+    ) -> None:
+        """Replace all tag names by sorted arrays of tag name ids, and the
+        derivation counts of the searchable ones (all 1 by default)."""
+        self._innate = innate
+        self._searchable = searchable
+        if counts is None:
+            counts = array("H", [1]) * len(searchable)
+        self._counts = counts
+
+    def ids(self) -> Tuple["array[int]", "array[int]"]:
+        """Get the sorted arrays of innate and searchable tag name ids."""
+        return self._innate, self._searchable
+
+    def derivation_counts(self) -> "array[int]":
+        """Get the derivation counts, in the order of the searchable ids."""
+        return self._counts
+
+    def __copy__(self) -> "SpindexedMediumTagNames":
+        return SpindexedMediumTagNames.from_ids(
+            array("I", self._innate),
+            array("I", self._searchable),
+            array("H", self._counts),
+        )
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Ids are only valid in this process, so pickle the names instead.
+        # (Pickle stores each distinct name object only once anyway.)
+        return (
+            SpindexedMediumTagNames,
+            (list(self.innate), dict(zip(self.searchable, self._counts))),
+        )
+
+    @property
+    def innate(self) -> AbstractSet[str]:
+        return _TagNameSet(self._innate)
+
+    @property
+    def searchable(self) -> AbstractSet[str]:
+        return _TagNameSet(self._searchable)
+
+    def _searchable_index(self, name: str) -> Optional[int]:
+        tag_id = _tag_name_table.find(name)
+        if tag_id is None or not _contains(self._searchable, tag_id):
+            return None
+        return bisect_left(self._searchable, tag_id)
+
+    def derivation_count(self, name: str) -> int:
+        index = self._searchable_index(name)
+        return 0 if index is None else self._counts[index]
+
+    def derive(self, name: str, delta: int) -> bool:
+        index = self._searchable_index(name)
+        if index is None:
+            if delta <= 0:
+                return False
+            tag_id = _tag_name_table.id_of(name)
+            index = bisect_left(self._searchable, tag_id)
+            self._searchable.insert(index, tag_id)
+            self._counts.insert(index, delta)
+            return True
+
+        count = self._counts[index] + delta
+        if count > 0:
+            self._counts[index] = count
+            return False
+
+        del self._searchable[index]
+        del self._counts[index]
+        return True
+
+    def add_searchable(self, name: str) -> None:
+        if self._searchable_index(name) is None:
+            self.derive(name, 1)
+
+    def remove_searchable(self, name: str) -> None:
+        index = self._searchable_index(name)
+        if index is not None:
+            del self._searchable[index]
+            del self._counts[index]
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        if _remove(self._innate, old_name):
+            _add(self._innate, new_name)
+
+        count = self.derivation_count(old_name)
+        if count:
+            self.remove_searchable(old_name)
+            self.derive(new_name, count)
 
 
 class SpindexedMedium(MediumDocument):
@@ -23,9 +260,12 @@ class SpindexedMedium(MediumDocument):
     def create(
         medium: Medium,
         innate_tag_names: Set[str],
-        searchable_tag_names: Set[str],
+        searchable_tag_names: Iterable[str],
     ) -> "SpindexedMedium":
-        """Create in-memory representation of a Medium from the SQL database."""
+        """Create in-memory representation of a Medium from the SQL database.
+
+        searchable_tag_names can also map each name to its derivation
+        count (see SpindexedMediumTagNames)."""
 
         return SpindexedMedium(
             medium.id,
@@ -44,7 +284,7 @@ class SpindexedMedium(MediumDocument):
         medium_hash: str,
         mime_type: str,
         rating: str,
-        tiny_thumbnail: bytes,
+        tiny_thumbnail: Optional[bytes],
         tag_names: SpindexedMediumTagNames,
     ) -> None:
         self.medium_id = medium_id  # pylint: disable=invalid-name
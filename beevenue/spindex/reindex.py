@@ -0,0 +1,207 @@
+"""Full reindexing of the Spindex as a background job.
+
+The fresh Spindex is built off to the side while the current one keeps
+being served, and is only swapped in (by publishing it as new snapshot)
+once it is complete.
+
+The job runs in a thread of whichever worker process started it. Its
+progress is stored next to the snapshots, so that all worker processes
+report the same status, and a lock file is held while it runs, so that
+only one job runs at a time (and a job whose process died is noticed)."""
+
+import json
+import os
+from threading import Lock, Thread
+import time
+from typing import Any, Dict, IO, Optional
+
+from flask import current_app, g
+
+from .. import paths
+from ..models import Medium
+from . import files
+from .load.full import full_load
+from .spindex import Spindex
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Not available on Windows (see files.py).
+    fcntl = None  # type: ignore
+
+_STATE_FILE_NAME = "reindex.json"
+_RUNNING_FILE_NAME = "reindex.lock"
+
+# Progress is only stored after this many media, not after each one.
+_SAVE_EVERY = 500
+
+
+class ReindexJob:
+    """Progress of a single full reindex."""
+
+    def __init__(self, directory: str, total: int) -> None:
+        self.directory = directory
+        self.total = total
+        self.processed = 0
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.result: Optional[str] = None
+        self.failed = False
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["ReindexJob"]:
+        """Load the running (or last finished) job, if any."""
+        try:
+            with open(
+                os.path.join(directory, _STATE_FILE_NAME), "rb"
+            ) as state_file:
+                state = json.loads(state_file.read().decode("utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+        job = cls(directory, state["total"])
+        job.processed = state["processed"]
+        job.started = state["started"]
+        job.finished = state["finished"]
+        job.result = state["result"]
+        job.failed = state["failed"]
+        return job
+
+    def save(self) -> None:
+        state = {
+            "total": self.total,
+            "processed": self.processed,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "failed": self.failed,
+        }
+        files.write_atomically(
+            os.path.join(self.directory, _STATE_FILE_NAME),
+            json.dumps(state).encode("utf-8"),
+        )
+
+    def count_medium(self) -> None:
+        self.processed += 1
+        if self.processed % _SAVE_EVERY == 0:
+            self.save()
+
+    def finish(self, result: str, failed: bool = False) -> None:
+        self.result = result
+        self.failed = failed
+        self.finished = time.time()
+        self.save()
+
+    @property
+    def is_running(self) -> bool:
+        return self.finished is None
+
+    def status(self) -> Dict[str, Any]:
+        end = self.finished if self.finished is not None else time.time()
+        elapsed = max(end - self.started, 0)
+
+        eta: Optional[float] = None
+        if self.is_running and self.processed:
+            remaining = max(self.total - self.processed, 0)
+            eta = elapsed / self.processed * remaining
+        elif not self.is_running:
+            eta = 0
+
+        state = "running"
+        if not self.is_running:
+            state = "failed" if self.failed else "finished"
+
+        return {
+            "state": state,
+            "processed": self.processed,
+            "total": self.total,
+            "elapsedSeconds": round(elapsed, 2),
+            "etaSeconds": None if eta is None else round(eta, 2),
+            "result": self.result,
+        }
+
+
+class _RunningLock:
+    """Held for as long as a job runs, by the process running it.
+
+    The operating system releases it should that process die."""
+
+    # Without fcntl, only jobs of the same process are noticed.
+    _process_lock = Lock()
+
+    def __init__(self, directory: str) -> None:
+        self.path = os.path.join(directory, _RUNNING_FILE_NAME)
+        self.file: Optional[IO[str]] = None
+
+    def acquire(self) -> bool:
+        """Try to acquire the lock, without waiting for it."""
+        if not fcntl:
+            return self._process_lock.acquire(blocking=False)
+
+        running_file = open(self.path, "a")
+        try:
+            fcntl.flock(running_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            running_file.close()
+            return False
+        self.file = running_file
+        return True
+
+    def release(self) -> None:
+        if not fcntl:
+            self._process_lock.release()
+        elif self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+def current_job() -> Optional[ReindexJob]:
+    """Get the running (or last finished) job, if any."""
+
+    directory = paths.spindex_directory()
+    with files.lock(directory):
+        job = ReindexJob.load(directory)
+        if job is None or not job.is_running:
+            return job
+
+        running_lock = _RunningLock(directory)
+        if running_lock.acquire():
+            running_lock.release()
+            job.finish("Reindexing was interrupted.", failed=True)
+        return job
+
+
+def start() -> Optional[ReindexJob]:
+    """Start reindexing in the background.
+
+    Returns the new job, or None if a job is already running."""
+
+    directory = paths.spindex_directory()
+    with files.lock(directory):
+        running_lock = _RunningLock(directory)
+        if not running_lock.acquire():
+            return None
+
+        job = ReindexJob(directory, g.db.query(Medium.id).count())
+        job.save()
+
+    app_context = current_app.app_context()
+
+    def _run() -> None:
+        with app_context:
+            g.spindex = Spindex()
+            failed = False
+            try:
+                result = f"Full load finished. {full_load(job.count_medium)}."
+            except Exception as exception:  # pylint: disable=broad-except
+                current_app.logger.exception("Spindex reindex failed")
+                result, failed = str(exception), True
+
+            # Otherwise, current_job might take this job as interrupted.
+            with files.lock(directory):
+                job.finish(result, failed)
+                running_lock.release()
+
+    Thread(target=_run, name="spindex-reindex", daemon=True).start()
+    return job
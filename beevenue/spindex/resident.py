@@ -0,0 +1,147 @@
+"""Resident copy of the Spindex, kept in memory by each worker process.
+
+The resident copy survives between requests. At the start of each request,
+it is compared against the on-disk generation (which is cheap, since that
+is a single tiny file). Only if that generation has moved on is anything
+loaded from disk: Usually, just the new journal entries are applied.
+
+The resident copy is never modified once requests can see it. Instead,
+refreshing applies new entries to a copy, and then swaps that in. Copies
+share all documents and indices until they are modified, so this only
+copies the (chunks of) media and posting lists those entries touch.
+Requests keep using whichever copy was current when they started, so they
+never need to hold a lock while using it."""
+
+from threading import Lock
+from typing import Optional, Tuple
+
+from . import journal, snapshot
+from .media import SpindexMedia
+
+
+class _Resident:
+    def __init__(self) -> None:
+        self.directory: Optional[str] = None
+        self.pointer = snapshot.Pointer(0, 0, 0)
+        self.media = SpindexMedia()
+
+        # Number of full reloads, so that versions stay distinct even
+        # if the directory is wiped (restarting its generations).
+        self.reloads = 0
+
+        # Only one thread needs to bother with refreshing.
+        self._refreshing = Lock()
+
+        # Held while swapping in a new copy, so that directory, pointer
+        # and media always match.
+        self._swapping = Lock()
+
+    def reset_locks(self) -> None:
+        self._refreshing = Lock()
+        self._swapping = Lock()
+
+    def current(self) -> Tuple[SpindexMedia, snapshot.Pointer]:
+        with self._swapping:
+            return self.media, self.pointer
+
+    def _swap(
+        self, directory: str, pointer: snapshot.Pointer, media: SpindexMedia
+    ) -> None:
+        media.version = (
+            directory,
+            self.reloads,
+            pointer.base,
+            pointer.generation,
+        )
+        with self._swapping:
+            self.directory = directory
+            self.pointer = pointer
+            self.media = media
+
+    def is_current(self, directory: str, pointer: snapshot.Pointer) -> bool:
+        return self.directory == directory and self.pointer == pointer
+
+    def refresh(self, directory: str) -> None:
+        """Ensure the resident copy reflects the current on-disk generation."""
+
+        if self.is_current(directory, snapshot.current(directory)):
+            return
+
+        with self._refreshing:
+            pointer = snapshot.current(directory)
+            if self.is_current(directory, pointer):
+                return
+
+            if (
+                self.directory != directory
+                or pointer.base > self.pointer.generation
+                or pointer.base < self.pointer.base
+                or pointer.generation < self.pointer.generation
+            ):
+                self._reload(directory)
+                return
+
+            try:
+                self._apply_new_entries(directory, pointer)
+            except FileNotFoundError:
+                # The journal was compacted (twice) in the meantime.
+                self._reload(directory)
+
+    def _apply_new_entries(
+        self, directory: str, pointer: snapshot.Pointer
+    ) -> None:
+        # Compacting the journal does not change the resulting
+        # Spindex, so we can apply new entries either way.
+        start = 0
+        if pointer.base == self.pointer.base:
+            start = self.pointer.journal_size
+
+        media = self.media.copy()
+        journal.replay(
+            media,
+            directory,
+            pointer,
+            start,
+            after_generation=self.pointer.generation,
+        )
+        self._swap(directory, pointer, media)
+
+    def _reload(self, directory: str) -> None:
+        self.reloads += 1
+        try:
+            pointer = snapshot.current(directory)
+            _, media = journal.load_at(directory, pointer)
+        except FileNotFoundError:
+            pointer = snapshot.current(directory)
+            _, media = journal.load_at(directory, pointer)
+        self._swap(directory, pointer, media)
+
+
+_resident = _Resident()
+
+
+def refresh(directory: str) -> None:
+    """Bring this process' resident Spindex up to date."""
+    _resident.refresh(directory)
+
+
+def preload(directory: str) -> None:
+    """Load the resident Spindex now, instead of on the first request."""
+    _resident.refresh(directory)
+
+
+def after_fork() -> None:
+    """Reset locks inherited from the parent process.
+
+    Threads of the parent might have held them while forking, but those
+    threads do not exist in the child. The resident Spindex itself is kept,
+    and brought up to date by the next ``refresh``."""
+    _resident.reset_locks()
+
+
+def current() -> Tuple[SpindexMedia, snapshot.Pointer]:
+    """Get the resident Spindex, and the generation it reflects.
+
+    The result stays the same (even if the resident Spindex is refreshed
+    in the meantime), and must never be modified."""
+    return _resident.current()
@@ -1,7 +1,7 @@
-from flask import Blueprint, g, jsonify
+from flask import Blueprint, g
 
-from .. import permissions
-from .init import full_load
+from .. import notifications, paths, permissions
+from . import consistency, reindex as reindex_job, snapshot
 
 bp = Blueprint("spindex", __name__)
 
@@ -9,21 +9,34 @@ bp = Blueprint("spindex", __name__)
 @bp.route("/spindex/status")
 @permissions.is_owner
 def status():  # type: ignore
-    output = []
-    for medium in g.spindex.all():
-        output.append(
-            {
-                "id": medium.medium_id,
-                "rating": medium.rating,
-                "hash": medium.medium_hash,
-            }
-        )
-
-    return jsonify(output), 200
+    job = reindex_job.current_job()
+    pointer = snapshot.current(paths.spindex_directory())
+    return (
+        {
+            "media": len(g.spindex.all()),
+            "generation": pointer.generation,
+            "reindex": job.status() if job is not None else None,
+        },
+        200,
+    )
 
 
 @bp.route("/spindex/reindex", methods=["POST"])
 @permissions.is_owner
 def reindex():  # type: ignore
-    full_load()
-    return f"Full load finished. Loaded {len(g.spindex.all())} entries.", 200
+    job = reindex_job.start()
+    if job is None:
+        return notifications.reindex_already_running(), 409
+    return job.status(), 202
+
+
+@bp.route("/spindex/consistency")
+@permissions.is_owner
+def check_consistency():  # type: ignore
+    return consistency.check().to_json(), 200
+
+
+@bp.route("/spindex/consistency", methods=["POST"])
+@permissions.is_owner
+def repair_consistency():  # type: ignore
+    return consistency.check(repair=True).to_json(), 200
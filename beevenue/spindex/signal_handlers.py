@@ -1,56 +1,134 @@
-from typing import Tuple
+from typing import Any, Callable, Optional, Set, Tuple
 
-from flask import g
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
+from .. import paths
+from ..flask import request
 from ..signals import (
     alias_added,
     alias_removed,
     implication_added,
     implication_removed,
+    media_updated,
     medium_added,
     medium_deleted,
     medium_updated,
     tag_renamed,
 )
+from ..types import Derivations
+from . import snapshot
+from .buffer import SignalBuffer, SpindexChanges
+from .journal import Mutation
+
+
+# Attribute of the request holding its SignalBuffer. Not declared on
+# BeevenueRequest, since beevenue.flask must not import the Spindex.
+_BUFFER_ATTRIBUTE = "spindex_signals"
+
+
+def start_buffering() -> None:
+    """Buffer Spindex changes until the end of this request."""
+    setattr(request, _BUFFER_ATTRIBUTE, SignalBuffer())
+
+
+def _buffer() -> Optional[SignalBuffer]:
+    if not has_request_context():
+        return None
+    buffer: Optional[SignalBuffer] = getattr(request, _BUFFER_ATTRIBUTE, None)
+    return buffer
+
+
+def _record(change: Callable[[SpindexChanges], None]) -> None:
+    """Record a change to the Spindex in this request's buffer.
+
+    Outside of requests (e.g. in the CLI), the change is applied at once."""
+
+    buffer = _buffer()
+    if buffer is not None:
+        change(buffer.record(g.db))
+        return
+
+    changes = SpindexChanges()
+    change(changes)
+    changes.apply_to(g.spindex)
 
 
 def _reindex_medium(medium_id: int) -> None:
-    g.spindex.reindex_medium(medium_id)
+    _record(lambda changes: changes.reindex([medium_id]))
+
+
+def _reindex_media(medium_ids: Set[int]) -> None:
+    _record(lambda changes: changes.reindex(medium_ids))
 
 
 def _rename_tag(names: Tuple[str, str]) -> None:
-    old_name, new_name = names
-    g.spindex.rename_tag(old_name, new_name)
+    _record(lambda changes: changes.change_tags(Mutation("rename_tag", names)))
 
 
 def _unindex_medium(medium_id: int) -> None:
-    g.spindex.remove_medium(medium_id)
+    _record(lambda changes: changes.remove(medium_id))
+
+
+def _add_derivations(derivations: Derivations) -> None:
+    """Make media with each key as innate tag searchable by its names."""
+    mutation = Mutation("derive", (derivations, 1))
+    _record(lambda changes: changes.change_tags(mutation))
+
 
+def _remove_derivations(derivations: Derivations) -> None:
+    """Undo _add_derivations.
 
-def _add_alias(msg: Tuple[str, str]) -> None:
-    tag_name, new_alias = msg
-    g.spindex.add_alias(tag_name, new_alias)
+    Names still derived from other innate tags stay searchable."""
+    mutation = Mutation("derive", (derivations, -1))
+    _record(lambda changes: changes.change_tags(mutation))
+
+
+def _add_alias(msg: Tuple[str, str, Derivations]) -> None:
+    _, _, derivations = msg
+    _add_derivations(derivations)
 
 
 def _remove_alias(msg: str) -> None:
     former_alias = msg
-    g.spindex.remove_alias(former_alias)
+    mutation = Mutation("remove_alias", (former_alias,))
+    _record(lambda changes: changes.change_tags(mutation))
+
+
+def _add_implication(msg: Tuple[str, str, Derivations]) -> None:
+    _, _, derivations = msg
+    _add_derivations(derivations)
+
+
+def _remove_implication(msg: Tuple[str, str, Derivations]) -> None:
+    _, _, derivations = msg
+    _remove_derivations(derivations)
+
+
+def _on_flush(*_: Any) -> None:
+    buffer = _buffer()
+    if buffer is not None:
+        buffer.on_flush()
 
 
-def _add_implication(msg: Tuple[str, str]) -> None:
-    implying, implied = msg
-    g.spindex.add_implication(implying, implied)
+def _on_commit(_: Any) -> None:
+    buffer = _buffer()
+    if buffer is not None:
+        buffer.on_commit()
 
 
-def _remove_implication(msg: Tuple[str, str]) -> None:
-    implying, implied = msg
-    g.spindex.remove_implication(implying, implied)
+def _on_rollback(_: Any) -> None:
+    buffer = _buffer()
+    if buffer is not None:
+        buffer.on_rollback()
 
 
 def setup_signals() -> None:
     """Register signal handlers."""
 
     medium_updated.connect(_reindex_medium)
+    media_updated.connect(_reindex_media)
     medium_added.connect(_reindex_medium)
     medium_deleted.connect(_unindex_medium)
 
@@ -61,3 +139,29 @@ def setup_signals() -> None:
 
     implication_added.connect(_add_implication)
     implication_removed.connect(_remove_implication)
+
+    # Buffered changes are only applied once they have been committed.
+    for name, listener in (
+        ("after_flush", _on_flush),
+        ("after_commit", _on_commit),
+        ("after_rollback", _on_rollback),
+    ):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+
+def dispatch_signals() -> None:
+    """Apply all Spindex changes of this request which were committed."""
+
+    buffer = _buffer()
+    if buffer is not None:
+        buffer.dispatch(g.spindex)
+
+
+def discard_signals() -> None:
+    """Drop all Spindex changes of this (failed) request."""
+
+    buffer = _buffer()
+    if buffer is not None and buffer.committed:
+        # The SQL database has changed, but the Spindex will not.
+        snapshot.forget_fingerprint(paths.spindex_directory())
@@ -0,0 +1,160 @@
+"""Immutable, generation-numbered snapshots of the Spindex on disk.
+
+Each published snapshot is written once and never modified afterwards.
+Later modifications are appended to a journal belonging to that snapshot
+(see ``journal.py``).
+
+A tiny "generation" file points at the most recent snapshot (the "base")
+and the most recent journal entry (the "generation"), so readers can
+cheaply check whether they need to load anything at all. It also holds
+the fingerprint of the SQL database (see ``fingerprint.py``) matching
+that journal entry, so that startup can skip rebuilding the Spindex.
+
+Snapshots are stored in a compact binary format (see ``codec.py``)."""
+
+import os
+import re
+from typing import NamedTuple
+
+from . import codec
+from .files import lock, write_atomically
+from .media import SpindexMedia
+
+_GENERATION_FILE_NAME = "generation"
+
+# Also matches snapshots in the former (pickle) format, to clean them up.
+_STORE_FILE_REGEX = re.compile(
+    r"^(snapshot|journal)\.(?P<base>[0-9]+)(\.bin|\.pickle)?$"
+)
+
+
+class Pointer(NamedTuple):
+    """Current state of the on-disk Spindex.
+
+    ``base`` is the generation of the newest snapshot, ``generation`` that
+    of the newest entry in its journal (or ``base`` if it is empty).
+    ``journal_size`` is the number of valid bytes in that journal.
+    ``fingerprint`` is that of the SQL database at that generation (or
+    empty if unknown)."""
+
+    base: int
+    generation: int
+    journal_size: int
+    fingerprint: str = ""
+
+
+def snapshot_path(directory: str, base: int) -> str:
+    return os.path.join(directory, f"snapshot.{base}.bin")
+
+
+def journal_path(directory: str, base: int) -> str:
+    return os.path.join(directory, f"journal.{base}")
+
+
+def current(directory: str) -> Pointer:
+    """Get the pointer to the current snapshot and journal entry.
+
+    Returns (0, 0, 0) if no snapshot has been published yet."""
+
+    try:
+        with open(
+            os.path.join(directory, _GENERATION_FILE_NAME), "rb"
+        ) as generation_file:
+            base, generation, journal_size, *fingerprint = (
+                generation_file.read().decode("utf-8").split()
+            )
+            return Pointer(
+                int(base),
+                int(generation),
+                int(journal_size),
+                fingerprint[0] if fingerprint else "",
+            )
+    except (FileNotFoundError, ValueError):
+        return Pointer(0, 0, 0)
+
+
+def set_current(directory: str, pointer: Pointer) -> None:
+    """Point readers at a new snapshot or journal entry.
+
+    Must only be called while holding the ``lock``."""
+
+    write_atomically(
+        os.path.join(directory, _GENERATION_FILE_NAME),
+        " ".join(str(i) for i in pointer).encode("utf-8"),
+    )
+
+
+def forget_fingerprint(directory: str) -> None:
+    """Mark the current generation as not matching the SQL database.
+
+    Used when committed SQL changes could not be applied to the Spindex,
+    so that the next startup rebuilds it."""
+
+    with lock(directory):
+        pointer = current(directory)
+        if pointer.fingerprint:
+            set_current(directory, pointer._replace(fingerprint=""))
+
+
+def write(directory: str, base: int, media: SpindexMedia) -> None:
+    """Write media as snapshot with the given generation.
+
+    This does not make the snapshot visible to readers yet."""
+
+    write_atomically(snapshot_path(directory, base), codec.encode(media))
+
+
+def publish(directory: str, media: SpindexMedia, fingerprint: str = "") -> int:
+    """Write media as new snapshot, then make it the current generation.
+
+    fingerprint should be that of the SQL database media was loaded from."""
+
+    with lock(directory):
+        previous = current(directory)
+        base = previous.generation + 1
+        write(directory, base, media)
+        set_current(directory, Pointer(base, base, 0, fingerprint))
+
+    remove_older_than(directory, previous.base)
+    return base
+
+
+def remove_older_than(directory: str, base: int) -> None:
+    """Remove snapshots and journals older than the given base.
+
+    The previous base should be kept around, since other processes might
+    have just read the generation file and not opened its snapshot yet."""
+
+    for file_name in os.listdir(directory):
+        match = _STORE_FILE_REGEX.match(file_name)
+        if not match or int(match.group("base")) >= base:
+            continue
+        try:
+            os.remove(os.path.join(directory, file_name))
+        except OSError:
+            pass
+
+
+def load(directory: str, base: int) -> SpindexMedia:
+    """Load the snapshot with the given generation from disk.
+
+    All of it is decoded into a SpindexMedia object (which is rebuilt,
+    posting lists and all), so the file is simply read at once."""
+
+    if base == 0:
+        return SpindexMedia()
+
+    with open(snapshot_path(directory, base), "rb") as snapshot_file:
+        return codec.decode(memoryview(snapshot_file.read()))
+
+
+def is_loadable(directory: str, base: int) -> bool:
+    """Does the snapshot with the given generation exist, and is it
+    in a format this version can load?"""
+
+    try:
+        with open(snapshot_path(directory, base), "rb") as snapshot_file:
+            codec.check_header(snapshot_file.read(codec.HEADER_SIZE))
+        return True
+    except (OSError, codec.SnapshotFormatError):
+        return False
@@ -1,58 +1,158 @@
 from contextlib import AbstractContextManager, contextmanager
-from typing import Any, ContextManager, Generator, Iterable, List, Optional
-
+from copy import copy
+import time
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from flask import g
+
+from beevenue import paths
 from beevenue.flask import request
 
-from ..cache import cache
+from . import blobs, journal, resident, snapshot
+from .files import BlobRef
+from .columns import Predicate
+from .fingerprint import sql_fingerprint
+from .idset import MediumIdSet
 from .interface import SpindexSessionFactory
-from .load.single import single_load
+from .journal import Mutation
+from .load import TagClosures
+from .load.bulk import bulk_load
 from .media import SpindexMedia
 from ..types import MediumDocument
 
 
-class CachingSessionFactory(SpindexSessionFactory):
+# How often to try appending to the journal, given conflicts, and how long
+# to wait before the first retry (doubling with each further one).
+_MAX_APPEND_ATTEMPTS = 5
+_APPEND_BACKOFF_SECONDS = 0.01
+
+
+class ResidentSessionFactory(SpindexSessionFactory):
     """Holder class for the Spindex currently in memory.
 
-    Is lazily initialized from cache, and only persists back into cache
-    at the end of each request, and if a write is necessary.
+    Reads are served from this process' resident Spindex, which is shared
+    between all requests (see ``resident.py``).
 
-    This means that multiple reads in a row are performed very fast and
-    in-memory."""
+    Writes are not persisted right away. Instead, they are recorded, and
+    appended to the journal as a single entry at the end of the request.
+    The resident Spindex picks them up from there. Until then, they are
+    applied to a copy of the resident Spindex only this request reads,
+    so that the request sees its own writes.
+
+    Appending is a compare-and-swap against the generation of the resident
+    Spindex the request read: If another worker replaced some of the same
+    media in the meantime, those media are reloaded from SQL, and appending
+    is retried. This way, an older state of a medium never ends up behind a
+    newer one in the journal. If appending keeps conflicting, it fails
+    (see _append)."""
 
     def __init__(self) -> None:
-        self.spindex: Optional[SpindexMedia] = None
-        self.do_write = False
+        self.directory = paths.spindex_directory()
+        self.mutations: List[Mutation] = []
+
+        # Taken together, so that since is never newer than what this
+        # request reads (including tag_closures).
+        self.spindex: Optional[SpindexMedia]
+        self.spindex, self.since = resident.current()
 
-    def get(self, do_write: bool) -> SpindexMedia:
-        self.do_write |= do_write
+        # Whether spindex is this request's own copy.
+        self.copied = False
+
+    def get(self) -> SpindexMedia:
         if self.spindex is None:
-            self.spindex = cache.get("MEDIA")
+            self.spindex, self.since = resident.current()
         return self.spindex
 
+    def apply(self, mutation: Mutation) -> None:
+        # The resident Spindex itself must never be modified.
+        if not self.copied:
+            self.spindex = self.get().copy()
+            self.copied = True
+
+        mutation.apply_to(self.get())
+        self.mutations.append(mutation)
+
     def exit(self) -> None:
-        if self.do_write:
-            cache.set("MEDIA", self.spindex)
+        try:
+            if self.mutations:
+                self._append()
+        finally:
+            self.mutations = []
+            self.spindex = None
+            self.copied = False
+
+    def _append(self) -> None:
+        """Append the mutations, retrying (with backoff) after conflicts.
+
+        If all attempts conflict, the Spindex no longer matches the SQL
+        database, so its fingerprint is forgotten (making the next startup
+        rebuild it), and the last ConflictError is raised."""
+
+        for attempt in range(_MAX_APPEND_ATTEMPTS):
+            if attempt:
+                time.sleep(_APPEND_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            try:
+                journal.append(
+                    self.directory,
+                    self.mutations,
+                    sql_fingerprint(g.db),
+                    self.since,
+                )
+                return
+            except journal.ConflictError as error:
+                conflict = error
+                self.since = conflict.latest
+                self.mutations = [
+                    m
+                    for m in self.mutations
+                    if m.medium_id not in conflict.medium_ids
+                ] + Spindex().reload_mutations(conflict.medium_ids)
+
+        snapshot.forget_fingerprint(self.directory)
+        raise conflict
 
 
 class _InitializationContext(AbstractContextManager):
     """Context manager used to fill spindex at application startup.
 
-    Always writes on __exit__."""
+    Publishes a new snapshot on __exit__, unless loading failed."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self, fingerprint: str, since: Optional[snapshot.Pointer]
+    ) -> None:
         self._to_write: Optional[SpindexMedia] = None
+        self._fingerprint = fingerprint
+        self._since = since or snapshot.current(_directory())
 
     def __enter__(self) -> SpindexMedia:
         self._to_write = SpindexMedia()
         return self._to_write
 
     def __exit__(self, exc: Any, value: Any, tb: Any) -> None:
-        cache.set("MEDIA", self._to_write)
+        if self._to_write is not None and exc is None:
+            journal.publish(
+                _directory(), self._to_write, self._fingerprint, self._since
+            )
+
+
+def _directory() -> str:
+    return paths.spindex_directory()
 
 
 @contextmanager
-def _session(write_on_exit: bool) -> Generator[SpindexMedia, None, None]:
-    yield request.spindex_session.get(write_on_exit)
+def _session() -> Generator[SpindexMedia, None, None]:
+    yield request.spindex_session.get()
 
 
 class Spindex:
@@ -60,14 +160,20 @@ class Spindex:
 
     @property
     def _read_context(self) -> ContextManager[SpindexMedia]:
-        return _session(False)
+        return _session()
 
-    @property
-    def _write_context(self) -> ContextManager[SpindexMedia]:
-        # Note: This *always* writes, even if no actual modification
-        # took place. This makes it less laborious for the caller to explicitly
-        # decide when to write or not (using a "dirty" flag or similar).
-        return _session(True)
+    @staticmethod
+    def _apply(mutation: Mutation) -> None:
+        request.spindex_session.apply(mutation)
+
+    def version(self) -> Optional[Hashable]:
+        """Get the version of the Spindex, which changes whenever anything
+        in it changes.
+
+        None if this request reads its own changes (which have no version
+        yet, see ResidentSessionFactory)."""
+        with self._read_context as context:
+            return context.version
 
     def all(self) -> Iterable[MediumDocument]:
         with self._read_context as context:
@@ -77,6 +183,10 @@ class Spindex:
         with self._read_context as context:
             return context.get_medium(medium_id)
 
+    def get_medium_by_hash(self, medium_hash: str) -> Optional[MediumDocument]:
+        with self._read_context as context:
+            return context.get_medium_by_hash(medium_hash)
+
     def get_media(self, ids: Iterable[int]) -> List[MediumDocument]:
         with self._read_context as context:
             maybe_media = [context.get_medium(i) for i in ids]
@@ -85,63 +195,195 @@ class Spindex:
             ]
             return result
 
-    def add_alias(self, tag_name: str, new_alias: str) -> bool:
-        with self._write_context as ctx:
-            for medium in ctx.get_all():
-                if tag_name in medium.tag_names.searchable:
-                    medium.tag_names.searchable.add(new_alias)
+    def get_media_with_tiny_thumbnails(
+        self, ids: Iterable[int]
+    ) -> List[MediumDocument]:
+        """Like get_media, but also load each medium's tiny thumbnail.
 
-            return True
+        Only use this for few media (e.g. a single page of results)."""
 
-    def remove_alias(self, former_alias: str) -> bool:
-        with self._write_context as ctx:
-            for medium in ctx.get_all():
-                if former_alias in medium.tag_names.searchable:
-                    medium.tag_names.searchable.remove(former_alias)
+        with self._read_context as context:
+            result = []
+            refs = {}
+            for medium_id in ids:
+                medium = context.get_medium(medium_id)
+                if medium is None:
+                    continue
+                # Never modify the documents in the Spindex itself.
+                result.append(copy(medium))
+                ref = context.get_tiny_thumbnail(medium_id)
+                if ref is not None:
+                    refs[medium_id] = ref
+
+        tiny_thumbnails = blobs.read(_directory(), refs)
+        for medium in result:
+            medium.tiny_thumbnail = tiny_thumbnails.get(medium.medium_id, None)
+        return result
+
+    def with_innate_tags(self, tag_names: Iterable[str]) -> MediumIdSet:
+        """Get ids of all media with any of the given innate tags."""
+        with self._read_context as context:
+            result = MediumIdSet()
+            for tag_name in tag_names:
+                result |= context.with_innate_tag(tag_name)
+            return result
 
-            return True
+    def with_searchable_tags(self, tag_names: Iterable[str]) -> MediumIdSet:
+        """Get ids of all media with any of the given searchable tags."""
+        with self._read_context as context:
+            result = MediumIdSet()
+            for tag_name in tag_names:
+                result |= context.with_searchable_tag(tag_name)
+            return result
 
-    def reindex_medium(self, medium_id: int) -> bool:
-        with self._write_context as ctx:
-            ctx.remove_id(medium_id)
+    def with_rating(self, rating: str) -> MediumIdSet:
+        """Get ids of all media with the given rating.
 
-            new_medium: MediumDocument = single_load(medium_id)  # type: ignore
-            ctx.add(new_medium)
-            return True
+        The result must not be modified."""
+        with self._read_context as context:
+            return context.with_rating(rating)
 
-    def rename_tag(self, old_name: str, new_name: str) -> bool:
-        with self._write_context as ctx:
-            for medium in ctx.get_all():
-                if old_name in medium.tag_names.innate:
-                    medium.tag_names.innate.remove(old_name)
-                    medium.tag_names.innate.add(new_name)
-                if old_name in medium.tag_names.searchable:
-                    medium.tag_names.searchable.remove(old_name)
-                    medium.tag_names.searchable.add(new_name)
+    def with_tag_count(
+        self, medium_ids: MediumIdSet, predicate: Predicate, category: str = ""
+    ) -> MediumIdSet:
+        """Get those of medium_ids whose number of innate tags (of the
+        given category, if any) satisfies predicate.
 
-            return True
+        predicate compares all those numbers at once, as NumPy array."""
+        with self._read_context as context:
+            return context.with_tag_count(medium_ids, predicate, category)
 
-    def add_implication(self, implying: str, implied: str) -> bool:
-        with self._write_context as ctx:
-            for medium in ctx.get_all():
-                if implying in medium.tag_names.searchable:
-                    medium.tag_names.searchable.add(implied)
+    def visible_medium_ids(self, visibility: str) -> MediumIdSet:
+        """Get ids of all media visible in the given censorship context.
 
-            return True
+        The result must not be modified."""
+        with self._read_context as context:
+            return context.visible_to(visibility)
 
-    def remove_implication(self, implying: str, implied: str) -> bool:
-        with self._write_context as ctx:
-            for medium in ctx.get_all():
-                if set([implying, implied]) <= medium.tag_names.searchable:
-                    medium.tag_names.searchable.remove(implied)
+    def searchable_tag_names(self) -> Iterable[str]:
+        with self._read_context as context:
+            return list(context.searchable_tag_names())
 
-            return True
+    def change_tags(self, mutation: Mutation) -> None:
+        """Apply a change to tags, aliases or implications.
 
-    def remove_medium(self, medium_id: int) -> Optional[MediumDocument]:
-        with self._write_context as ctx:
-            return ctx.remove_id(medium_id)
+        mutation is one of the journal's tag mutations, e.g. "rename_tag"."""
+        self._apply(mutation)
 
-    def add_media(self, media: Iterable[MediumDocument]) -> None:
-        with _InitializationContext() as ctx:
-            for medium in media:
-                ctx.add(medium)
+    def reindex_media(self, medium_ids: Iterable[int]) -> int:
+        """Reindex all the given media at once.
+
+        Returns the number of media reindexed. Missing media are skipped.
+
+        Tag closures are those of the Spindex this request reads, which
+        change_tags (in this request) replaces by fresh ones."""
+
+        with self._read_context as context:
+            tag_closures = context.tag_closures
+
+        new_media: List[MediumDocument] = bulk_load(  # type: ignore
+            medium_ids, tag_closures
+        )
+        self._replace_media(new_media)
+        return len(new_media)
+
+    def reload_mutations(self, medium_ids: Iterable[int]) -> List[Mutation]:
+        """Mutations which replace the given media by their state in SQL.
+
+        Media missing from SQL are removed. Tags might have changed since
+        this request started, so closures are not taken from the Spindex."""
+
+        medium_ids = set(medium_ids)
+        new_media: List[MediumDocument] = bulk_load(  # type: ignore
+            medium_ids, TagClosures()
+        )
+        mutations = [
+            Mutation("remove_id", (medium_id,))
+            for medium_id in sorted(
+                medium_ids - {m.medium_id for m in new_media}
+            )
+        ]
+        return mutations + self._replacements(new_media)
+
+    def _replace_media(self, new_media: List[MediumDocument]) -> None:
+        for mutation in self._replacements(new_media):
+            self._apply(mutation)
+
+    def _replacements(self, new_media: List[MediumDocument]) -> List[Mutation]:
+        refs = self._store_tiny_thumbnails(new_media)
+        result = []
+        for medium in new_media:
+            result.append(Mutation("add", (medium,)))
+            result.append(
+                Mutation(
+                    "set_tiny_thumbnail",
+                    (medium.medium_id, refs.get(medium.medium_id, None)),
+                )
+            )
+        return result
+
+    def _store_tiny_thumbnails(
+        self, media: List[MediumDocument]
+    ) -> Dict[int, BlobRef]:
+        """Move tiny thumbnails of media into the blob pack."""
+
+        tiny_thumbnails = {}
+        for medium in media:
+            if medium.tiny_thumbnail:
+                tiny_thumbnails[medium.medium_id] = medium.tiny_thumbnail
+            medium.tiny_thumbnail = None
+
+        with self._read_context as context:
+            existing = {}
+            for medium_id, tiny_thumbnail in tiny_thumbnails.items():
+                ref = context.get_tiny_thumbnail(medium_id)
+                if ref is not None and ref.length == len(tiny_thumbnail):
+                    existing[medium_id] = ref
+
+        # Most reindexing is due to changed tags, so don't bloat the pack
+        # with copies of the very same thumbnails.
+        result = {}
+        existing_blobs = blobs.read(_directory(), existing)
+        for medium_id, blob in existing_blobs.items():
+            if blob == tiny_thumbnails[medium_id]:
+                result[medium_id] = existing[medium_id]
+                del tiny_thumbnails[medium_id]
+
+        if tiny_thumbnails:
+            result.update(blobs.append(_directory(), tiny_thumbnails.items()))
+        return result
+
+    def remove_medium(self, medium_id: int) -> Optional[MediumDocument]:
+        removed = self.get_medium(medium_id)
+        self._apply(Mutation("remove_id", (medium_id,)))
+        return removed
+
+    def add_media(
+        self,
+        media: Iterable[MediumDocument],
+        fingerprint: str = "",
+        since: Optional[snapshot.Pointer] = None,
+    ) -> int:
+        """Replace the whole Spindex by the given media.
+
+        Returns the number of media added. media is only iterated once,
+        so it can be streamed. fingerprint should be that of the SQL database
+        before the media were loaded from it, and since the pointer to the
+        Spindex generation current at that time. Changes to the Spindex
+        after since are carried over."""
+
+        with _InitializationContext(fingerprint, since) as ctx:
+
+            def _tiny_thumbnails() -> Iterator[Tuple[int, bytes]]:
+                # Move tiny thumbnails into the blob pack while streaming.
+                for medium in media:
+                    if medium.tiny_thumbnail:
+                        yield (medium.medium_id, medium.tiny_thumbnail)
+                    medium.tiny_thumbnail = None
+                    ctx.add(medium)
+
+            refs = blobs.append_to_new_pack(_directory(), _tiny_thumbnails())
+            for medium_id, ref in refs.items():
+                ctx.set_tiny_thumbnail(medium_id, ref)
+
+            return len(ctx.data)
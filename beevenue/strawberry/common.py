@@ -4,6 +4,8 @@ from typing import FrozenSet, List, Optional
 
 from flask import g
 
+from ..spindex.idset import MediumIdSet
+
 
 class RulePart(ABC):
     """Abstract base class for all rule parts (both iffs and thens)."""
@@ -79,20 +81,12 @@ class HasAnyTags(RulePart):
         if not self.tag_names:
             return []
 
-        all_media = g.spindex.all()
+        medium_ids = g.spindex.with_searchable_tags(self.tag_names)
 
         if filtering_medium_ids:
-            all_media = [
-                m for m in all_media if m.medium_id in filtering_medium_ids
-            ]
-
-        all_media = [
-            m
-            for m in all_media
-            if len(self.tag_names & m.tag_names.searchable) > 0
-        ]
+            medium_ids &= MediumIdSet(filtering_medium_ids)
 
-        return [m.medium_id for m in all_media]
+        return list(medium_ids)
 
 
 class HasAnyTagsLike(HasAnyTags, IffAndThen):
@@ -108,9 +102,7 @@ class HasAnyTagsLike(HasAnyTags, IffAndThen):
     def _load_tag_names(self) -> None:
         tag_names = set()
 
-        all_tag_names = set()
-        for medium in g.spindex.all():
-            all_tag_names |= medium.tag_names.searchable
+        all_tag_names = set(g.spindex.searchable_tag_names())
 
         for regex in self.regexes:
             compiled_regex = re.compile(f"^{regex}$")
@@ -1,14 +1,51 @@
-from abc import ABC
-from typing import Set
+from abc import ABC, abstractmethod
+from typing import AbstractSet, Dict, List, Optional
+
+# Names which media with a certain innate tag derive (additionally, or no
+# longer), by name of that tag. See TagNamesField.derive.
+Derivations = Dict[str, List[str]]
 
 
 class TagNamesField(ABC):
     """Flattened in-memory representation of a medium's tags."""
 
-    __slots__ = ["innate", "searchable"]
+    __slots__: List[str] = []
+
+    @property
+    @abstractmethod
+    def innate(self) -> AbstractSet[str]:
+        """Names of the tags this medium is actually tagged with."""
+
+    @property
+    @abstractmethod
+    def searchable(self) -> AbstractSet[str]:
+        """Innate tag names, plus those of implied tags and aliases."""
+
+    @abstractmethod
+    def add_searchable(self, name: str) -> None:
+        """Make this medium searchable by the given name."""
+
+    @abstractmethod
+    def derivation_count(self, name: str) -> int:
+        """Number of innate tags which make this medium searchable by name.
+
+        That is, the tag of that name itself, and the tags which have name
+        as alias or (transitively) imply the tag of that name."""
+
+    @abstractmethod
+    def derive(self, name: str, delta: int) -> bool:
+        """Change the derivation count of name by delta.
+
+        Returns whether the medium became (or stopped being) searchable
+        by name, i.e. whether the count changed from or to zero."""
+
+    @abstractmethod
+    def remove_searchable(self, name: str) -> None:
+        """Make this medium no longer searchable by the given name."""
 
-    innate: Set[str]
-    searchable: Set[str]
+    @abstractmethod
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Replace old_name by new_name in both innate and searchable."""
 
 
 class MediumDocument(ABC):
@@ -29,5 +66,7 @@ class MediumDocument(ABC):
     medium_hash: str
     mime_type: str
     rating: str
-    tiny_thumbnail: bytes
+    # Not stored in the Spindex itself (only in SQL and in the blob pack).
+    # Only set on documents created from SQL, or for a page of results.
+    tiny_thumbnail: Optional[bytes]
     tag_names: TagNamesField
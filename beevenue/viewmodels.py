@@ -45,6 +45,7 @@ class _PaginationSchema(Schema):
     page_count = fields.Int(data_key="pageCount")
     page_number = fields.Int(data_key="pageNumber")
     page_size = fields.Int(data_key="pageSize")
+    page_count_is_estimate = fields.Bool(data_key="pageCountIsEstimate")
 
 
 class _TagShowSchema(Schema):
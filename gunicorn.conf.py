@@ -0,0 +1,15 @@
+"""gunicorn configuration for production (see prod.sh)."""
+
+from beevenue import preload
+
+bind = "0.0.0.0:7000"
+workers = 4
+
+# Some requests may run longer than the default timout of 30s
+timeout = 90
+
+# Build the Spindex once in the master, and share it with all workers
+# (see beevenue/preload.py).
+preload_app = True
+when_ready = preload.when_ready
+post_fork = preload.post_fork
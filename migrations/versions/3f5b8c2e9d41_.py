@@ -0,0 +1,64 @@
+"""Add tag_closure table
+
+Revision ID: 3f5b8c2e9d41
+Revises: a19c1d2e5764
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f5b8c2e9d41"
+down_revision = "a19c1d2e5764"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tag_closure",
+        sa.Column("ancestor", sa.Integer(), nullable=False),
+        sa.Column("descendant", sa.Integer(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["ancestor"], ["tag.id"]),
+        sa.ForeignKeyConstraint(["descendant"], ["tag.id"]),
+        sa.PrimaryKeyConstraint("ancestor", "descendant"),
+    )
+    op.create_index(
+        op.f("ix_tag_closure_ancestor"),
+        "tag_closure",
+        ["ancestor"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_tag_closure_descendant"),
+        "tag_closure",
+        ["descendant"],
+        unique=False,
+    )
+
+    # Fill with the closure of all existing implications.
+    op.execute(
+        """
+        INSERT INTO tag_closure (ancestor, descendant, depth)
+        WITH RECURSIVE closure(ancestor, descendant, depth) AS (
+            SELECT implying_tag_id, implied_tag_id, 1
+            FROM "tagImplication"
+            UNION
+            SELECT closure.ancestor, i.implied_tag_id, closure.depth + 1
+            FROM closure
+            JOIN "tagImplication" i ON i.implying_tag_id = closure.descendant
+        )
+        SELECT ancestor, descendant, MIN(depth)
+        FROM closure
+        GROUP BY ancestor, descendant
+        """
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_tag_closure_descendant"), table_name="tag_closure")
+    op.drop_index(op.f("ix_tag_closure_ancestor"), table_name="tag_closure")
+    op.drop_table("tag_closure")
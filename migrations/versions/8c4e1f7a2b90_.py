@@ -0,0 +1,30 @@
+"""Add change_counter table
+
+Revision ID: 8c4e1f7a2b90
+Revises: 3f5b8c2e9d41
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8c4e1f7a2b90"
+down_revision = "3f5b8c2e9d41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    change_counter = op.create_table(
+        "change_counter",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("value", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(change_counter, [{"id": 1, "value": 0}])
+
+
+def downgrade():
+    op.drop_table("change_counter")
@@ -2,5 +2,5 @@
 set -ev
 source beevenueenv/bin/activate
 p=$(realpath beevenue_config.prod.py)
-# Some requests may run longer than the default timout of 30s
-env BEEVENUE_CONFIG_FILE="$p" ./beevenueenv/bin/gunicorn --workers 4 --timeout 90 -b 0.0.0.0:7000 main:app
\ No newline at end of file
+# See gunicorn.conf.py for workers, timeout and Spindex preloading.
+env BEEVENUE_CONFIG_FILE="$p" ./beevenueenv/bin/gunicorn -c gunicorn.conf.py main:app
\ No newline at end of file
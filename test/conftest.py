@@ -11,6 +11,7 @@ import warnings
 import pytest
 from sqlalchemy.exc import SAWarning
 
+from beevenue import paths
 from beevenue.beevenue import get_application
 
 warnings.filterwarnings(
@@ -83,9 +84,14 @@ def _client():
     temp_nice_path = os.path.abspath(temp_path)
     connection_string = f"sqlite:///{temp_nice_path}"
 
+    # All testing databases have the same fingerprint, so a Spindex left
+    # behind by an earlier test would be taken as current.
+    spindex_path = tempfile.mkdtemp(suffix=".spindex")
+
     def extra_config(application):
         """Set specific testing-only flags on the testee."""
         application.config["SQLALCHEMY_DATABASE_URI"] = connection_string
+        application.config["BEEVENUE_SPINDEX_DIRECTORY"] = spindex_path
 
     def fill_db(db):
         """Create schema and fill the SQL database with initial data."""
@@ -128,6 +134,7 @@ def _client():
 
     os.close(temp_fd)
     os.unlink(temp_path)
+    shutil.rmtree(spindex_path, ignore_errors=True)
     RAN_ONCE = True
 
 
@@ -138,6 +145,13 @@ def client():
         yield c
 
 
+@pytest.yield_fixture
+def spindex_directory(client):
+    """Return the Spindex directory of the current testing client."""
+    with client.app_under_test.app_context():
+        return paths.spindex_directory()
+
+
 @pytest.yield_fixture
 def nsfw(client):
     """Ensure that the current session is not tagged as 'sfw'."""
@@ -18,6 +18,9 @@ INSERT INTO `tag` VALUES (4002, 'tobecensoredtoo', 'e');
 INSERT INTO `tagImplication` VALUES (2001, 2000);
 INSERT INTO `tagImplication` VALUES (2002, 2000);
 INSERT INTO `tagImplication` VALUES (4001, 4002);
+INSERT INTO `tag_closure` VALUES (2001, 2000, 1);
+INSERT INTO `tag_closure` VALUES (2002, 2000, 1);
+INSERT INTO `tag_closure` VALUES (4001, 4002, 1);
 
 INSERT INTO `tagAlias` VALUES (1, 2002, 'c:pete');
 
@@ -46,3 +46,8 @@ def test_sendfile_headers_are_set(client, asUser):
 
     assert res.status_code == 200
     assert "X-Sendfile" in res.headers
+
+
+def test_cannot_access_files_of_censored_media(client, asUser):
+    res = client.get("/files/hash3.jpg")
+    assert res.status_code == 403
@@ -1,3 +1,9 @@
+from copy import copy
+
+from beevenue.spindex import journal
+from beevenue.spindex.journal import Mutation
+
+
 def test_cannot_get_e_rated_medium_as_sfw_user(client, asUser):
     res = client.get("/medium/3")
     assert res.status_code == 403
@@ -31,3 +37,24 @@ def test_cannot_get_missing_medium_as_user(client, asUser):
 def test_cannot_get_e_rated_medium_as_admin_in_sfw_mode(client, asAdmin):
     res = client.get("/medium/3")
     assert res.status_code // 100 == 4
+
+
+def test_similar_media_of_nsfw_user_exclude_unrated_media(
+    client, asUser, nsfw, spindex_directory
+):
+    def similar_to_4():
+        res = client.get("/medium/4")
+        assert res.status_code == 200
+        return [m["id"] for m in res.get_json()["similar"]]
+
+    # Media 4 to 11 share a tag, so they are all similar to each other.
+    assert 11 in similar_to_4()
+
+    _, media = journal.load_current(spindex_directory)
+    unrated = copy(media.get_medium(11))
+    unrated.rating = "u"
+    journal.append(spindex_directory, [Mutation("add", (unrated,))])
+
+    similar = similar_to_4()
+    assert similar
+    assert 11 not in similar
@@ -0,0 +1,82 @@
+import pickle
+
+from beevenue.spindex.idset import MediumIdSet
+
+
+def _sparse_and_dense():
+    sparse = set(range(0, 200000, 7))
+    dense = set(range(1000, 70000)) | {140000}
+    return sparse, dense
+
+
+def test_medium_id_set_operations_match_set():
+    sparse, dense = _sparse_and_dense()
+    left, right = MediumIdSet(sparse), MediumIdSet(dense)
+
+    assert len(left) == len(sparse)
+    assert list(left) == sorted(sparse)
+    assert (left & right) == sparse & dense
+    assert (left | right) == sparse | dense
+    assert (left - right) == sparse - dense
+    assert (right - left) == dense - sparse
+
+
+def test_medium_id_set_add_and_discard():
+    ids = MediumIdSet()
+    assert not ids
+
+    for i in range(5000):
+        ids.add(i * 2)
+    assert 4 in ids
+    assert 5 not in ids
+    assert len(ids) == 5000
+
+    for i in range(4999):
+        ids.discard(i * 2)
+    ids.discard(12345678)
+    assert list(ids) == [9998]
+
+
+def test_medium_id_set_copies_are_independent():
+    sparse, _ = _sparse_and_dense()
+    original = MediumIdSet(sparse)
+    copied = original.copy()
+
+    copied.add(8)
+    copied.discard(7)
+    original.add(15)
+    original.discard(14)
+
+    assert copied == (sparse | {8}) - {7}
+    assert original == (sparse | {15}) - {14}
+
+
+def test_medium_id_set_is_picklable():
+    _, dense = _sparse_and_dense()
+    ids = MediumIdSet(dense)
+    assert pickle.loads(pickle.dumps(ids)) == ids
+
+
+def test_medium_id_set_numpy_roundtrip():
+    sparse, dense = _sparse_and_dense()
+    ids = MediumIdSet(sparse | dense)
+
+    as_array = ids.to_numpy()
+    assert as_array.tolist() == sorted(sparse | dense)
+    assert MediumIdSet.from_numpy(as_array) == ids
+    assert not MediumIdSet.from_numpy(MediumIdSet().to_numpy())
+
+
+def test_medium_id_set_descending_slice():
+    sparse, dense = _sparse_and_dense()
+    everything = sorted(sparse | dense, reverse=True)
+    ids = MediumIdSet(everything)
+
+    for start, stop in [
+        (0, 10),
+        (5, 25),
+        (20000, 20050),
+        (len(ids) - 3, 10 ** 9),
+    ]:
+        assert ids.descending_slice(start, stop) == everything[start:stop]
+    assert ids.descending_slice(10 ** 9, 10 ** 9 + 5) == []
@@ -16,6 +16,39 @@ def test_can_update_medium_as_admin(client, asAdmin):
     assert res.status_code == 200
 
 
+def test_update_medium_responds_with_updated_medium(client, asAdmin, nsfw):
+    res = client.patch(
+        "/medium/3/metadata", json={"rating": "q", "tags": ["brandnewtag"]}
+    )
+    assert res.status_code == 200
+    json_result = res.get_json()
+    assert json_result["rating"] == "q"
+    assert json_result["tags"] == ["brandnewtag"]
+
+    res = client.get("/medium/3")
+    assert res.get_json()["tags"] == json_result["tags"]
+
+
+def test_update_medium_responds_with_similar_media_of_updated_medium(
+    client, asAdmin, nsfw
+):
+    # Medium 2 is the only other medium with tag C.
+    res = client.patch(
+        "/medium/1/metadata", json={"rating": "s", "tags": ["C"]}
+    )
+    assert res.status_code == 200
+    assert [m["id"] for m in res.get_json()["similar"]] == [2]
+
+
+def test_update_medium_persists_rating_only_changes(client, asAdmin, nsfw):
+    res = client.patch("/medium/1/metadata", json={"rating": "q"})
+    assert res.status_code == 200
+    assert res.get_json()["rating"] == "q"
+
+    res = client.get("/medium/1")
+    assert res.get_json()["rating"] == "q"
+
+
 def test_cant_update_medium_to_unknown_rating(client, asAdmin, nsfw):
     res = client.patch(
         "/medium/3/metadata", json={"rating": "u", "tags": ["A"]}
@@ -1,7 +1,13 @@
+import os
+import shutil
 from urllib import parse
 
 import pytest
 
+from beevenue.core.search import search
+from beevenue.spindex import journal, snapshot
+from beevenue.spindex.journal import Mutation
+
 
 def _when_searching(c, query, page_number=1, page_size=10):
     q = parse.urlencode(
@@ -152,3 +158,62 @@ def test_search_with_counting_term4_succeeds(client, asAdmin, nsfw):
     result = res.get_json()
     print(result)
     assert len(result["items"]) >= 3
+
+
+def test_search_pages_come_from_cached_result(
+    client, asAdmin, nsfw, monkeypatch
+):
+    calls = []
+    original_plan = search._plan
+
+    def _counting_plan(context, search_terms):
+        calls.append(search_terms)
+        return original_plan(context, search_terms)
+
+    monkeypatch.setattr(search, "_plan", _counting_plan)
+
+    first = _when_searching(client, "tags<2", page_size=5).get_json()
+    second = _when_searching(
+        client, "tags<2", page_size=5, page_number=2
+    ).get_json()
+    again = _when_searching(client, "tags<2", page_size=5).get_json()
+    assert len(calls) == 1
+    assert first["items"] == again["items"]
+    assert not {i["id"] for i in first["items"]} & {
+        i["id"] for i in second["items"]
+    }
+
+    # Any change to the Spindex invalidates cached results.
+    res = client.post("/tags/batch", json={"tags": ["C"], "mediumIds": [3]})
+    assert res.status_code == 200
+    res = _when_searching(client, "tags<2", page_size=5)
+    assert res.status_code == 200
+    assert len(calls) == 2
+
+
+def test_search_does_not_serve_results_of_a_wiped_spindex(
+    client, asAdmin, nsfw, spindex_directory
+):
+    def _append_nothing():
+        journal.append(spindex_directory, [Mutation("remove_id", (999,))])
+
+    _append_nothing()
+    generation = snapshot.current(spindex_directory).generation
+    res = _when_searching(client, "A")
+    assert [i["id"] for i in res.get_json()["items"]] == [1]
+
+    # Start over with medium 2 matching too, until reaching the same
+    # generation.
+    _, media = journal.load_current(spindex_directory)
+    media.rename_tag("C", "A")
+    shutil.rmtree(spindex_directory)
+    os.mkdir(spindex_directory)
+    journal.publish(
+        spindex_directory, media, "", snapshot.current(spindex_directory)
+    )
+    assert client.get("/tags").status_code == 200
+    _append_nothing()
+    assert snapshot.current(spindex_directory).generation == generation
+
+    res = _when_searching(client, "A")
+    assert {i["id"] for i in res.get_json()["items"]} == {1, 2}
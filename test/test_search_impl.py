@@ -1,5 +1,7 @@
 from beevenue.core.search.base import SearchTerm
-from beevenue.core.search.simple import PositiveSearchTerm
+from beevenue.core.search.plan import plan
+from beevenue.core.search.simple import Negative, PositiveSearchTerm
+from beevenue.spindex.idset import MediumIdSet
 
 
 def test_terms_are_compared_by_value():
@@ -21,3 +23,111 @@ def test_search_term_abstract_base_method_is_harmless():
             return super().from_match(match)
 
     TestingSearchTerm.from_match("Foo")
+
+
+class _FakeMedium:
+    def __init__(self, medium_id):
+        self.medium_id = medium_id
+
+
+class _IndexedTerm(SearchTerm):
+    def __init__(self, ids):
+        self.ids = MediumIdSet(ids)
+
+    @classmethod
+    def from_match(cls, match):
+        raise NotImplementedError()
+
+    def applies_to(self, medium):
+        raise AssertionError("Indexed terms must not be checked per medium")
+
+    def indexed_medium_ids(self):
+        return self.ids
+
+    def __repr__(self):
+        return repr(self.ids)
+
+
+class _EvenTerm(SearchTerm):
+    def __init__(self):
+        self.checked = []
+
+    @classmethod
+    def from_match(cls, match):
+        raise NotImplementedError()
+
+    def applies_to(self, medium):
+        self.checked.append(medium.medium_id)
+        return medium.medium_id % 2 == 0
+
+
+def test_query_plan_checks_predicates_only_on_remaining_media():
+    even = _EvenTerm()
+    query_plan = plan(
+        MediumIdSet(range(100)),
+        [
+            _IndexedTerm(range(50)),
+            _IndexedTerm(range(10, 20)),
+            Negative(_IndexedTerm([12, 14])),
+            even,
+        ],
+    )
+    assert len(query_plan.included) == 3
+    assert len(query_plan.excluded) == 1
+    assert query_plan.predicates == [even]
+
+    result = query_plan.execute(lambda ids: [_FakeMedium(i) for i in ids])
+    assert list(result) == [10, 16, 18]
+    assert even.checked == [10, 11, 13, 15, 16, 17, 18, 19]
+
+
+def test_query_plan_stops_once_nothing_is_left():
+    even = _EvenTerm()
+    query_plan = plan(MediumIdSet([1, 2]), [_IndexedTerm([3]), even])
+
+    result = query_plan.execute(lambda ids: [_FakeMedium(i) for i in ids])
+    assert not result
+    assert not even.checked
+
+
+def test_query_plan_checks_only_newest_media_for_first_matches():
+    even = _EvenTerm()
+    query_plan = plan(MediumIdSet(range(1000)), [even])
+
+    first = query_plan.execute_first(
+        10, lambda ids: [_FakeMedium(i) for i in ids]
+    )
+    assert len(even.checked) == 64
+    assert min(even.checked) == 936
+    assert list(first.medium_ids.descending_slice(0, 3)) == [998, 996, 994]
+    assert not first.is_exact
+    assert first.match_count == 500
+
+
+def test_query_plan_intersects_only_newest_media_for_first_matches():
+    even = _EvenTerm()
+    query_plan = plan(
+        MediumIdSet(range(1000)),
+        [_IndexedTerm(range(0, 1000, 3)), Negative(_IndexedTerm([996])), even],
+    )
+
+    first = query_plan.execute_first(
+        10, lambda ids: [_FakeMedium(i) for i in ids]
+    )
+    # Only the 64 newest of the smallest posting list were looked at.
+    assert len(even.checked) == 63
+    assert min(even.checked) == 810
+    assert 996 not in even.checked
+    assert list(first.medium_ids.descending_slice(0, 3)) == [990, 984, 978]
+    assert not first.is_exact
+    assert first.match_count == 162
+
+
+def test_query_plan_first_matches_are_exact_if_all_were_checked():
+    query_plan = plan(MediumIdSet(range(50)), [_EvenTerm()])
+
+    first = query_plan.execute_first(
+        10, lambda ids: [_FakeMedium(i) for i in ids]
+    )
+    assert first.is_exact
+    assert first.match_count == 25
@@ -1,9 +1,76 @@
+import time
+
+from beevenue.spindex import journal, reindex
+
+
 def test_spindex_get_status(client, asAdmin):
     res = client.get("/spindex/status")
     assert res.status_code == 200
-    assert len(res.get_json()) > 0
+    assert res.get_json()["media"] > 0
 
 
-def test_spindex_reindex(client, asAdmin):
+def _reindex(client):
     res = client.post("/spindex/reindex")
-    assert res.status_code == 200
+    assert res.status_code == 202
+
+    for _ in range(100):
+        job = client.get("/spindex/status").get_json()["reindex"]
+        if job["state"] != "running":
+            return job
+        time.sleep(0.05)
+    raise AssertionError("Reindexing did not finish")
+
+
+def test_spindex_reindex(client, asAdmin):
+    job = _reindex(client)
+    assert job["state"] == "finished"
+    assert job["processed"] == job["total"]
+    assert job["etaSeconds"] == 0
+
+
+def test_spindex_reindex_keeps_tags_and_reports_statistics(
+    client, asAdmin, spindex_directory
+):
+    _, before = journal.load_current(spindex_directory)
+
+    job = _reindex(client)
+    assert "rows/s" in job["result"]
+
+    _, after = journal.load_current(spindex_directory)
+    assert len(list(after.get_all())) == len(list(before.get_all()))
+    for medium in before.get_all():
+        reloaded = after.get_medium(medium.medium_id)
+        assert set(reloaded.tag_names.innate) == set(medium.tag_names.innate)
+        assert set(reloaded.tag_names.searchable) == set(
+            medium.tag_names.searchable
+        )
+
+
+def test_spindex_reindex_is_shared_between_processes(
+    client, asAdmin, spindex_directory
+):
+    # As if another worker process was running a job.
+    running_lock = reindex._RunningLock(spindex_directory)
+    assert running_lock.acquire()
+    try:
+        reindex.ReindexJob(spindex_directory, 10).save()
+
+        res = client.post("/spindex/reindex")
+        assert res.status_code == 409
+
+        job = client.get("/spindex/status").get_json()["reindex"]
+        assert job["state"] == "running"
+        assert job["total"] == 10
+    finally:
+        running_lock.release()
+
+
+def test_spindex_reindex_of_dead_process_is_reported_as_failed(
+    client, asAdmin, spindex_directory
+):
+    reindex.ReindexJob(spindex_directory, 10).save()
+
+    job = client.get("/spindex/status").get_json()["reindex"]
+    assert job["state"] == "failed"
+
+    assert _reindex(client)["state"] == "finished"
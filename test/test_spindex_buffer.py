@@ -0,0 +1,83 @@
+from flask import g
+
+from beevenue.flask import request
+from beevenue.spindex import resident, snapshot
+from beevenue.spindex.buffer import SignalBuffer
+from beevenue.spindex.journal import Mutation
+from beevenue.spindex.signal_handlers import start_buffering
+from beevenue.spindex.spindex import ResidentSessionFactory, Spindex
+
+
+class _RecordingSpindex:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+
+class _FakeSession:
+    new = dirty = deleted = ()
+
+
+def test_signal_buffer_coalesces_committed_changes():
+    buffer = SignalBuffer()
+    session = _FakeSession()
+
+    buffer.on_flush()
+    buffer.record(session).reindex([1, 2])
+    buffer.record(session).change_tags(Mutation("rename_tag", ("A", "B")))
+    buffer.record(session).reindex([2, 3])
+    buffer.record(session).remove(3)
+    buffer.on_commit()
+
+    # Changes recorded before a rollback are dropped.
+    buffer.on_flush()
+    buffer.record(session).reindex([4])
+    buffer.on_rollback()
+
+    spindex = _RecordingSpindex()
+    buffer.dispatch(spindex)
+    assert spindex.calls == [
+        ("remove_medium", (3,)),
+        ("change_tags", (Mutation("rename_tag", ("A", "B")),)),
+        ("reindex_media", ({1, 2},)),
+    ]
+
+    spindex = _RecordingSpindex()
+    buffer.dispatch(spindex)
+    assert spindex.calls == []
+
+
+def test_spindex_session_reads_its_own_writes(client, spindex_directory):
+    with client.app_under_test.test_request_context():
+        resident.refresh(spindex_directory)
+        resident_media, _ = resident.current()
+        request.spindex_session = ResidentSessionFactory()
+        start_buffering()
+        g.spindex = Spindex()
+
+        g.spindex.change_tags(Mutation("derive", ({"A": ["own.alias"]}, 1)))
+        assert 1 in g.spindex.with_searchable_tags(["own.alias"])
+
+        # Reindexing does not use closures from before the tag change.
+        media = request.spindex_session.get()
+        assert media.tag_closures is not resident_media.tag_closures
+
+        # The resident Spindex itself is unchanged.
+        assert "own.alias" not in resident_media.searchable_tag_names()
+        request.spindex_session.exit()
+
+
+def test_failed_flush_does_not_fail_committed_request(
+    client, asAdmin, spindex_directory, monkeypatch
+):
+    def _failing_change_tags(self, mutation):
+        raise RuntimeError("Spindex is broken")
+
+    monkeypatch.setattr(Spindex, "change_tags", _failing_change_tags)
+    res = client.post("/tag/A/aliases/flushed.alias")
+    assert res.status_code == 200
+
+    # The SQL change is there, but the Spindex does not reflect it.
+    assert not snapshot.current(spindex_directory).fingerprint
@@ -0,0 +1,45 @@
+from beevenue.spindex import journal
+from beevenue.spindex.journal import Mutation
+
+
+def test_spindex_consistency_check_finds_and_repairs_drift(
+    client, asAdmin, spindex_directory
+):
+    res = client.get("/spindex/consistency")
+    assert res.status_code == 200
+    assert res.get_json()["isConsistent"]
+
+    # Let the Spindex drift from SQL behind the application's back.
+    journal.append(spindex_directory, [Mutation("remove_id", (1,))])
+
+    res = client.get("/spindex/consistency")
+    assert res.get_json()["missing"] == [1]
+
+    res = client.post("/spindex/consistency")
+    assert res.status_code == 200
+    assert res.get_json()["missing"] == [1]
+
+    res = client.get("/spindex/consistency")
+    assert res.get_json()["isConsistent"]
+
+
+def test_spindex_consistency_check_cli(client):
+    runner = client.app_under_test.test_cli_runner()
+    result = runner.invoke(args=["check-spindex"])
+    assert result.exit_code == 0
+    assert "0 missing, 0 extra, 0 differing" in result.output
+
+
+def test_spindex_consistency_check_compares_derivation_counts(
+    client, asAdmin, spindex_directory
+):
+    # Medium 1 stays searchable by the same names, but now seemingly
+    # derives "A" from two of its tags.
+    journal.append(spindex_directory, [Mutation("derive", ({"A": ["A"]}, 1))])
+
+    res = client.get("/spindex/consistency")
+    assert res.get_json()["differing"] == [1]
+
+    client.post("/spindex/consistency")
+    res = client.get("/spindex/consistency")
+    assert res.get_json()["isConsistent"]
@@ -0,0 +1,151 @@
+from copy import copy
+
+from flask import g
+import pytest
+
+from beevenue.flask import request
+from beevenue.spindex import journal, resident, snapshot
+from beevenue.spindex.journal import Mutation
+from beevenue.spindex.signal_handlers import start_buffering
+from beevenue.spindex.spindex import ResidentSessionFactory, Spindex
+
+
+def test_spindex_write_appends_to_journal(client, asAdmin, spindex_directory):
+    before = snapshot.current(spindex_directory)
+    res = client.post("/tag/A/aliases/some.new.alias")
+    assert res.status_code == 200
+    after = snapshot.current(spindex_directory)
+
+    # Only the journal grew, no new snapshot was written.
+    assert after.base == before.base
+    assert after.generation == before.generation + 1
+    assert after.journal_size > before.journal_size
+
+    _, media = journal.load_current(spindex_directory)
+    medium = media.get_medium(1)
+    assert "some.new.alias" in medium.tag_names.searchable
+
+
+def test_spindex_journal_compaction_keeps_mutations(client, spindex_directory):
+    journal.append(
+        spindex_directory, [Mutation("derive", ({"A": ["alias.one"]}, 1))]
+    )
+    journal.compact(spindex_directory)
+
+    pointer = snapshot.current(spindex_directory)
+    assert pointer.base == pointer.generation
+    assert pointer.journal_size == 0
+
+    journal.append(
+        spindex_directory, [Mutation("derive", ({"A": ["alias.two"]}, 1))]
+    )
+    _, media = journal.load_current(spindex_directory)
+    medium = media.get_medium(1)
+    assert {"alias.one", "alias.two"} <= medium.tag_names.searchable
+
+
+def test_spindex_journal_append_detects_conflicting_writers(
+    client, spindex_directory
+):
+    since = snapshot.current(spindex_directory)
+
+    # Another worker replaces medium 1 in the meantime.
+    journal.append(
+        spindex_directory, [Mutation("set_tiny_thumbnail", (1, None))]
+    )
+
+    try:
+        journal.append(
+            spindex_directory, [Mutation("remove_id", (1,))], "", since
+        )
+        raise AssertionError("Conflict was not detected")
+    except journal.ConflictError as conflict:
+        assert conflict.medium_ids == {1}
+        assert conflict.latest == snapshot.current(spindex_directory)
+
+    # Changes to other media do not conflict.
+    generation = journal.append(
+        spindex_directory, [Mutation("remove_id", (2,))], "", since
+    )
+    assert generation == since.generation + 2
+
+    # Changes to tags conflict with any medium, since it might have been
+    # loaded from SQL before them. Other changes to tags do not conflict.
+    since = snapshot.current(spindex_directory)
+    journal.append(spindex_directory, [Mutation("derive", ({"A": ["x"]}, 1))])
+    try:
+        journal.append(
+            spindex_directory, [Mutation("remove_id", (3,))], "", since
+        )
+        raise AssertionError("Conflict was not detected")
+    except journal.ConflictError as conflict:
+        assert conflict.medium_ids == {3}
+    journal.append(
+        spindex_directory, [Mutation("rename_tag", ("x", "y"))], "", since
+    )
+
+
+def test_spindex_session_reloads_media_changed_by_other_writers(
+    client, spindex_directory
+):
+    app = client.app_under_test
+
+    with app.test_request_context():
+        resident.refresh(spindex_directory)
+        session = ResidentSessionFactory()
+        request.spindex_session = session
+        start_buffering()
+        g.spindex = Spindex()
+
+        stale = copy(session.get().get_medium(1))
+        stale.rating = "x"
+        session.apply(Mutation("add", (stale,)))
+
+        # Another worker removes medium 1 before this one appends.
+        journal.append(spindex_directory, [Mutation("remove_id", (1,))])
+        session.exit()
+
+    _, media = journal.load_current(spindex_directory)
+    medium = media.get_medium(1)
+    assert medium is not None
+    assert medium.rating != "x"
+
+
+def test_spindex_session_compares_against_the_generation_it_reads(
+    client, spindex_directory
+):
+    app = client.app_under_test
+
+    with app.test_request_context():
+        resident.refresh(spindex_directory)
+        read = resident.current()
+
+        # Not picked up by the resident Spindex yet.
+        journal.append(spindex_directory, [Mutation("remove_id", (2,))])
+        session = ResidentSessionFactory()
+
+        assert (session.get(), session.since) == read
+        assert session.since != snapshot.current(spindex_directory)
+
+
+def test_spindex_session_gives_up_on_persistent_conflicts(
+    client, spindex_directory, monkeypatch
+):
+    app = client.app_under_test
+
+    def _conflicting_append(directory, *args):
+        raise journal.ConflictError(snapshot.current(directory), {1})
+
+    with app.test_request_context():
+        resident.refresh(spindex_directory)
+        session = ResidentSessionFactory()
+        request.spindex_session = session
+        start_buffering()
+        g.spindex = Spindex()
+
+        session.apply(Mutation("remove_id", (1,)))
+        monkeypatch.setattr(journal, "append", _conflicting_append)
+        with pytest.raises(journal.ConflictError):
+            session.exit()
+
+    assert not snapshot.current(spindex_directory).fingerprint
@@ -0,0 +1,133 @@
+from copy import copy
+import pickle
+
+from beevenue.spindex import journal
+from beevenue.spindex.idset import MediumIdSet
+from beevenue.spindex.media import VISIBLE_RATINGS
+from beevenue.spindex.models import SpindexedMediumTagNames
+
+
+def test_spindex_posting_lists_follow_tag_changes(client, spindex_directory):
+    _, media = journal.load_current(spindex_directory)
+    with_a = set(media.with_searchable_tag("A"))
+    assert with_a
+    assert with_a == set(media.with_innate_tag("A"))
+
+    media.derive({"A": ["some.alias"]}, 1)
+    assert media.with_searchable_tag("some.alias") == with_a
+
+    media.rename_tag("A", "renamed")
+    assert not media.with_innate_tag("A")
+    assert not media.with_searchable_tag("A")
+    assert media.with_innate_tag("renamed") == with_a
+
+    media.remove_alias("some.alias")
+    assert "some.alias" not in media.searchable_tag_names()
+
+    removed = media.remove_id(next(iter(with_a)))
+    assert removed.medium_id not in media.with_innate_tag("renamed")
+
+
+def test_spindex_counts_derivations_of_searchable_tags(
+    client, asAdmin, spindex_directory
+):
+    def searchable(medium_id):
+        _, media = journal.load_current(spindex_directory)
+        return media.get_medium(medium_id).tag_names
+
+    # Medium 1 has innate tags A and B, medium 2 has B and C.
+    assert client.patch("/tag/A/implications/C").status_code == 200
+    assert client.patch("/tag/B/implications/C").status_code == 200
+    assert searchable(1).derivation_count("C") == 2
+    assert searchable(2).derivation_count("C") == 2
+
+    assert client.post("/tag/C/aliases/c.alias").status_code == 200
+    assert searchable(1).derivation_count("c.alias") == 2
+
+    # B still implies C, so medium 1 stays searchable by C.
+    assert client.delete("/tag/A/implications/C").status_code == 200
+    assert "C" in searchable(1).searchable
+    assert searchable(1).derivation_count("c.alias") == 1
+
+    assert client.delete("/tag/B/implications/C").status_code == 200
+    assert "C" not in searchable(1).searchable
+    assert "c.alias" not in searchable(1).searchable
+    assert searchable(2).derivation_count("C") == 1
+    assert "c.alias" in searchable(2).searchable
+
+
+def test_spindex_columns_follow_tag_changes(client, spindex_directory):
+    _, media = journal.load_current(spindex_directory)
+    everything = MediumIdSet(m.medium_id for m in media.get_all())
+
+    def with_x_tags(count):
+        return set(media.with_tag_count(everything, lambda c: c == count, "x"))
+
+    assert not with_x_tags(1)
+    media.rename_tag("A", "x:a")
+    assert with_x_tags(1) == set(media.with_innate_tag("x:a"))
+
+    media.remove_id(1)
+    assert 1 not in with_x_tags(1)
+    assert 1 not in media.with_tag_count(everything, lambda c: c > 0)
+
+
+def test_spindex_copies_are_independent(client, spindex_directory):
+    _, media = journal.load_current(spindex_directory)
+    everything = MediumIdSet(m.medium_id for m in media.get_all())
+    with_a = set(media.with_innate_tag("A"))
+    tag_counts = set(media.with_tag_count(everything, lambda c: c > 0))
+
+    copied = media.copy()
+    copied.rename_tag("A", "renamed")
+    copied.remove_id(2)
+
+    assert set(media.with_innate_tag("A")) == with_a
+    assert "A" in media.get_medium(1).tag_names.innate
+    assert media.get_medium(2) is not None
+    assert set(media.with_tag_count(everything, lambda c: c > 0)) == tag_counts
+
+    media.remove_id(1)
+    assert copied.get_medium(1) is not None
+    assert set(copied.with_innate_tag("renamed")) == with_a
+    assert 2 not in copied.with_tag_count(everything, lambda c: c > 0)
+
+
+def test_spindex_visibility_follows_rating_changes(client, spindex_directory):
+    _, media = journal.load_current(spindex_directory)
+    for visibility, ratings in VISIBLE_RATINGS.items():
+        for medium_id in media.visible_to(visibility):
+            assert media.get_medium(medium_id).rating in ratings
+
+    medium = copy(media.get_medium(3))
+    assert medium.rating == "e"
+    assert 3 not in media.visible_to("user")
+
+    medium.rating = "q"
+    media.add(medium)
+    assert 3 in media.visible_to("user")
+    assert 3 not in media.visible_to("sfw")
+    assert 3 in media.with_rating("q")
+    assert 3 not in media.with_rating("e")
+
+
+def test_spindexed_tag_names_behave_like_sets():
+    tag_names = SpindexedMediumTagNames(["a", "b"], ["a", "b", "c"])
+    assert "a" in tag_names.innate
+    assert "c" not in tag_names.innate
+    assert tag_names.innate & {"b", "x"} == {"b"}
+    assert len(tag_names.searchable | {"x"}) == 4
+
+    tag_names.rename("a", "z")
+    tag_names.add_searchable("y")
+    tag_names.remove_searchable("c")
+    assert tag_names.derive("b", 2) is False
+    assert tag_names.derivation_count("b") == 3
+
+    unpickled = pickle.loads(pickle.dumps(tag_names))
+    assert set(unpickled.innate) == {"b", "z"}
+    assert set(unpickled.searchable) == {"b", "y", "z"}
+    assert unpickled.derivation_count("b") == 3
+
+    assert unpickled.derive("b", -3) is True
+    assert "b" not in unpickled.searchable
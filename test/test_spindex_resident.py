@@ -0,0 +1,63 @@
+import gc
+
+from beevenue import preload
+from beevenue.spindex import journal, resident
+from beevenue.spindex.journal import Mutation
+
+
+def test_resident_spindex_applies_new_journal_entries_to_a_copy(
+    client, spindex_directory
+):
+    resident.refresh(spindex_directory)
+    media, _ = resident.current()
+    searchable_before = set(media.get_medium(1).tag_names.searchable)
+
+    journal.append(
+        spindex_directory, [Mutation("derive", ({"A": ["alias.three"]}, 1))]
+    )
+    resident.refresh(spindex_directory)
+    media_after, _ = resident.current()
+
+    # Requests still using the old copy are not affected.
+    assert media_after is not media
+    assert set(media.get_medium(1).tag_names.searchable) == searchable_before
+    assert "alias.three" not in media.searchable_tag_names()
+    assert "alias.three" in media_after.get_medium(1).tag_names.searchable
+    assert media_after.version != media.version
+
+
+def test_tag_changes_replace_tag_closures_of_spindex_copies(
+    client, spindex_directory
+):
+    _, media = journal.load_current(spindex_directory)
+    changed = media.copy()
+    assert changed.tag_closures is media.tag_closures
+
+    # Requests still using media must not fill the closures of changed.
+    changed.derive({"A": ["some.alias"]}, 1)
+    assert changed.tag_closures is not media.tag_closures
+
+
+class _FakeGunicornApp:
+    def __init__(self, app):
+        self.app = app
+
+    def wsgi(self):
+        return self.app
+
+
+class _FakeGunicornServer:
+    def __init__(self, app):
+        self.app = _FakeGunicornApp(app)
+
+
+def test_preload_hooks_load_resident_spindex(client):
+    server = _FakeGunicornServer(client.app_under_test)
+    try:
+        preload.when_ready(server)
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+    preload.post_fork(server, None)
+    assert resident.current()[0].get_medium(1) is not None
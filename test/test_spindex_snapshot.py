@@ -0,0 +1,97 @@
+import sqlite3
+
+from flask import g
+
+from beevenue.models import MediaTags
+from beevenue.spindex import journal, snapshot
+from beevenue.spindex.fingerprint import sql_fingerprint
+from beevenue.spindex.journal import Mutation
+
+
+def test_spindex_snapshot_roundtrips(client, spindex_directory):
+    _, media = journal.load_current(spindex_directory)
+    base = snapshot.publish(spindex_directory, media, "fingerprint")
+    assert snapshot.current(spindex_directory) == (base, base, 0, "fingerprint")
+
+    loaded = snapshot.load(spindex_directory, base)
+    assert len(list(loaded.get_all())) == len(list(media.get_all()))
+    for medium in media.get_all():
+        reloaded = loaded.get_medium(medium.medium_id)
+        assert reloaded.medium_hash == medium.medium_hash
+        assert reloaded.rating == medium.rating
+        assert reloaded.aspect_ratio == medium.aspect_ratio
+        assert set(reloaded.tag_names.searchable) == set(
+            medium.tag_names.searchable
+        )
+        for name in medium.tag_names.searchable:
+            assert reloaded.tag_names.derivation_count(
+                name
+            ) == medium.tag_names.derivation_count(name)
+        assert loaded.get_tiny_thumbnail(
+            medium.medium_id
+        ) == media.get_tiny_thumbnail(medium.medium_id)
+    assert loaded.visible_to("sfw") == media.visible_to("sfw")
+
+
+def test_spindex_publish_carries_over_concurrent_changes(
+    client, spindex_directory
+):
+    since = snapshot.current(spindex_directory)
+    _, media = journal.load_current(spindex_directory)
+    assert media.get_medium(1) is not None
+
+    # Appended while "media" was being loaded.
+    journal.append(spindex_directory, [Mutation("remove_id", (1,))], "changed")
+
+    base = journal.publish(spindex_directory, media, "loaded", since)
+    assert snapshot.current(spindex_directory) == (base, base, 0, "changed")
+    assert snapshot.load(spindex_directory, base).get_medium(1) is None
+
+
+def test_spindex_fingerprint_follows_sql_changes(
+    client, asAdmin, spindex_directory
+):
+    res = client.post("/tags/batch", json={"tags": ["C"], "mediumIds": [1]})
+    assert res.status_code == 200
+
+    with client.app_under_test.app_context():
+        fingerprint = sql_fingerprint(g.db)
+    assert snapshot.current(spindex_directory).fingerprint == fingerprint
+
+    snapshot.forget_fingerprint(spindex_directory)
+    assert snapshot.current(spindex_directory).fingerprint == ""
+
+
+def test_spindex_fingerprint_follows_plain_statements(client):
+    with client.app_under_test.app_context():
+        before = sql_fingerprint(g.db)
+
+        # E.g. tags of media are replaced like this.
+        g.db.execute(MediaTags.delete().where(MediaTags.c.medium_id == 1))
+        g.db.commit()
+        assert sql_fingerprint(g.db) != before
+
+
+def test_spindex_fingerprint_follows_changes_behind_the_apps_back(client):
+    app = client.app_under_test
+    database_path = app.config["SQLALCHEMY_DATABASE_URI"][len("sqlite:///") :]
+
+    def _fingerprint_after(statement):
+        with app.app_context():
+            before = sql_fingerprint(g.db)
+        connection = sqlite3.connect(database_path)
+        connection.execute(statement)
+        connection.commit()
+        connection.close()
+        with app.app_context():
+            return before, sql_fingerprint(g.db)
+
+    before, after = _fingerprint_after(
+        "UPDATE medium SET rating = 'q' WHERE id = 1"
+    )
+    assert after != before
+
+    before, after = _fingerprint_after(
+        "UPDATE medium SET hash = 'changed1' WHERE id = 1"
+    )
+    assert after != before
@@ -59,3 +59,17 @@ def test_tag_cannot_add_some_new_tags_to_medium(client, asAdmin):
     res = client.get("/medium/1")
     assert res.status_code == 200
     assert "klonoa" not in res.get_json()["tags"]
+
+
+def test_tag_batch_update_reindexes_all_media(client, asAdmin):
+    res = client.post(
+        "/tags/batch",
+        json={"tags": ["c:tinkerbell"], "mediumIds": [1, 2, 4, 55343]},
+    )
+    assert res.status_code == 200
+
+    # Implied tags must be searchable as well.
+    res = client.get("/search?q=u:peter.pan&pageNumber=1&pageSize=100")
+    assert res.status_code == 200
+    found_ids = {item["id"] for item in res.get_json()["items"]}
+    assert {1, 2, 4} <= found_ids
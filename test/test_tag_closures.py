@@ -0,0 +1,36 @@
+from beevenue.spindex.load import AbstractDataSource, TagClosures
+
+
+def test_tag_closures_are_memoized_per_tag():
+    class _DataSource(AbstractDataSource):
+        def __init__(self):
+            self.calls = 0
+
+        def alias_names(self, tag_ids):
+            return {f"alias{i}" for i in tag_ids}
+
+        def implied(self, tag_ids):
+            self.calls += 1
+            implied_ids = {i + 1 for i in tag_ids if i < 3}
+            return implied_ids, {f"tag{i}" for i in implied_ids}
+
+    data_source = _DataSource()
+    tag_closures = TagClosures()
+
+    assert tag_closures.searchable_names(data_source, [1]) == {
+        "alias1",
+        "alias2",
+        "alias3",
+        "tag2",
+        "tag3",
+    }
+    assert tag_closures.searchable_names(data_source, [2, 3]) == {
+        "alias2",
+        "alias3",
+        "tag3",
+    }
+    assert data_source.calls == 3
+
+    tag_closures.clear()
+    tag_closures.searchable_names(data_source, [3])
+    assert data_source.calls == 4
@@ -48,3 +48,16 @@ def test_removing_implication_for_missing_tag_succeeds(client, asAdmin):
 def test_removing_missing_implication_succeeds(client, asAdmin):
     res = client.delete("/tag/c:tinkerbell/implications/A")
     assert res.status_code == 200
+
+
+def test_can_add_implication_after_breaking_cycle(client, asAdmin):
+    res = client.patch("/tag/A/implications/B")
+    assert res.status_code == 200
+    res = client.patch("/tag/B/implications/C")
+    assert res.status_code == 200
+    res = client.patch("/tag/C/implications/A")
+    assert res.status_code == 400
+    res = client.delete("/tag/B/implications/C")
+    assert res.status_code == 200
+    res = client.patch("/tag/C/implications/A")
+    assert res.status_code == 200
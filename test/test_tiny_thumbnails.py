@@ -0,0 +1,95 @@
+from beevenue.spindex import blobs, journal, snapshot
+from beevenue.spindex.files import BlobRef
+from beevenue.spindex.journal import Mutation
+from beevenue.spindex.media import SpindexMedia
+
+
+def test_tiny_thumbnail_packs_roundtrip(tmp_path):
+    directory = str(tmp_path)
+
+    first = blobs.append_to_new_pack(directory, [(1, b"one"), (2, b"two")])
+    appended = blobs.append(directory, [(3, b"three")])
+    assert appended[3].pack == first[1].pack
+
+    second = blobs.append_to_new_pack(directory, [(4, b"four")])
+    assert second[4].pack == first[1].pack + 1
+
+    refs = {**first, **appended, **second}
+    assert blobs.read(directory, refs) == {
+        1: b"one",
+        2: b"two",
+        3: b"three",
+        4: b"four",
+    }
+
+
+def test_tiny_thumbnail_packs_are_removed_once_unreferenced(tmp_path):
+    directory = str(tmp_path)
+
+    packs = [
+        blobs.append_to_new_pack(directory, [(i, bytes([i]))]) for i in range(4)
+    ]
+    blobs.remove_unreferenced(directory, {packs[0][0].pack})
+
+    # Missing packs are simply left out.
+    refs = {i: pack[i] for i, pack in enumerate(packs)}
+    assert blobs.read(directory, refs) == {0: b"\x00", 2: b"\x02", 3: b"\x03"}
+
+
+def test_publishing_keeps_packs_referenced_by_carried_over_entries(tmp_path):
+    directory = str(tmp_path)
+    journal.publish(directory, SpindexMedia(), "", snapshot.current(directory))
+    since = snapshot.current(directory)
+    _, media = journal.load_at(directory, since)
+
+    # Appended while media is being loaded, pointing into an old pack.
+    old = blobs.append_to_new_pack(directory, [(1, b"old")])
+    journal.append(directory, [Mutation("set_tiny_thumbnail", (1, old[1]))])
+    blobs.append_to_new_pack(directory, [(2, b"newer")])
+    blobs.append_to_new_pack(directory, [(3, b"newest")])
+
+    journal.publish(directory, media, "", since)
+    assert blobs.read(directory, old) == {1: b"old"}
+
+
+def test_search_survives_missing_tiny_thumbnail_pack(
+    client, asAdmin, nsfw, spindex_directory
+):
+    missing = BlobRef(10 ** 6, 0, 3)
+    journal.append(
+        spindex_directory,
+        [Mutation("set_tiny_thumbnail", (i, missing)) for i in range(1, 5)],
+    )
+
+    res = client.get("/search?q=tags!%3D0&pageNumber=1&pageSize=10")
+    assert res.status_code == 200
+    assert res.get_json()["items"]
+
+
+def test_tiny_thumbnail_packs_roll_over_once_too_large(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    monkeypatch.setattr(blobs, "_MAX_PACK_SIZE", 4)
+
+    first = blobs.append(directory, [(1, b"one")])
+    second = blobs.append(directory, [(2, b"two")])
+    assert second[2].pack == first[1].pack
+
+    third = blobs.append(directory, [(3, b"three")])
+    assert third[3].pack == first[1].pack + 1
+
+
+def test_compacting_removes_unreferenced_packs(tmp_path):
+    directory = str(tmp_path)
+    journal.publish(directory, SpindexMedia(), "", snapshot.current(directory))
+
+    packs = [
+        blobs.append_to_new_pack(directory, [(1, bytes([i]))]) for i in range(4)
+    ]
+    for pack in packs:
+        journal.append(
+            directory, [Mutation("set_tiny_thumbnail", (1, pack[1]))]
+        )
+
+    journal.compact(directory)
+    refs = {i: pack[1] for i, pack in enumerate(packs)}
+    assert blobs.read(directory, refs) == {2: b"\x02", 3: b"\x03"}
@@ -18,5 +18,3 @@ BEEVENUE_MINIMUM_ASPECT_RATIO = 0.5
 BEEVENUE_RULES_FILE = "test/resources/testing_rules.json"
 
 SECRET_KEY = "TESTING_ONLY"
-
-CACHE_DIR = "./test-cache"